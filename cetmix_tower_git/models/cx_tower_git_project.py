@@ -5,6 +5,9 @@ import re
 
 from odoo import _, api, fields, models
 
+# key of the precommit data that keeps ids of the projects to update files for
+RELATED_FILES_UPDATE_KEY = "cx_tower_git_project_update"
+
 
 class CxTowerGitProject(models.Model):
     """
@@ -97,13 +100,13 @@ class CxTowerGitProject(models.Model):
     def create(self, vals_list):
         res = super().create(vals_list)
         # Update related files on create
-        res._update_related_files()
+        res._schedule_related_files_update()
         return res
 
     def write(self, vals):
         res = super().write(vals)
         # Update related files on update
-        self._update_related_files()
+        self._schedule_related_files_update()
         return res
 
     def _update_related_files(self):
@@ -111,6 +114,31 @@ class CxTowerGitProject(models.Model):
         if self.git_project_rel_ids:
             self.git_project_rel_ids._save_to_file()
 
+    def _schedule_related_files_update(self):
+        """Schedule update of the related files before the transaction
+        is committed. Files of a project modified several times
+        in the same transaction are updated only once.
+        """
+        precommit = self.env.cr.precommit
+        project_ids = precommit.data.get(RELATED_FILES_UPDATE_KEY)
+        if project_ids is None:
+            project_ids = precommit.data[RELATED_FILES_UPDATE_KEY] = set()
+            precommit.add(self.browse()._update_scheduled_related_files)
+        project_ids.update(
+            project_id for project_id in self.ids if isinstance(project_id, int)
+        )
+
+    def _update_scheduled_related_files(self):
+        """
+        Update files of the projects scheduled for update
+        """
+        project_ids = self.env.cr.precommit.data.pop(RELATED_FILES_UPDATE_KEY, set())
+        projects = self.browse(sorted(project_ids)).exists()
+        if projects:
+            projects._update_related_files()
+            # Save changes made after the transaction was flushed
+            self.flush()
+
     def _extract_variables_from_text(self, text):
         """Extract environment variables from text.
         Helper method for file content generation.
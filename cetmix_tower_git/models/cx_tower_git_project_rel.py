@@ -1,6 +1,8 @@
 # Copyright (C) 2024 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
 
@@ -70,13 +72,13 @@ class CxTowerGitProjectRel(models.Model):
         res = super().create(vals_list)
 
         # Export project to file
-        res._save_to_file()
+        res.mapped("git_project_id")._schedule_related_files_update()
         return res
 
     def write(self, vals):
         res = super().write(vals)
         # Export project to file
-        self._save_to_file()
+        self.mapped("git_project_id")._schedule_related_files_update()
         return res
 
     def _selection_project_format(self):
@@ -95,7 +97,9 @@ class CxTowerGitProjectRel(models.Model):
     # Save project to linked file based on selected format
     # ----------------------------------------------------
     def _save_to_file(self):
-        """Save project to linked file using format-specific function."""
+        """Save project to linked file using format-specific function.
+        Code is generated once per project and format.
+        Only files whose code has changed are written."""
 
         # Get required function based on project format
         # Following the pattern: _save_to_file_<format> where format
@@ -104,31 +108,41 @@ class CxTowerGitProjectRel(models.Model):
 
         # Save resolved functions to dict for faster access
         code_generator_functions = {}
+        # Generated code: {(project_id, project_format): code}
+        generated_code = {}
+        # Files to update: {code: cx.tower.file()}
+        files_by_code = defaultdict(lambda: self.env["cx.tower.file"])
 
         for record in self:
-            code_generator_function = code_generator_functions.get(
-                record.project_format
-            )
-            if not code_generator_function:
-                code_generator_function = getattr(
-                    self, f"_generate_code_{record.project_format}", None
+            code_key = (record.git_project_id.id, record.project_format)
+            code = generated_code.get(code_key)
+            if code is None:
+                code_generator_function = code_generator_functions.get(
+                    record.project_format
                 )
                 if not code_generator_function:
-                    raise ValidationError(
-                        _(
-                            "Code generator function for '%(project_format)s'"
-                            " format not found.",
-                            project_format=record.project_format,
-                        )
+                    code_generator_function = getattr(
+                        self, f"_generate_code_{record.project_format}", None
                     )
-                code_generator_functions[
-                    record.project_format
-                ] = code_generator_function
+                    if not code_generator_function:
+                        raise ValidationError(
+                            _(
+                                "Code generator function for '%(project_format)s'"
+                                " format not found.",
+                                project_format=record.project_format,
+                            )
+                        )
+                    code_generator_functions[
+                        record.project_format
+                    ] = code_generator_function
 
-            # Generate code for current record
-            code = code_generator_function(record)
+                # Generate code for current record
+                code = generated_code[code_key] = code_generator_function(record)
             if record.file_id.code != code:
-                record.file_id.write({"code": code})
+                files_by_code[code] |= record.file_id
+
+        for code, files in files_by_code.items():
+            files.write({"code": code})
 
     def _generate_code_git_aggregator(self, record):
         """Generate code in git-aggregator format.
@@ -137,6 +137,9 @@ class CxTowerGitRemote(models.Model):
         return res
 
     def write(self, vals):
+        # Files of the previous project must be updated too
+        if "source_id" in vals:
+            self._update_related_files()
         res = super().write(vals)
         # Update related files on update
         self._update_related_files()
@@ -144,13 +147,8 @@ class CxTowerGitRemote(models.Model):
 
     def _update_related_files(self):
         # Update related files on update
-        related_files = (
-            self.mapped("source_id")
-            .mapped("git_project_id")
-            .mapped("git_project_rel_ids")
-        )
-        if related_files:
-            related_files._save_to_file()
+        projects = self.mapped("source_id").mapped("git_project_id")
+        projects._schedule_related_files_update()
 
     def _get_repo_protocol_and_provider_from_url(self, repo_url):
         """Parse repository URL and return protocol and provider.
@@ -74,6 +74,9 @@ class CxTowerGitSource(models.Model):
         return res
 
     def write(self, vals):
+        # Files of the previous project must be updated too
+        if "git_project_id" in vals:
+            self._update_related_files()
         res = super().write(vals)
         # Update related files on update
         self._update_related_files()
@@ -81,9 +84,7 @@ class CxTowerGitSource(models.Model):
 
     def _update_related_files(self):
         # Update related files on update
-        related_files = self.mapped("git_project_id").mapped("git_project_rel_ids")
-        if related_files:
-            related_files._save_to_file()
+        self.mapped("git_project_id")._schedule_related_files_update()
 
     # ------------------------------
     # Reference mixin methods
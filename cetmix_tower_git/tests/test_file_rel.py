@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from .common import CommonTest
 
 
@@ -14,6 +16,8 @@ class TestFileRel(CommonTest):
                 "project_format": "git_aggregator",
             }
         )
+        # Files are updated before the transaction is committed
+        self.env.cr.precommit.run()
 
     def test_file_rel_create(self):
         """Test if file relation is created correctly"""
@@ -42,6 +46,7 @@ class TestFileRel(CommonTest):
         # -- 2 --
         # Modify remove and check if file content is updated
         self.remote_other_ssh.url = "https://github.com/cetmix/cetmix-memes.git"
+        self.env.cr.precommit.run()
 
         # Must be different from previous project code
         self.assertNotEqual(
@@ -59,12 +64,59 @@ class TestFileRel(CommonTest):
         # -- 3 --
         # Disable source and check if file content is updated
         self.git_source_2.active = False
+        self.env.cr.precommit.run()
         self.assertNotIn(
             "https://github.com/cetmix/cetmix-memes.git",
             self.server_1_file_1.code,
             "Remote is present in file",
         )
 
+    def test_file_update_once_per_transaction(self):
+        """Test if project code is generated once per transaction
+        and only modified files are written"""
+        file_2 = self.File.create(
+            {
+                "name": "File 2",
+                "server_id": self.server_test_1.id,
+                "source": "tower",
+            }
+        )
+        self.GitProjectRel.create(
+            {
+                "server_id": self.server_test_1.id,
+                "file_id": file_2.id,
+                "git_project_id": self.git_project_1.id,
+                "project_format": "git_aggregator",
+            }
+        )
+        rel_class = type(self.GitProjectRel)
+        file_class = type(self.File)
+        with patch.object(
+            rel_class,
+            "_generate_code_git_aggregator",
+            autospec=True,
+            side_effect=rel_class._generate_code_git_aggregator,
+        ) as generate_mock, patch.object(
+            file_class, "write", autospec=True, side_effect=file_class.write
+        ) as write_mock:
+            self.remote_github_https.head = "main"
+            self.remote_gitlab_https.head = "dev"
+            self.remote_other_ssh.head = "new"
+            generate_mock.assert_not_called()
+
+            self.env.cr.precommit.run()
+            self.assertEqual(generate_mock.call_count, 1)
+            # Both files are written at once
+            self.assertEqual(write_mock.call_count, 1)
+            self.assertEqual(self.server_1_file_1.code, file_2.code)
+            self.assertIn("ref: new", file_2.code)
+
+            # Files are not written if the code is not changed
+            self.remote_other_ssh.head = "new"
+            self.env.cr.precommit.run()
+            self.assertEqual(generate_mock.call_count, 2)
+            self.assertEqual(write_mock.call_count, 1)
+
     def test_format_git_aggregator(self):
         """Test if format git aggregator works correctly"""
 
@@ -3,7 +3,7 @@
 {
     "name": "Cetmix Tower Server Management",
     "summary": "Flexible Server Management directly from Odoo",
-    "version": "14.0.0.4.8",
+    "version": "14.0.0.4.9",
     "category": "Productivity",
     "website": "https://cetmix.com",
     "author": "Cetmix",
@@ -36,6 +36,7 @@
         "wizards/cx_tower_command_execute_wizard_view.xml",
         "wizards/cx_tower_plan_execute_wizard_view.xml",
         "wizards/cx_tower_server_template_create_wizard_view.xml",
+        "wizards/cx_tower_server_clone_wizard_view.xml",
         "views/web_assets_backend.xml",
         "views/cx_tower_server_view.xml",
         "views/cx_tower_os_view.xml",
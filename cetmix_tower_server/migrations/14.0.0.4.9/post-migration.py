@@ -0,0 +1,29 @@
+import logging
+
+from odoo import SUPERUSER_ID, api
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    Move binary content of files to the shared content records.
+    Files with identical content are linked to the same record.
+    """
+    _logger.info("Moving file binary content to the shared content records.")
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    attachments = env["ir.attachment"].search(
+        [
+            ("res_model", "=", "cx.tower.file"),
+            ("res_field", "=", "file"),
+        ]
+    )
+    blob_obj = env["cx.tower.file.blob"]
+    for attachment in attachments:
+        file = env["cx.tower.file"].browse(attachment.res_id).exists()
+        if file and attachment.raw:
+            file.blob_id = blob_obj._get_or_create(attachment.raw)
+    attachments.unlink()
+
+    _logger.info(f"Moved content of {len(attachments)} files.")
@@ -5,9 +5,12 @@ from . import cx_tower_template_mixin
 from . import cx_tower_access_mixin
 from . import cx_tower_reference_mixin
 from . import cx_tower_key_mixin
+from . import cx_tower_log_mixin
 from . import cx_tower_variable
 from . import cx_tower_variable_value
 from . import cx_tower_file
+from . import cx_tower_file_blob
+from . import cx_tower_file_transfer
 from . import cx_tower_file_template
 from . import cx_tower_server
 from . import cx_tower_os
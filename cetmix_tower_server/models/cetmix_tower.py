@@ -4,6 +4,7 @@ import time
 
 from odoo import _, api, models
 from odoo.exceptions import ValidationError
+from odoo.osv.expression import AND, OR
 
 from .constants import SSH_CONNECTION_ERROR
 
@@ -32,6 +33,32 @@ class CetmixTower(models.AbstractModel):
             template_reference=template_reference, server_name=server_name, **kwargs
         )
 
+    @api.model
+    def server_create_from_template_bulk(self, template_reference, server_specs):
+        """Shortcut for the 'create_servers_from_template' method
+        of the 'cx.tower.server.template' model.
+
+        Important! Add dedicated tests for this function if modified later.
+        """
+        return self.env["cx.tower.server.template"].create_servers_from_template(
+            template_reference=template_reference, server_specs=server_specs
+        )
+
+    @api.model
+    def server_search_by_selector(self, selector):
+        """Get servers matching selector expression.
+        Selector is compiled into a single SQL query.
+
+        Args:
+            selector (Char): selector expression,
+                eg 'tag:prod and var.odoo_version == "16.0" and os:ubuntu'.
+                Check `cx_tower_server_selector` for the syntax.
+
+        Returns:
+            cx.tower.server: matching servers
+        """
+        return self.env["cx.tower.server"]._search_by_selector(selector)
+
     @api.model
     def server_set_variable_value(self, server_reference, variable_reference, value):
         """Set variable value for selected server.
@@ -105,6 +132,148 @@ class CetmixTower(models.AbstractModel):
             value = result.get("global")
         return value
 
+    @api.model
+    def server_set_variable_values(self, values):
+        """Set variable values for several servers at once.
+        Modifies existing variable values or creates new ones.
+        Servers and variables are resolved with a single query per model,
+        values are created and updated in batch.
+        Nothing is changed if any server or variable is not found.
+
+        Args:
+            values (Dict): {server_reference: {variable_reference: value}}
+                eg {'server_1': {'branch': 'prod', 'odoo_version': '16.0'}}
+
+        Returns:
+            Dict: with following keys:
+            - exit_code (Char)
+            - message (Char)
+        """
+        variable_references = {
+            variable_reference
+            for server_values in values.values()
+            for variable_reference in server_values
+        }
+        server_ids = self.env["cx.tower.server"]._get_ids_by_references(values)
+        variable_ids = self.env["cx.tower.variable"]._get_ids_by_references(
+            variable_references
+        )
+        missing_servers = [ref for ref in values if ref not in server_ids]
+        if missing_servers:
+            return {
+                "exit_code": -1,
+                "message": _(
+                    "Server not found: %(references)s",
+                    references=", ".join(missing_servers),
+                ),
+            }
+        missing_variables = [
+            ref for ref in variable_references if ref not in variable_ids
+        ]
+        if missing_variables:
+            return {
+                "exit_code": -1,
+                "message": _(
+                    "Variable not found: %(references)s",
+                    references=", ".join(sorted(missing_variables)),
+                ),
+            }
+
+        # Existing values of all servers
+        variable_value_obj = self.env["cx.tower.variable.value"]
+        existing_values = {
+            (value.server_id.id, value.variable_id.id): value
+            for value in variable_value_obj.search(
+                [
+                    ("server_id", "in", list(server_ids.values())),
+                    ("variable_id", "in", list(variable_ids.values())),
+                ]
+            )
+        }
+
+        # Group records to update by value to write each value once
+        values_to_update = {}
+        vals_list = []
+        for server_reference, server_values in values.items():
+            server_id = server_ids[server_reference]
+            for variable_reference, value in server_values.items():
+                variable_id = variable_ids[variable_reference]
+                variable_value = existing_values.get((server_id, variable_id))
+                if variable_value:
+                    values_to_update.setdefault(value, variable_value_obj)
+                    values_to_update[value] |= variable_value
+                else:
+                    vals_list.append(
+                        {
+                            "variable_id": variable_id,
+                            "server_id": server_id,
+                            "value_char": value,
+                        }
+                    )
+        for value, variable_values in values_to_update.items():
+            variable_values.write({"value_char": value})
+        variable_value_obj.create(vals_list)
+
+        return {
+            "exit_code": 0,
+            "message": _(
+                "Variable values updated: %(updated)s, created: %(created)s",
+                updated=sum(len(records) for records in values_to_update.values()),
+                created=len(vals_list),
+            ),
+        }
+
+    @api.model
+    def server_get_variable_values(
+        self, server_references, variable_references, check_global=True
+    ):
+        """Get variable values for several servers at once.
+        Values are fetched using a single query,
+        global values are used as a fallback.
+
+        Args:
+            server_references (list of Char): Server references
+            variable_references (list of Char): Variable references
+            check_global (bool, optional): Check for global value if variable
+                is not defined for selected server. Defaults to True.
+        Returns:
+            Dict: {server_reference: {variable_reference: value or None}}
+        """
+        server_ids = self.env["cx.tower.server"]._get_ids_by_references(
+            server_references
+        )
+        domain = [("server_id", "in", list(server_ids.values()))]
+        if check_global:
+            domain = OR([domain, [("is_global", "=", True)]])
+        domain = AND(
+            [[("variable_reference", "in", list(variable_references))], domain]
+        )
+
+        server_values = {}
+        global_values = {}
+        for variable_value in self.env["cx.tower.variable.value"].search(domain):
+            if variable_value.server_id:
+                server_values[
+                    (variable_value.server_id.id, variable_value.variable_reference)
+                ] = variable_value.value_char
+            elif variable_value.is_global:
+                global_values[
+                    variable_value.variable_reference
+                ] = variable_value.value_char
+
+        result = {}
+        for server_reference in server_references:
+            server_id = server_ids.get(server_reference)
+            if not server_id:
+                result[server_reference] = dict.fromkeys(variable_references)
+                continue
+            result[server_reference] = {
+                variable_reference: server_values.get((server_id, variable_reference))
+                or global_values.get(variable_reference)
+                for variable_reference in variable_references
+            }
+        return result
+
     @api.model
     def server_check_ssh_connection(
         self,
@@ -33,5 +33,11 @@ PLAN_LINE_CONDITION_CHECK_FAILED = -20
 # Returned when the command failed to execute due to a python code execution error
 PYTHON_COMMAND_ERROR = -24
 
+# Returned when a command was left running by a worker that doesn't exist anymore
+COMMAND_INTERRUPTED = -25
+
+# Returned when a flightplan was left running by a worker that doesn't exist anymore
+PLAN_INTERRUPTED = -26
+
 # Returned when an SSH connection error occurs
 SSH_CONNECTION_ERROR = 503
@@ -1,10 +1,19 @@
 # Copyright (C) 2022 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
-from odoo import api, fields, models
+from dateutil.relativedelta import relativedelta
+
+from odoo import _, api, fields, models
+
+from .constants import COMMAND_INTERRUPTED
+
+# Running commands are checked for being alive only after this period
+# to skip commands that are not picked up by a runner yet
+STALE_RUN_DELAY_MINUTES = 10
 
 
 class CxTowerCommandLog(models.Model):
     _name = "cx.tower.command.log"
+    _inherit = "cx.tower.log.mixin"
     _description = "Cetmix Tower Command Log"
     _order = "start_date desc, id desc"
 
@@ -58,8 +67,25 @@ class CxTowerCommandLog(models.Model):
 
     # -- Flight Plan
     plan_log_id = fields.Many2one(comodel_name="cx.tower.plan.log", ondelete="cascade")
+    plan_line_id = fields.Many2one(
+        comodel_name="cx.tower.plan.line",
+        ondelete="set null",
+        help="Flight Plan line this command was executed for",
+    )
     triggered_plan_log_id = fields.Many2one(comodel_name="cx.tower.plan.log")
 
+    def init(self):
+        """
+        Create index used to find running commands
+        """
+        self._cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS cx_tower_command_log_running_index
+            ON cx_tower_command_log (server_id, command_id)
+            WHERE is_running
+            """
+        )
+
     @api.depends("name", "command_id.name")
     def _compute_name(self):
         for rec in self:
@@ -73,6 +99,24 @@ class CxTowerCommandLog(models.Model):
                     command_log.finish_date - command_log.start_date
                 ).total_seconds()
 
+    def _get_log_computed_values(self, vals):
+        res = super()._get_log_computed_values(vals)
+        if "server_id" in vals or "command_id" in vals:
+            server = self.env["cx.tower.server"].browse(
+                vals.get("server_id", self.server_id.id)
+            )
+            command = self.env["cx.tower.command"].browse(
+                vals.get("command_id", self.command_id.id)
+            )
+            res.update(
+                {
+                    "name": ": ".join((server.sudo().name, command.sudo().name)),
+                    "command_action": command.sudo().action,
+                    "access_level": command.sudo().access_level,
+                }
+            )
+        return res
+
     def _compute_duration_current(self):
         """Shows relative time between now() and start time for running commands,
         and computed duration for finished ones.
@@ -105,7 +149,7 @@ class CxTowerCommandLog(models.Model):
         }
         # Apply kwargs
         vals.update(kwargs)
-        log_record = self.sudo().create(vals)
+        log_record = self.sudo()._log_create([vals])
         return log_record
 
     def finish(
@@ -118,22 +162,25 @@ class CxTowerCommandLog(models.Model):
             finish_date (Datetime): command finish date time.
             **kwargs (dict): optional values
         """
-        now = fields.Datetime.now()
+        vals = {
+            "is_running": False,
+            "finish_date": finish_date if finish_date else fields.Datetime.now(),
+            "command_status": -1 if status is None else status,
+            "command_response": response,
+            "command_error": error,
+        }
+        # Apply kwargs and write all records at once
+        vals.update(kwargs)
+        log_records = self.sudo()
+        log_records._log_write(vals)
 
-        for rec in self.sudo():
-            # Duration
-            date_finish = finish_date if finish_date else now
+        for rec in log_records:
+            # Persist result before the flight plan continues
+            rec.server_id._commit_progress()
 
-            vals = {
-                "is_running": False,
-                "finish_date": date_finish,
-                "command_status": -1 if status is None else status,
-                "command_response": response,
-                "command_error": error,
-            }
-            # Apply kwargs and write
-            vals.update(kwargs)
-            rec.write(vals)
+            # Next flight plan lines can run the same command
+            rec.server_id._release_run_lock("command_log", rec.id, rec.id)
+            rec.server_id._release_run_lock("command", rec.command_id.id, rec.id)
 
             # Trigger post finish hook
             rec._command_finished()
@@ -175,7 +222,7 @@ class CxTowerCommandLog(models.Model):
                 "command_error": error,
             }
         )
-        rec = self.sudo().create(vals)
+        rec = self.sudo()._log_create([vals])
         rec._command_finished()
         return rec
 
@@ -187,3 +234,46 @@ class CxTowerCommandLog(models.Model):
         for rec in self:
             if rec.plan_log_id:  # type: ignore
                 rec.plan_log_id._plan_command_finished(rec)  # type: ignore
+
+    def _filter_alive_runs(self):
+        """Get commands that are still being executed.
+        Command is alive while its log run lock is held by the runner.
+        Locks of all commands are checked with a single query.
+        Inherit to support runners that execute commands later.
+
+        Returns:
+            cx.tower.command.log(): alive command logs
+        """
+        locked_runs = self.env["cx.tower.server"]._get_locked_runs(
+            "command_log", [(log.server_id.id, log.id) for log in self]
+        )
+        return self.filtered(lambda log: (log.server_id.id, log.id) in locked_runs)
+
+    @api.model
+    def _recover_stale_runs(self):
+        """Finish commands left running by workers that don't exist anymore.
+        See `_filter_alive_runs()` for details.
+        Flight plans are not continued for such commands.
+        """
+        running_logs = self.sudo().search(
+            [
+                ("is_running", "=", True),
+                (
+                    "start_date",
+                    "<",
+                    fields.Datetime.now()
+                    - relativedelta(minutes=STALE_RUN_DELAY_MINUTES),
+                ),
+            ]
+        )
+        stale_logs = running_logs - running_logs._filter_alive_runs()
+        if stale_logs:
+            stale_logs._log_write(
+                {
+                    "is_running": False,
+                    "finish_date": fields.Datetime.now(),
+                    "command_status": COMMAND_INTERRUPTED,
+                    "command_error": _("Command execution was interrupted"),
+                }
+            )
+        return stale_logs
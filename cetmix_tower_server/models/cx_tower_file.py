@@ -1,13 +1,26 @@
 # Copyright (C) 2022 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
-from base64 import b64decode, b64encode
+import hashlib
+import json
+import logging
+import tempfile
+import weakref
+from base64 import b64decode
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
 
+import psycopg2
 from dateutil.relativedelta import relativedelta
 
+import odoo
 from odoo import _, api, fields, models
 from odoo.exceptions import AccessError, UserError, ValidationError
 from odoo.tools import exception_to_unicode
 
+from .cx_tower_file_watcher import WATCHER_LIMIT, supervise_watchers
+from .cx_tower_server import FILE_CHUNK_SIZE
+
 # mapping of field names from template and field names from file
 TEMPLATE_FILE_FIELD_MAPPING = {
     "code": "code",
@@ -27,6 +40,43 @@ INTERVAL_TYPES = {
     "years": lambda interval: relativedelta(years=interval),
 }
 
+# changing any of these fields makes stored remote file metadata obsolete
+SERVER_FILE_LOCATION_FIELDS = ["name", "server_dir", "server_id", "file_type"]
+
+# Transfer progress is saved each time it grows by this number of percents
+TRANSFER_PROGRESS_STEP = 5
+
+# ids of the files to sync once the transaction is committed: {cursor: set}
+_auto_sync_queues = weakref.WeakKeyDictionary()
+
+# fields computed by rendering file values with variables
+RENDERED_FIELDS = [
+    "rendered_name",
+    "rendered_server_dir",
+    "rendered_code",
+    "full_server_path",
+    "render_hash",
+    "render_is_dynamic",
+]
+
+_logger = logging.getLogger(__name__)
+
+
+def _run_auto_sync_after_commit(cr, uid, context):
+    """Sync files queued in a committed transaction using a new cursor
+
+    Args:
+        cr (Cursor): cursor of the committed transaction
+        uid (int): id of the user who modified the files
+        context (dict): context of the environment the files were modified in
+    """
+    file_ids = _auto_sync_queues.pop(cr, None)
+    if not file_ids:
+        return
+    with api.Environment.manage(), odoo.registry(cr.dbname).cursor() as new_cr:
+        env = api.Environment(new_cr, uid, context)
+        env["cx.tower.file"].browse(sorted(file_ids)).exists()._run_auto_sync()
+
 
 class CxTowerFile(models.Model):
     _name = "cx.tower.file"
@@ -44,6 +94,7 @@ class CxTowerFile(models.Model):
     rendered_name = fields.Char(
         compute="_compute_render",
         compute_sudo=True,
+        store=True,
     )
     template_id = fields.Many2one(
         "cx.tower.file.template",
@@ -59,9 +110,12 @@ class CxTowerFile(models.Model):
     rendered_server_dir = fields.Char(
         compute="_compute_render",
         compute_sudo=True,
+        store=True,
     )
     full_server_path = fields.Char(
-        compute="_compute_full_server_path",
+        compute="_compute_render",
+        compute_sudo=True,
+        store=True,
     )
     source = fields.Selection(
         [
@@ -77,6 +131,20 @@ class CxTowerFile(models.Model):
         help="If enabled file will be synced automatically using cron",
         default=False,
     )
+    auto_sync_mode = fields.Selection(
+        [
+            ("poll", "Polling"),
+            ("watch", "Watcher"),
+        ],
+        default="poll",
+        required=True,
+        help="""
+            - Polling: file is pulled periodically using the sync interval.
+            - Watcher: file is pulled as soon as it is modified on server.
+            Server is watched using a single SSH connection with 'inotifywait'
+            or a lightweight 'stat' loop if 'inotifywait' is not available.
+        """,
+    )
     # selection format: interval_number(integer)-interval_type(name of interval)
     # it will be parsed as 'relativedelta' object
     auto_sync_interval = fields.Selection(
@@ -120,8 +188,23 @@ class CxTowerFile(models.Model):
     rendered_code = fields.Char(
         compute="_compute_render",
         compute_sudo=True,
+        store=True,
         help="File content with variables rendered",
     )
+    render_hash = fields.Char(
+        compute="_compute_render",
+        compute_sudo=True,
+        store=True,
+        help="Hash of the values used to render the file. "
+        "File is not rendered again unless these values change",
+    )
+    render_is_dynamic = fields.Boolean(
+        compute="_compute_render",
+        compute_sudo=True,
+        store=True,
+        help="File uses the 'tower' system variable. "
+        "Such files are rendered again before each upload",
+    )
     keep_when_deleted = fields.Boolean(
         help="File will be kept on server when deleted in Tower",
     )
@@ -131,7 +214,16 @@ class CxTowerFile(models.Model):
         required=True,
     )
     file = fields.Binary(
-        attachment=True,
+        compute="_compute_file",
+        inverse="_inverse_file",
+    )
+    blob_id = fields.Many2one(
+        comodel_name="cx.tower.file.blob",
+        string="Binary Content",
+        readonly=True,
+        index=True,
+        ondelete="restrict",
+        help="Binary content shared by all files with the same content",
     )
     variable_ids = fields.Many2many(
         comodel_name="cx.tower.variable",
@@ -139,6 +231,33 @@ class CxTowerFile(models.Model):
         column1="file_id",
         column2="variable_id",
     )
+    max_file_size = fields.Integer(
+        string="Max File Size, MB",
+        help="Files larger than this size are not transferred. Leave 0 for no limit",
+    )
+    transfer_progress = fields.Float(
+        compute="_compute_transfer_progress",
+        help="Progress of the latest file transfer, %",
+    )
+
+    # ---- Remote file metadata saved on the latest pull.
+    # Used to skip download of 'server' files that were not modified.
+    server_file_size = fields.Integer(
+        readonly=True,
+        copy=False,
+        help="Size of the file on server at the moment of the latest pull",
+    )
+    server_file_mtime = fields.Integer(
+        readonly=True,
+        copy=False,
+        help="Modification time (Unix timestamp) of the file on server "
+        "at the moment of the latest pull",
+    )
+    server_file_hash = fields.Char(
+        readonly=True,
+        copy=False,
+        help="SHA-256 hash of the file content received on the latest pull",
+    )
 
     @classmethod
     def _get_depends_fields(cls):
@@ -178,55 +297,196 @@ class CxTowerFile(models.Model):
         """
         return "text"
 
-    @api.depends("server_dir", "name")
-    def _compute_full_server_path(self):
+    @api.depends("blob_id")
+    def _compute_file(self):
         """
-        Compute server file path by file type and server directory
+        Get binary content from the shared content record
         """
         for file in self:
-            file.full_server_path = "{}/{}".format(
-                file.rendered_server_dir, file.rendered_name
+            file.file = file.blob_id.sudo().data
+
+    def _inverse_file(self):
+        """
+        Link file to the content record with the same checksum
+        """
+        blob_obj = self.env["cx.tower.file.blob"].sudo()
+        for file in self:
+            blob = (
+                blob_obj._get_or_create(b64decode(file.file)) if file.file else blob_obj
             )
+            if file.blob_id != blob:
+                file.sudo().blob_id = blob
 
-    @api.depends("server_id", "template_id", "name", "server_dir", "code")
+    def _compute_transfer_progress(self):
+        """
+        Get progress of the latest file transfer
+        """
+        transfers = (
+            self.env["cx.tower.file.transfer"]
+            .sudo()
+            .search([("file_id", "in", self.ids)])
+        )
+        progress = {transfer.file_id.id: transfer.progress for transfer in transfers}
+        for file in self:
+            file.transfer_progress = progress.get(file.id, 0.0)
+
+    @api.depends(
+        "server_id",
+        "template_id",
+        "name",
+        "server_dir",
+        "code",
+        "file_type",
+        "source",
+    )
     def _compute_render(self):
         """
-        Compute file name, directory and code
+        Compute file name, directory and code.
+        Variable values are fetched once per server.
+        Files are rendered only if their values or the variable values
+        they use have changed since the latest render.
         """
+        stored_values = self._get_stored_render_values()
+        files_by_server = defaultdict(lambda: self.browse())
         for file in self:
-            variables = list(
-                set(
+            files_by_server[file.server_id] |= file
+
+        for server, files in files_by_server.items():
+            variables_by_file = {
+                file: set(
                     file.get_variables_from_code(file.name)
                     + file.get_variables_from_code(file.server_dir)
                     + file.get_variables_from_code(file.code)
                 )
+                for file in files
+            }
+            references = set().union(*variables_by_file.values())
+            server_values = (
+                server.get_variable_values(list(references)).get(server.id) or {}
+                if server and references
+                else {}
             )
-            render_code_custom = file.render_code_custom
-            var_vals = file.server_id.get_variable_values(variables).get(
-                file.server_id.id
-            )
-
-            rendered_code = ""
-            if file.file_type == "text" and file.source == "tower":
-                rendered_code = (
-                    var_vals
-                    and file.code
-                    and render_code_custom(file.code, **var_vals)
-                    or file.code
-                )
-            file.update(
-                {
-                    "rendered_name": var_vals
-                    and file.name
-                    and render_code_custom(file.name, **var_vals)
-                    or file.name,
-                    "rendered_server_dir": var_vals
-                    and file.server_dir
-                    and render_code_custom(file.server_dir, **var_vals)
-                    or file.server_dir,
-                    "rendered_code": rendered_code,
+            for file in files:
+                var_vals = {
+                    reference: value
+                    for reference, value in server_values.items()
+                    if reference in variables_by_file[file]
                 }
+                render_hash = file._get_render_hash(var_vals)
+                values = stored_values.get(file.id)
+                if not values or values["render_hash"] != render_hash:
+                    # Render only if the inputs have changed
+                    values = file._render_values(var_vals)
+                    values["render_hash"] = render_hash
+                values["render_is_dynamic"] = "tower" in variables_by_file[file]
+                values["full_server_path"] = "{}/{}".format(
+                    values["rendered_server_dir"], values["rendered_name"]
+                )
+                file.update(values)
+
+    def _get_stored_render_values(self):
+        """Get rendered values saved in the database
+
+        Returns:
+            dict: {file_id: {field_name: value}}
+        """
+        file_ids = [file_id for file_id in self.ids if isinstance(file_id, int)]
+        if not file_ids:
+            return {}
+        # Read directly to avoid recomputing fields that are being computed
+        self.env.cr.execute(
+            """
+            SELECT id, render_hash, rendered_name, rendered_server_dir, rendered_code
+            FROM cx_tower_file
+            WHERE id IN %s AND render_hash IS NOT NULL
+            """,
+            (tuple(file_ids),),
+        )
+        return {row.pop("id"): row for row in self.env.cr.dictfetchall()}
+
+    def _get_render_hash(self, var_vals):
+        """Get hash of the values used to render the file
+
+        Args:
+            var_vals (dict): variable values used in the file
+
+        Returns:
+            Char: SHA-256 hash
+        """
+        self.ensure_one()
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    self.name,
+                    self.server_dir,
+                    self.code,
+                    self.file_type,
+                    self.source,
+                    var_vals,
+                ],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+
+    def _render_values(self, var_vals):
+        """Render file name, directory and code
+
+        Args:
+            var_vals (dict): variable values used in the file
+
+        Returns:
+            dict: rendered values
+        """
+        self.ensure_one()
+        render_code_custom = self.render_code_custom
+        rendered_code = ""
+        if self.file_type == "text" and self.source == "tower":
+            rendered_code = (
+                var_vals
+                and self.code
+                and render_code_custom(self.code, **var_vals)
+                or self.code
             )
+        return {
+            "rendered_name": var_vals
+            and self.name
+            and render_code_custom(self.name, **var_vals)
+            or self.name,
+            "rendered_server_dir": var_vals
+            and self.server_dir
+            and render_code_custom(self.server_dir, **var_vals)
+            or self.server_dir,
+            "rendered_code": rendered_code,
+        }
+
+    def _recompute_render(self):
+        """
+        Mark rendered values of the files to be computed again
+        """
+        for field_name in RENDERED_FIELDS:
+            self.env.add_to_compute(self._fields[field_name], self)
+
+    @api.model
+    def _recompute_render_for_variables(self, variables, servers=None):
+        """Mark files that use variables to be rendered again.
+        Variables whose values use these variables are considered too.
+
+        Args:
+            variables (cx.tower.variable): variables whose values were modified
+            servers (cx.tower.server, optional): servers the modified values
+                belong to. Files of all servers are checked if not provided,
+                eg when a global value is modified.
+        """
+        variables = variables._get_dependent_variables()
+        if not variables:
+            return
+        domain = [("variable_ids", "in", variables.ids)]
+        if servers is not None:
+            if not servers:
+                return
+            domain.append(("server_id", "in", servers.ids))
+        self.with_context(active_test=False).search(domain)._recompute_render()
 
     def _inverse_template_id(self):
         """
@@ -267,6 +527,16 @@ class CxTowerFile(models.Model):
         Override to sync files from tower
         """
         vals = self._sanitize_values(vals)
+
+        # Remote file metadata is not valid anymore if file location is changed
+        if any(field in vals for field in SERVER_FILE_LOCATION_FIELDS):
+            vals.update(
+                {
+                    "server_file_size": 0,
+                    "server_file_mtime": 0,
+                    "server_file_hash": False,
+                }
+            )
         result = super().write(vals)
 
         # sync tower files after change
@@ -298,26 +568,79 @@ class CxTowerFile(models.Model):
         """Helper function that is called after file creation or update.
         Use this function to implement custom hooks.
 
+        `auto_sync` files are synced once the transaction is committed.
+
         Args:
             op_type (str, optional): Operation type. Defaults to "write".
                 Possible options:
                     - "create"
                     - "write"
         """
+        files_to_sync = self.filtered("auto_sync")
+        if files_to_sync:
+            files_to_sync._add_to_auto_sync_queue()
+
+    def _add_to_auto_sync_queue(self):
+        """Schedule files to be synced after the current transaction is committed.
+        Files are collected once per transaction so a file
+        modified several times is synced only once.
+        Nothing is synced if the transaction is rolled back.
+        """
+        cr = self.env.cr
+        file_ids = _auto_sync_queues.get(cr)
+        if file_ids is None:
+            file_ids = _auto_sync_queues[cr] = set()
+            cr.postcommit.add(
+                partial(
+                    _run_auto_sync_after_commit,
+                    cr,
+                    self.env.uid,
+                    dict(self.env.context),
+                )
+            )
+            cr.postrollback.add(partial(_auto_sync_queues.pop, cr, None))
+        file_ids.update(file_id for file_id in self.ids if isinstance(file_id, int))
+
+    def _run_auto_sync(self):
+        """Sync files in batch per server.
+        An error on one server doesn't affect the files of other servers.
+        """
+        for server in self.mapped("server_id"):
+            server_files = self.filtered(lambda file_, s=server: file_.server_id == s)
+            try:
+                with self.env.cr.savepoint():
+                    server_files._auto_sync_wrapper()
+            except Exception as error:
+                _logger.error(
+                    "Auto sync of files on server %s failed: %s",
+                    server.name,
+                    exception_to_unicode(error),
+                )
+                server_files.sudo().write({"server_response": repr(error)})
+
+    def _auto_sync_wrapper(self):
+        """Sync files of a single server.
+        Override this function to implement custom runners, eg a job queue.
+        """
+        self._auto_sync()
+
+    def _auto_sync(self):
+        """Pull `auto_sync` server files and push `auto_sync` tower files.
+        Errors are saved into the `server_response` field of each file.
+        """
+        files = self.exists().filtered("auto_sync")
 
         # Pull all `auto_sync` server files
-        server_files_to_sync = self.filtered(
-            lambda file: file.auto_sync and file.source == "server"
-        )
+        server_files_to_sync = files.filtered(lambda file: file.source == "server")
         if server_files_to_sync:
-            server_files_to_sync.action_pull_from_server()
+            server_files_to_sync.download()
 
         # Push all `auto_sync` tower files
-        tower_files_to_sync = self.filtered(
-            lambda file: file.auto_sync and file.source == "tower"
-        )
-        if tower_files_to_sync:
-            tower_files_to_sync.action_push_to_server()
+        tower_files_to_sync = files.filtered(lambda file: file.source == "tower")
+        if len(tower_files_to_sync) > 1:
+            tower_files_to_sync.upload_bulk()
+        elif tower_files_to_sync:
+            tower_files_to_sync.upload()
 
     def action_modify_code(self):
         self.ensure_one()
@@ -506,10 +829,205 @@ class CxTowerFile(models.Model):
         """
         self._process("delete", raise_error)
 
+    def download_bulk(self, raise_error=False):
+        """Download files from server using a single compressed
+        archive stream per server instead of a file by file transfer.
+
+        Args:
+            raise_error (bool, optional):
+                Will raise and exception on error if set to 'True'.
+                Defaults to False.
+        """
+        self._process_bulk("download", raise_error)
+
+    def upload_bulk(self, raise_error=False):
+        """Upload files to server using a single compressed
+        archive stream per server instead of a file by file transfer.
+
+        Args:
+            raise_error (bool, optional):
+                Will raise and exception on error if set to 'True'.
+                Defaults to False.
+        """
+        self._process_bulk("upload", raise_error)
+
+    def _process_bulk(self, action, raise_error=False):
+        """Upload or download files packed into tar.gz archives.
+        Results are saved per file into the `server_response` field.
+
+        Args:
+            action (Selection): Action to process.
+                Possible options:
+                    - "upload": Upload files.
+                    - "download": Download files.
+            raise_error (bool, optional): Raise exception if there was an error
+                 during the operation. Defaults to False.
+
+        Raises:
+            UserError: In case file source doesn't match the requested operation.
+            ValidationError: In case there is an error while transferring files.
+        """
+        source = "tower" if action == "upload" else "server"
+        wrong_files = self.filtered(lambda file_: file_.source != source)
+        if wrong_files and raise_error:
+            raise UserError(
+                _(
+                    "File %(f)s shouldn't have the '%(src)s' source "
+                    " for the '%(act)s' action",
+                    f=wrong_files[0].name,
+                    src=wrong_files[0].source,
+                    act=action,
+                )
+            )
+        files = self - wrong_files
+        if action == "upload":
+            files.filtered("render_is_dynamic")._recompute_render()
+        responses = {}
+        for server in files.mapped("server_id"):
+            server_files = files.filtered(lambda file_, s=server: file_.server_id == s)
+            try:
+                if action == "upload":
+                    responses.update(server.upload_files_archive(server_files))
+                else:
+                    responses.update(server.download_files_archive(server_files))
+            except Exception as error:
+                if raise_error:
+                    raise ValidationError(
+                        _(
+                            "Cannot transfer files of %(srv)s: %(err)s",
+                            srv=server.name,
+                            err=exception_to_unicode(error),
+                        )
+                    ) from error
+                responses.update({file.id: repr(error) for file in server_files})
+
+        for file in files:
+            response = responses.get(file.id, _("File was not transferred"))
+            if file.server_response != response:
+                file.sudo().server_response = response
+        failed_files = files.filtered(lambda file_: file_.server_response != "ok")
+        if failed_files and raise_error:
+            raise ValidationError(
+                _(
+                    "Cannot transfer %(f)s: %(err)s",
+                    f=failed_files[0].rendered_name,
+                    err=failed_files[0].server_response,
+                )
+            )
+        files._update_file_sync_date(fields.Datetime.now())
+
+    def _save_pulled_content(self, file_obj, size, mtime):
+        """Save file content received from server
+
+        Args:
+            file_obj (file): file object to read the content from
+            size (int): file size on server
+            mtime (int): modification time of the file on server
+
+        Returns:
+            Text: 'ok' or error message
+        """
+        self.ensure_one()
+        max_file_size = self._get_max_file_size()
+        if max_file_size and size > max_file_size:
+            return _(
+                "File size %(size)s exceeds the limit of %(limit)s bytes",
+                size=size,
+                limit=max_file_size,
+            )
+        vals = {"server_file_size": size, "server_file_mtime": mtime}
+        if self.file_type == "binary":
+            with tempfile.TemporaryFile() as tmp_file:
+                sha256 = hashlib.sha256()
+                for chunk in iter(lambda: file_obj.read(FILE_CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    tmp_file.write(chunk)
+                vals["server_file_hash"] = sha256.hexdigest()
+                if self._is_pulled_content_changed(vals["server_file_hash"]):
+                    tmp_file.seek(0)
+                    self._save_file_from_stream(
+                        tmp_file, size, vals["server_file_hash"]
+                    )
+        else:
+            code = file_obj.read()
+            if b"\x00" in code:
+                return _(
+                    "Binary content is not supported for 'Text' file type",
+                )
+            vals["server_file_hash"] = hashlib.sha256(code).hexdigest()
+            if self._is_pulled_content_changed(vals["server_file_hash"]):
+                vals["code"] = code
+        self.write(vals)
+        return "ok"
+
+    def _is_pulled_content_changed(self, checksum):
+        """Check if content pulled from server must be saved.
+        Content is always saved if download is forced
+        to restore the server version of the modified file.
+
+        Args:
+            checksum (Char): SHA-256 checksum of the pulled content
+
+        Returns:
+            Bool: True if content must be saved
+        """
+        self.ensure_one()
+        return bool(
+            self.env.context.get("force_file_download")
+            or checksum != self.server_file_hash
+        )
+
+    def _get_remote_file_stats(self):
+        """Get metadata of the files on server.
+        Files are checked using a single SFTP session per server.
+
+        Returns:
+            dict: {file_id: paramiko.sftp_attr.SFTPAttributes or None}
+                Files which metadata cannot be fetched are not present in the result.
+        """
+        tower_key_obj = self.env["cx.tower.key"]
+        result = {}
+        for server in self.mapped("server_id"):
+            file_paths = {
+                file.id: tower_key_obj._parse_code(file.full_server_path)
+                for file in self.filtered(lambda f, s=server: f.server_id == s)
+            }
+            try:
+                remote_stats = server.stat_files(list(set(file_paths.values())))
+            except Exception as error:
+                # Fallback to regular download if metadata is not available
+                _logger.warning(
+                    "Cannot get file metadata from server %s: %s",
+                    server.name,
+                    exception_to_unicode(error),
+                )
+                continue
+            for file_id, file_path in file_paths.items():
+                result[file_id] = remote_stats.get(file_path)
+        return result
+
+    def _is_server_file_unchanged(self, remote_stat):
+        """Check if the file on server was modified since the latest pull
+
+        Args:
+            remote_stat (paramiko.sftp_attr.SFTPAttributes): remote file metadata
+
+        Returns:
+            bool: True if file was not modified
+        """
+        self.ensure_one()
+        return bool(
+            remote_stat
+            and self.server_file_hash
+            and self.server_file_size == remote_stat.st_size
+            and self.server_file_mtime == remote_stat.st_mtime
+        )
+
     def _process_download(
         self,
         tower_key_obj,
         is_server_code_version_process=False,
+        remote_stat=None,
     ):
         """
         Processing of file download.
@@ -522,6 +1040,8 @@ class CxTowerFile(models.Model):
             is_server_code_version_process (bool):
                 Flag to fetch actual file content from server
                 for a `tower` type file.
+            remote_stat (paramiko.sftp_attr.SFTPAttributes, optional):
+                Remote file metadata to save along with the file content.
 
         Returns:
             [dict|str|None]:
@@ -531,6 +1051,18 @@ class CxTowerFile(models.Model):
                 None otherwise.
         """
         self.ensure_one()
+        if self.file_type == "binary" and not is_server_code_version_process:
+            return self._process_download_stream(tower_key_obj, remote_stat)
+
+        max_file_size = self._get_max_file_size()
+        if remote_stat and max_file_size and remote_stat.st_size > max_file_size:
+            raise ValidationError(
+                _(
+                    "File size %(size)s exceeds the limit of %(limit)s bytes",
+                    size=remote_stat.st_size,
+                    limit=max_file_size,
+                )
+            )
         code = self.server_id.download_file(
             tower_key_obj._parse_code(self.full_server_path),
         )
@@ -552,10 +1084,228 @@ class CxTowerFile(models.Model):
         # In case server version of a 'tower' file is requested
         if is_server_code_version_process:
             return code
+
+        vals = {"server_file_hash": hashlib.sha256(code).hexdigest()}
+        if remote_stat:
+            vals.update(
+                {
+                    "server_file_size": remote_stat.st_size,
+                    "server_file_mtime": remote_stat.st_mtime,
+                }
+            )
+        # Do not rewrite content if it's the same as the pulled before
+        if self._is_pulled_content_changed(vals["server_file_hash"]):
+            vals["code"] = code
+        self.write(vals)
+
+    def _process_download_stream(self, tower_key_obj, remote_stat=None):
+        """
+        Download binary file streaming its content to the filestore.
+        Content is transferred in chunks through a temporary file
+        and is never kept in memory or encoded with base64 as a whole.
+
+        Args:
+            tower_key_obj (RecordSet): `cx.tower.key`
+                recordset to parse file path.
+            remote_stat (paramiko.sftp_attr.SFTPAttributes, optional):
+                Remote file metadata to save along with the file content.
+        """
+        self.ensure_one()
+        with tempfile.TemporaryFile() as tmp_file:
+            with self._track_transfer_progress() as callback:
+                size = self.server_id.download_file_stream(
+                    tower_key_obj._parse_code(self.full_server_path),
+                    tmp_file,
+                    max_size=self._get_max_file_size(),
+                    callback=callback,
+                )
+            sha256 = hashlib.sha256()
+            tmp_file.seek(0)
+            for chunk in iter(lambda: tmp_file.read(FILE_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+
+            vals = {"server_file_hash": sha256.hexdigest()}
+            if remote_stat:
+                vals.update(
+                    {
+                        "server_file_size": remote_stat.st_size,
+                        "server_file_mtime": remote_stat.st_mtime,
+                    }
+                )
+            # Do not rewrite content if it's the same as the pulled before
+            if self._is_pulled_content_changed(vals["server_file_hash"]):
+                tmp_file.seek(0)
+                self._save_file_from_stream(tmp_file, size, vals["server_file_hash"])
+        self.write(vals)
+
+    def _get_max_file_size(self):
+        """Get maximum size of the file that can be transferred
+
+        Returns:
+            int: size in bytes. 0 means no limit.
+        """
+        self.ensure_one()
+        return self.max_file_size * 1024 * 1024
+
+    def _save_file_from_stream(self, file_obj, size, sha256):
+        """Save `file` field content from a file object.
+        File is linked to the content record with the same checksum,
+        new content is saved without base64 encoding.
+
+        Args:
+            file_obj (file): open binary file object
+            size (int): content size in bytes
+            sha256 (Char): SHA-256 checksum of the content
+        """
+        self.ensure_one()
+        blob = (
+            self.env["cx.tower.file.blob"]
+            .sudo()
+            ._get_or_create_from_stream(file_obj, size, sha256)
+        )
+        if self.blob_id != blob:
+            self.sudo().blob_id = blob
+
+    def _open_file_stream(self):
+        """Open `file` field content for reading without loading it
+        into memory if it is stored in the filestore.
+
+        Returns:
+            contextmanager: yields (open binary file object, content size in bytes)
+        """
+        self.ensure_one()
+        return self.blob_id.sudo()._open_stream()
+
+    def _process_upload_stream(self, tower_key_obj):
+        """
+        Upload binary file streaming its content from the filestore.
+
+        Args:
+            tower_key_obj (RecordSet): `cx.tower.key`
+                recordset to parse file path.
+        """
+        self.ensure_one()
+        max_file_size = self._get_max_file_size()
+        with self._open_file_stream() as (file_obj, size):
+            if max_file_size and size > max_file_size:
+                raise ValidationError(
+                    _(
+                        "File size %(size)s exceeds the limit of %(limit)s bytes",
+                        size=size,
+                        limit=max_file_size,
+                    )
+                )
+            with self._track_transfer_progress() as callback:
+                self.server_id.upload_file_stream(
+                    file_obj,
+                    tower_key_obj._parse_code(self.full_server_path),
+                    file_size=size,
+                    callback=callback,
+                )
+
+    @contextmanager
+    def _track_transfer_progress(self):
+        """Save progress of a file transfer.
+        Progress is saved each time it grows by `TRANSFER_PROGRESS_STEP`
+        using a separate cursor, so it is visible while the transfer is running.
+        The cursor is opened once per transfer.
+
+        Yields:
+            function: callback(transferred, total)
+        """
+        self.ensure_one()
+        saved = {"progress": -TRANSFER_PROGRESS_STEP}
+        with self.env.registry.cursor() as cr:
+            transfer_obj = self.env(cr=cr, su=True)["cx.tower.file.transfer"]
+
+            def callback(transferred, total):
+                progress = min(transferred * 100.0 / total, 100.0) if total else 100.0
+                if progress - saved["progress"] >= TRANSFER_PROGRESS_STEP or (
+                    progress == 100.0 and saved["progress"] < 100.0
+                ):
+                    saved["progress"] = progress
+                    try:
+                        transfer_obj._set_progress(self.id, progress)
+                        cr.commit()
+                    except psycopg2.Error as error:
+                        # Eg file is not committed yet
+                        cr.rollback()
+                        transfer_obj.invalidate_cache()
+                        _logger.debug(
+                            "Cannot save transfer progress of %s: %s", self, error
+                        )
+
+            yield callback
+
+    def _check_process_action(self, action, raise_error=False):
+        """
+        Check if the action can be applied to the file.
+        Note: moved this functionality to a separate function from
+        the general `_process` method because it is already too complex.
+
+        Args:
+            action (Selection): "upload", "download" or "delete"
+            raise_error (bool, optional): Raise exception instead of
+                returning False. Defaults to False.
+
+        Raises:
+            UserError: In case file source doesn't match the action.
+            AccessError: In case user is not allowed to delete the file.
+
+        Returns:
+            Bool: True if the action can be applied
+        """
+        self.ensure_one()
+        if not self.env.context.get("is_server_code_version_process") and (
+            (action == "download" and self.source != "server")
+            or (action == "upload" and self.source != "tower")
+            or (action == "delete" and self.source != "tower")
+        ):
+            if raise_error:
+                raise UserError(
+                    _(
+                        "File %(f)s shouldn't have the '%(src)s' source "
+                        " for the '%(act)s' action",
+                        f=self.name,
+                        src=self.source,
+                        act=action,
+                    )
+                )
+            return False
+
+        if action == "delete":
+            try:
+                self.check_access_rights("unlink")
+                self.check_access_rule("unlink")
+            except AccessError as e:
+                if raise_error:
+                    raise AccessError(
+                        _(
+                            "Due to security restrictions you are "
+                            "not allowed to delete %(fp)s",
+                            fp=self.full_server_path,
+                        )
+                    ) from e
+                return False
+        return True
+
+    def _process_upload(self, tower_key_obj):
+        """
+        Upload file to server.
+        Binary files are streamed from the filestore.
+
+        Args:
+            tower_key_obj (RecordSet): `cx.tower.key`
+                recordset to parse file content and path.
+        """
+        self.ensure_one()
         if self.file_type == "binary":
-            self.file = b64encode(code)
+            self._process_upload_stream(tower_key_obj)
         else:
-            self.code = code
+            self.server_id.upload_file(
+                tower_key_obj._parse_code(self.rendered_code),
+                tower_key_obj._parse_code(self.full_server_path),
+            )
 
     def _process(self, action, raise_error=False):
         """Upload or download file to/from server.
@@ -578,6 +1328,10 @@ class CxTowerFile(models.Model):
             raise_error (bool, optional): Raise exception if there was an error
                  during the operation. Defaults to False.
 
+        Context:
+            force_file_download (Bool): download 'server' files even if
+                they were not modified since the latest pull.
+
         Raises:
             UserError: In case file format doesn't match the requested operation.
                 Eg if trying to upload 'server' type file.
@@ -592,55 +1346,42 @@ class CxTowerFile(models.Model):
         is_server_code_version_process = self.env.context.get(
             "is_server_code_version_process"
         )
+
+        # Check remote file metadata in batch to skip unmodified files.
+        # Metadata is saved for forced downloads too.
+        remote_stats = {}
+        force_download = self.env.context.get("force_file_download")
+        if action == "download" and not is_server_code_version_process:
+            remote_stats = self.filtered(
+                lambda file_: file_.source == "server"
+            )._get_remote_file_stats()
+        unchanged_files = self.browse()
+
+        # System variable values may change without any trace
+        if action == "upload":
+            self.filtered("render_is_dynamic")._recompute_render()
+
         for file in self:
-            if not is_server_code_version_process and (
-                (action == "download" and file.source != "server")
-                or (action == "upload" and file.source != "tower")
-                or (action == "delete" and file.source != "tower")
-            ):
-                if raise_error:
-                    raise UserError(
-                        _(
-                            "File %(f)s shouldn't have the '%(src)s' source "
-                            " for the '%(act)s' action",
-                            f=file.name,
-                            src=file.source,
-                            act=action,
-                        )
-                    )
+            if not file._check_process_action(action, raise_error):
                 return False
 
-            if action == "delete":
-                try:
-                    file.check_access_rights("unlink")
-                    file.check_access_rule("unlink")
-                except AccessError as e:
-                    if raise_error:
-                        raise AccessError(
-                            _(
-                                "Due to security restrictions you are "
-                                "not allowed to delete %(fp)s",
-                                fp=file.full_server_path,
-                            )
-                        ) from e
-                    return False
-
             try:
                 if action == "download":
+                    remote_stat = remote_stats.get(file.id)
+                    if not force_download and file._is_server_file_unchanged(
+                        remote_stat
+                    ):
+                        unchanged_files |= file
+                        if file.server_response != "ok":
+                            file.sudo().server_response = "ok"
+                        continue
                     res = file._process_download(
-                        tower_key_obj, is_server_code_version_process
+                        tower_key_obj, is_server_code_version_process, remote_stat
                     )
                     if res:
                         return res
                 elif action == "upload":
-                    if file.file_type == "binary":
-                        file_content = b64decode(file.file)
-                    else:
-                        file_content = tower_key_obj._parse_code(file.rendered_code)
-                    file.server_id.upload_file(
-                        file_content,
-                        tower_key_obj._parse_code(file.full_server_path),
-                    )
+                    file._process_upload(tower_key_obj)
                 elif action == "delete":
                     file.server_id.delete_file(
                         tower_key_obj._parse_code(file.full_server_path)
@@ -660,7 +1401,9 @@ class CxTowerFile(models.Model):
                 file.server_response = repr(error)
 
         if not is_server_code_version_process:
-            self._update_file_sync_date(fields.Datetime.now())
+            now = fields.Datetime.now()
+            (self - unchanged_files)._update_file_sync_date(now)
+            unchanged_files._update_file_sync_date(now, update_last_sync=False)
 
     @api.model
     def _get_tower_sync_field_names(self):
@@ -680,14 +1423,94 @@ class CxTowerFile(models.Model):
             [
                 ("source", "=", "server"),
                 ("auto_sync", "=", True),
+                ("auto_sync_mode", "=", "poll"),
                 ("sync_date_next", "<=", now),
             ]
         )
         files.download(raise_error=False)
 
-    def _update_file_sync_date(self, last_sync_date):
+    @api.model
+    def _get_watched_paths_by_server(self):
+        """Get paths of the files that are synced using watchers
+
+        Returns:
+            dict: {server_id: tuple of full file paths}
+        """
+        tower_key_obj = self.env["cx.tower.key"]
+        files = self.search(
+            [
+                ("source", "=", "server"),
+                ("auto_sync", "=", True),
+                ("auto_sync_mode", "=", "watch"),
+            ]
+        )
+        paths_by_server = {}
+        for file in files:
+            paths_by_server.setdefault(file.server_id.id, set()).add(
+                tower_key_obj._parse_code(file.full_server_path)
+            )
+        return {
+            server_id: tuple(sorted(paths))
+            for server_id, paths in paths_by_server.items()
+        }
+
+    @api.model
+    def _run_file_watchers(self):
+        """
+        Start, restart or stop file watchers of the current worker.
+        Files of the servers that cannot be watched because
+        the watcher limit is reached are pulled using polling.
+        """
+        limit = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("cetmix_tower_server.file_watcher_limit", WATCHER_LIMIT)
+        )
+        unwatched_server_ids = supervise_watchers(
+            self.env.cr.dbname, self._get_watched_paths_by_server(), limit
+        )
+        if unwatched_server_ids:
+            files = self.search(
+                [
+                    ("source", "=", "server"),
+                    ("auto_sync", "=", True),
+                    ("auto_sync_mode", "=", "watch"),
+                    ("server_id", "in", list(unwatched_server_ids)),
+                    ("sync_date_next", "<=", fields.Datetime.now()),
+                ]
+            )
+            files.download(raise_error=False)
+
+    @api.model
+    def _pull_watched_files(self, server_id, paths):
+        """Pull watched files reported as changed on server
+
+        Args:
+            server_id (int): id of the `cx.tower.server` record
+            paths (set of Text): full paths of the changed files
+        """
+        tower_key_obj = self.env["cx.tower.key"]
+        files = self.search(
+            [
+                ("server_id", "=", server_id),
+                ("source", "=", "server"),
+                ("auto_sync", "=", True),
+                ("auto_sync_mode", "=", "watch"),
+            ]
+        ).filtered(
+            lambda file: tower_key_obj._parse_code(file.full_server_path) in paths
+        )
+        files.download(raise_error=False)
+
+    def _update_file_sync_date(self, last_sync_date, update_last_sync=True):
         """
         Compute and update next date of sync
+
+        Args:
+            last_sync_date (Datetime): date of the current synchronisation
+            update_last_sync (bool, optional): Update 'Last Sync Date' too.
+                Set to False for files that were not modified on server.
+                Defaults to True.
         """
         for file in self:
             vals = {}
@@ -699,6 +1522,7 @@ class CxTowerFile(models.Model):
                         + INTERVAL_TYPES[interval_type](int(interval))
                     }
                 )
-            if file.server_response == "ok":
+            if update_last_sync and file.server_response == "ok":
                 vals.update({"sync_date_last": last_sync_date})
-            file.sudo().write(vals)
+            if vals:
+                file.sudo().write(vals)
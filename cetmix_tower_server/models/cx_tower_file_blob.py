@@ -0,0 +1,185 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import hashlib
+import io
+import logging
+from base64 import b64decode, b64encode
+from contextlib import contextmanager
+
+from dateutil.relativedelta import relativedelta
+from psycopg2 import IntegrityError
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Unreferenced content is kept for this period to avoid
+# removing content of the files that are being saved right now
+BLOB_GC_DELAY_HOURS = 1
+
+
+class CxTowerFileBlob(models.Model):
+    """
+    Binary file content addressed by its hash.
+    Files with identical content share the same record.
+    """
+
+    _name = "cx.tower.file.blob"
+    _description = "Cetmix Tower File Content"
+    _rec_name = "checksum"
+
+    checksum = fields.Char(
+        required=True,
+        readonly=True,
+        index=True,
+        help="SHA-256 hash of the content",
+    )
+    data = fields.Binary(attachment=True, readonly=True)
+    file_size = fields.Integer(readonly=True)
+    file_ids = fields.One2many(
+        comodel_name="cx.tower.file",
+        inverse_name="blob_id",
+    )
+
+    _sql_constraints = [
+        (
+            "checksum_unique",
+            "UNIQUE(checksum)",
+            "Content with the same checksum already exists",
+        )
+    ]
+
+    @api.model
+    def _get_or_create(self, data):
+        """Get record holding the content or create a new one
+
+        Args:
+            data (Bytes): file content
+
+        Returns:
+            cx.tower.file.blob: content record
+        """
+        checksum = hashlib.sha256(data).hexdigest()
+        return self._get_by_checksum(checksum) or self._create_blob(
+            checksum, {"data": b64encode(data), "file_size": len(data)}
+        )
+
+    @api.model
+    def _get_or_create_from_stream(self, file_obj, size, sha256):
+        """Get record holding the content or create a new one.
+        Content is saved by `ir.attachment` from its raw value,
+        so it is not encoded with base64.
+
+        Args:
+            file_obj (file): open binary file object
+            size (int): content size in bytes
+            sha256 (Char): SHA-256 checksum of the content
+
+        Returns:
+            cx.tower.file.blob: content record
+        """
+        blob = self._get_by_checksum(sha256)
+        if blob:
+            return blob
+        blob = self._create_blob(sha256, {"file_size": size})
+        if blob._get_attachment():
+            # Same content was saved concurrently
+            return blob
+        self.env["ir.attachment"].sudo().create(
+            {
+                "name": "data",
+                "res_model": self._name,
+                "res_field": "data",
+                "res_id": blob.id,
+                "raw": file_obj.read(),
+            }
+        )
+        return blob
+
+    @api.model
+    def _get_by_checksum(self, checksum):
+        """Get content record by checksum
+
+        Args:
+            checksum (Char): SHA-256 checksum of the content
+
+        Returns:
+            cx.tower.file.blob: content record or empty recordset
+        """
+        return self.search([("checksum", "=", checksum)], limit=1)
+
+    @api.model
+    def _create_blob(self, checksum, vals):
+        """Create content record.
+        Existing record is returned if the same content
+        was saved concurrently.
+
+        Args:
+            checksum (Char): SHA-256 checksum of the content
+            vals (dict): values of the new record
+
+        Returns:
+            cx.tower.file.blob: content record
+        """
+        try:
+            with self.env.cr.savepoint():
+                return self.create(dict(vals, checksum=checksum))
+        except IntegrityError:
+            return self._get_by_checksum(checksum)
+
+    def _get_attachment(self):
+        """Get attachment that keeps the content
+
+        Returns:
+            ir.attachment: attachment record
+        """
+        self.ensure_one()
+        return (
+            self.env["ir.attachment"]
+            .sudo()
+            .search(
+                [
+                    ("res_model", "=", self._name),
+                    ("res_field", "=", "data"),
+                    ("res_id", "=", self.id),
+                ],
+                limit=1,
+            )
+        )
+
+    @contextmanager
+    def _open_stream(self):
+        """Open content for reading without loading it into memory
+        if it is stored in the filestore.
+
+        Yields:
+            tuple: (open binary file object, content size in bytes)
+        """
+        attachment = self._get_attachment() if self else self.env["ir.attachment"]
+        if attachment.store_fname:
+            with open(attachment._full_path(attachment.store_fname), "rb") as file_obj:
+                yield file_obj, attachment.file_size
+        else:
+            data = self.with_context(bin_size=False).data
+            data = b64decode(data) if data else b""
+            yield io.BytesIO(data), len(data)
+
+    @api.model
+    def _gc_unreferenced_blobs(self):
+        """
+        Remove content that is not used by any file
+        """
+        blobs = self.search(
+            [
+                ("file_ids", "=", False),
+                (
+                    "create_date",
+                    "<",
+                    fields.Datetime.now() - relativedelta(hours=BLOB_GC_DELAY_HOURS),
+                ),
+            ]
+        ).with_context(active_test=False)
+        # Archived files keep their content too
+        blobs = blobs.filtered(lambda blob: not blob.file_ids)
+        _logger.info("Removing %s unreferenced file contents", len(blobs))
+        blobs.unlink()
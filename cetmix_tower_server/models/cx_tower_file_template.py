@@ -1,11 +1,20 @@
 # Copyright (C) 2024 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import hashlib
+import io
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from odoo import _, fields, models
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import exception_to_unicode
 
 from .cx_tower_file import TEMPLATE_FILE_FIELD_MAPPING
 
+# Default number of servers files are uploaded to simultaneously
+PUSH_MAX_WORKERS = 10
+
 
 class CxTowerFileTemplate(models.Model):
     _name = "cx.tower.file.template"
@@ -93,8 +102,13 @@ class CxTowerFileTemplate(models.Model):
         """
         result = super(CxTowerFileTemplate, self).write(vals)
         if any([field_ in vals for field_ in TEMPLATE_FILE_FIELD_MAPPING]):
+            # Write files receiving the same values at once
+            files_by_values = defaultdict(lambda: self.env["cx.tower.file"])
             for file in self.mapped("file_ids"):
-                file.write(file._get_file_values_from_related_template())
+                file_values = file._get_file_values_from_related_template()
+                files_by_values[tuple(sorted(file_values.items()))] |= file
+            for file_values, files in files_by_values.items():
+                files.write(dict(file_values))
         return result
 
     def action_open_files(self):
@@ -148,13 +162,228 @@ class CxTowerFileTemplate(models.Model):
             return existing_file
 
         return file_model.with_context(is_custom_server_dir=True).create(
-            {
-                "template_id": self.id,
-                "server_id": server.id,
-                "name": self.file_name,
-                "code_on_server": self.code,
-                "server_dir": server_dir or self.server_dir,
-                "file_type": self.file_type,
-                "source": self.source,
-            }
+            self._prepare_file_values(server, server_dir)
         )
+
+    def _create_files(self, servers):
+        """
+        Create files using the templates for several servers at once.
+        Files that already exist are not created again.
+
+        Args:
+            servers (cx.tower.server): servers to create files for
+
+        Returns:
+            dict: {(template id, server id): cx.tower.file}
+        """
+        file_model = self.env["cx.tower.file"]
+        files = {}
+        existing_files = file_model.search(
+            [("template_id", "in", self.ids), ("server_id", "in", servers.ids)]
+        )
+        for existing_file in existing_files:
+            template = existing_file.template_id
+            if (
+                existing_file.server_dir == template.server_dir
+                and existing_file.source == template.source
+            ):
+                files.setdefault(
+                    (template.id, existing_file.server_id.id), existing_file
+                )
+
+        keys = []
+        vals_list = []
+        for template in self:
+            for server in servers:
+                key = (template.id, server.id)
+                if key not in files:
+                    keys.append(key)
+                    vals_list.append(template._prepare_file_values(server))
+        new_files = file_model.with_context(is_custom_server_dir=True).create(vals_list)
+        files.update(zip(keys, new_files))
+        return files
+
+    def _prepare_file_values(self, server, server_dir=""):
+        """Prepare values of a file created using the template
+
+        Args:
+            server (cx.tower.server): server the file is created for
+            server_dir (Char, optional): directory on the server.
+                Template directory is used if not set.
+
+        Returns:
+            dict: values to create file with
+        """
+        self.ensure_one()
+        return {
+            "template_id": self.id,
+            "server_id": server.id,
+            "name": self.file_name,
+            "code_on_server": self.code,
+            "server_dir": server_dir or self.server_dir,
+            "file_type": self.file_type,
+            "source": self.source,
+        }
+
+    def _get_or_create_files(self, servers, server_dir=""):
+        """Get files created using the template for the servers.
+        Missing files are created in a single batch.
+
+        Args:
+            servers (cx.tower.server): servers to get files for
+            server_dir (Char, optional): directory on the servers.
+                Template directory is used if not set.
+
+        Returns:
+            cx.tower.file: files
+        """
+        self.ensure_one()
+        file_model = self.env["cx.tower.file"]
+        files = file_model.search(
+            [
+                ("template_id", "=", self.id),
+                ("server_id", "in", servers.ids),
+                ("server_dir", "=", server_dir or self.server_dir),
+                ("source", "=", self.source),
+            ]
+        )
+        servers_without_file = servers - files.mapped("server_id")
+        if servers_without_file:
+            files |= file_model.with_context(is_custom_server_dir=True).create(
+                [
+                    self._prepare_file_values(server, server_dir)
+                    for server in servers_without_file
+                ]
+            )
+        return files
+
+    def _render_for_servers(self, servers, server_dir=""):
+        """Render file name, directory and content for several servers.
+        Variable values of all servers are fetched in a single batch.
+        Servers with the same values of the variables used in the template
+        share the same rendered output which is rendered only once.
+
+        Args:
+            servers (cx.tower.server): servers to render the template for
+            server_dir (Char, optional): directory on the servers.
+                Template directory is used if not set.
+
+        Returns:
+            dict: {server_id: (full file path, Bytes rendered content)}
+        """
+        self.ensure_one()
+        tower_key_obj = self.env["cx.tower.key"]
+        server_dir = server_dir or self.server_dir or ""
+        variables = list(
+            set(
+                self.get_variables_from_code(self.file_name or "")
+                + self.get_variables_from_code(server_dir)
+                + self.get_variables_from_code(self.code or "")
+            )
+        )
+        variable_values = servers.get_variable_values(variables) if variables else {}
+
+        def render(code, var_vals):
+            if var_vals and code:
+                return self.render_code_custom(code, **var_vals)
+            return code
+
+        rendered_outputs = {}
+        result = {}
+        for server in servers:
+            var_vals = variable_values.get(server.id) or {}
+            output_key = hashlib.sha256(
+                json.dumps(var_vals, sort_keys=True, default=str).encode()
+            ).hexdigest()
+            if output_key not in rendered_outputs:
+                rendered_outputs[output_key] = (
+                    tower_key_obj._parse_code(
+                        "{}/{}".format(
+                            render(server_dir, var_vals),
+                            render(self.file_name or "", var_vals),
+                        )
+                    ),
+                    tower_key_obj._parse_code(
+                        render(self.code or "", var_vals) or ""
+                    ).encode(),
+                )
+            result[server.id] = rendered_outputs[output_key]
+        return result
+
+    def push_to_servers(self, servers, server_dir="", max_workers=PUSH_MAX_WORKERS):
+        """
+        Create files using the template for several servers and upload them.
+        Template is rendered once per unique set of variable values
+        and files are uploaded to several servers in parallel
+        using a single connection per server.
+
+        Args:
+            servers (cx.tower.server): servers to push the file to
+            server_dir (Char, optional): directory on the servers.
+                Template directory is used if not set.
+            max_workers (int, optional): number of servers the file
+                is uploaded to simultaneously.
+
+        Raises:
+            UserError: if template can't be pushed to servers.
+
+        Returns:
+            dict: {server_id: server response}, 'ok' for successful upload
+        """
+        self.ensure_one()
+        if self.source != "tower" or self.file_type != "text":
+            raise UserError(
+                _(
+                    "Only text templates with the 'Tower' source "
+                    "can be pushed to servers"
+                )
+            )
+        if not servers:
+            return {}
+        files = self._get_or_create_files(servers, server_dir)
+        rendered = self._render_for_servers(servers, server_dir)
+
+        # SSH clients are prepared before the upload because ORM
+        # can't be used in threads
+        responses = {}
+        uploads = []
+        for server in servers:
+            try:
+                client = server._get_ssh_client(raise_on_error=True)
+            except Exception as error:
+                responses[server.id] = exception_to_unicode(error)
+                continue
+            uploads.append((server.id, client) + rendered[server.id])
+
+        def upload(client, remote_path, content):
+            try:
+                client.upload_file(io.BytesIO(content), remote_path)
+                return "ok"
+            except Exception as error:
+                return repr(error)
+            finally:
+                client.disconnect()
+
+        if uploads:
+            with ThreadPoolExecutor(
+                max_workers=max(min(max_workers, len(uploads)), 1)
+            ) as executor:
+                futures = {
+                    server_id: executor.submit(upload, client, remote_path, content)
+                    for server_id, client, remote_path, content in uploads
+                }
+            responses.update(
+                {server_id: future.result() for server_id, future in futures.items()}
+            )
+
+        # Save results with a single write per response
+        files_by_response = defaultdict(lambda: files.browse())
+        for file in files:
+            files_by_response[responses[file.server_id.id]] |= file
+        now = fields.Datetime.now()
+        for response, response_files in files_by_response.items():
+            vals = {"server_response": response}
+            if response == "ok":
+                vals["sync_date_last"] = now
+            response_files.sudo().write(vals)
+        return responses
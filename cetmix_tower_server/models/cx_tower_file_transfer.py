@@ -0,0 +1,47 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import api, fields, models
+
+
+class CxTowerFileTransfer(models.Model):
+    """
+    Progress of the latest file transfer.
+    Kept apart from the file record so it can be updated
+    from a separate transaction while the transfer is running.
+    """
+
+    _name = "cx.tower.file.transfer"
+    _description = "Cetmix Tower File Transfer"
+    _rec_name = "file_id"
+
+    file_id = fields.Many2one(
+        comodel_name="cx.tower.file",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    progress = fields.Float(readonly=True, help="Transfer progress, %")
+
+    _sql_constraints = [
+        (
+            "file_id_unique",
+            "UNIQUE(file_id)",
+            "Transfer progress is already saved for this file",
+        )
+    ]
+
+    @api.model
+    def _set_progress(self, file_id, progress):
+        """Save transfer progress of the file
+
+        Args:
+            file_id (int): id of the file
+            progress (float): transfer progress, %
+        """
+        transfer = self.search([("file_id", "=", file_id)], limit=1)
+        if transfer:
+            transfer.progress = progress
+        else:
+            self.create({"file_id": file_id, "progress": progress})
+        self.flush()
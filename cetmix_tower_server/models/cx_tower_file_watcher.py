@@ -0,0 +1,313 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""
+File watchers running in the worker threads.
+
+Watchers are started by the cron in the worker process that runs it.
+They are not shared between processes and stop together with the process,
+eg when a prefork worker is recycled after reaching its request, memory
+or time limits. The server lock is released along with the connection,
+so the next cron run in any worker starts the watcher again.
+Files are pulled once the watcher is started, so changes made
+while no watcher was running are not lost.
+"""
+import logging
+import shlex
+import threading
+import time
+from os.path import dirname
+
+import psycopg2
+
+import odoo
+from odoo import SUPERUSER_ID, api
+
+_logger = logging.getLogger(__name__)
+
+# Default maximum number of watchers running in a single worker
+WATCHER_LIMIT = 20
+# Interval of the fallback 'stat' loop if 'inotifywait' is not available, seconds
+WATCHER_POLL_INTERVAL = 5
+# Changes are pulled once no new events arrive during this period, seconds
+WATCHER_DEBOUNCE = 1.0
+# Maximum delay before reconnecting a failed watcher, seconds
+WATCHER_MAX_BACKOFF = 300
+
+# Prefixes used to tell events of 'inotifywait' and 'stat' apart
+EVENT_PREFIX = "E "
+STAT_PREFIX = "S "
+
+# Name of the advisory lock held by the worker that watches the server
+WATCHER_LOCK_NAME = "cx_tower_file_watcher"
+
+# Running watchers: {(dbname, server_id): FileWatcher}
+_watchers = {}
+# Connections holding the watcher locks: {dbname: Cursor}
+_lock_cursors = {}
+_watchers_lock = threading.Lock()
+
+
+def get_watch_command(paths, interval=WATCHER_POLL_INTERVAL):
+    """Compose a shell command that reports changes of the remote files.
+    'inotifywait' is used if available, otherwise files are checked
+    with 'stat' every `interval` seconds and their list is printed
+    only when any of them changes.
+
+    Args:
+        paths (list of Text): full paths of the files to watch
+        interval (int, optional): interval of the fallback 'stat' loop.
+
+    Returns:
+        Text: shell command
+    """
+    quoted_paths = " ".join(shlex.quote(path) for path in paths)
+    # Watch directories to catch files replaced by rename, eg by editors
+    quoted_dirs = " ".join(
+        shlex.quote(directory.rstrip("/") + "/")
+        for directory in sorted({dirname(path) for path in paths})
+    )
+    return (
+        "if command -v inotifywait >/dev/null 2>&1; then "
+        "inotifywait -m -q -e close_write -e moved_to -e create -e delete "
+        f"--format '{EVENT_PREFIX}%w%f' {quoted_dirs} 2>/dev/null; "
+        "else prev=''; while :; do "
+        f"cur=$(stat -c '{STAT_PREFIX}%Y %s %n' {quoted_paths} 2>/dev/null); "
+        '[ "$cur" != "$prev" ] && printf \'%s\\n\' "$cur"; '
+        f'prev="$cur"; sleep {int(interval)}; done; fi'
+    )
+
+
+class FileWatcher(threading.Thread):
+    """
+    Watches files of a single server using one long-living SSH channel
+    and pulls the files that were reported as changed.
+    Reconnects automatically with an exponential backoff.
+    """
+
+    def __init__(self, dbname, server_id, paths):
+        """
+        Args:
+            dbname (Text): database name
+            server_id (int): id of the `cx.tower.server` record
+            paths (tuple of Text): full paths of the watched files
+        """
+        super().__init__(
+            name=f"cx_tower_file_watcher_{dbname}_{server_id}", daemon=True
+        )
+        self.dbname = dbname
+        self.server_id = server_id
+        self.paths = paths
+        self.stop_event = threading.Event()
+        self._signatures = {}
+
+    def stop(self):
+        """Request the watcher to stop"""
+        self.stop_event.set()
+
+    def run(self):
+        attempt = 0
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self._watch()
+            # Thread must keep running whatever happens to the connection
+            except Exception:
+                _logger.exception("File watcher for server %s failed", self.server_id)
+            # Reset backoff if the watcher was running long enough
+            if time.monotonic() - started > WATCHER_MAX_BACKOFF:
+                attempt = 0
+            self.stop_event.wait(min(2**attempt, WATCHER_MAX_BACKOFF))
+            attempt += 1
+
+    def _get_ssh_client(self):
+        """Create SSH client for the watched server.
+        Database cursor is closed before the client is used.
+
+        Returns:
+            SSH: SSH client instance
+        """
+        with api.Environment.manage(), odoo.registry(self.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            return env["cx.tower.server"].browse(self.server_id)._get_ssh_client()
+
+    def _watch(self):
+        """Stream remote events and pull changed files"""
+        client = self._get_ssh_client()
+        # Pull changes that could be missed while the watcher was not running.
+        # Files that were not modified are skipped using their metadata.
+        changed_paths = set(self.paths)
+        last_event = 0
+        try:
+            for line in client.exec_command_stream(
+                get_watch_command(self.paths), stop_event=self.stop_event
+            ):
+                if line:
+                    paths = self._parse_line(line)
+                    if paths:
+                        changed_paths |= paths
+                        last_event = time.monotonic()
+                elif changed_paths and (
+                    time.monotonic() - last_event >= WATCHER_DEBOUNCE
+                ):
+                    self._pull_files(changed_paths)
+                    changed_paths = set()
+        finally:
+            client.disconnect()
+        if changed_paths:
+            self._pull_files(changed_paths)
+
+    def _parse_line(self, line):
+        """Get paths of the changed files from a line of the watch command output
+
+        Args:
+            line (Text): output line
+
+        Returns:
+            set: paths of the watched files that were changed
+        """
+        if line.startswith(EVENT_PREFIX):
+            path = line[len(EVENT_PREFIX) :]
+            return {path} if path in self.paths else set()
+        if line.startswith(STAT_PREFIX):
+            signature, _sep, path = line[len(STAT_PREFIX) :].partition(" ")
+            size, _sep, path = path.partition(" ")
+            signature = f"{signature} {size}"
+            if path in self.paths and self._signatures.get(path) != signature:
+                self._signatures[path] = signature
+                return {path}
+        return set()
+
+    def _pull_files(self, paths):
+        """Pull files located at the given paths
+
+        Args:
+            paths (set of Text): full paths of the changed files
+        """
+        with api.Environment.manage(), odoo.registry(self.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env["cx.tower.file"]._pull_watched_files(self.server_id, paths)
+
+
+def _get_lock_cursor(dbname):
+    """Get connection holding the watcher locks of the database.
+    Locks are lost with the connection, so watchers of the database
+    are stopped if the connection is broken.
+    Must be called with `_watchers_lock` acquired.
+
+    Args:
+        dbname (Text): database name
+
+    Returns:
+        Cursor: autocommit database cursor
+    """
+    lock_cr = _lock_cursors.get(dbname)
+    if lock_cr is not None:
+        try:
+            lock_cr.execute("SELECT 1")
+            return lock_cr
+        except psycopg2.Error:
+            _logger.exception("File watcher locks of database %s are lost", dbname)
+            _stop_watchers(dbname)
+    lock_cr = odoo.registry(dbname).cursor()
+    lock_cr.autocommit(True)
+    _lock_cursors[dbname] = lock_cr
+    return lock_cr
+
+
+def _lock_server(lock_cr, server_id, lock=True):
+    """Acquire or release the lock of the server watcher.
+    Lock is held by a single worker, so each server
+    is watched only once across all workers.
+
+    Args:
+        lock_cr (Cursor): connection holding the watcher locks
+        server_id (int): id of the `cx.tower.server` record
+        lock (Bool, optional): release the lock if False. Defaults to True.
+
+    Returns:
+        Bool: True if lock was acquired or released
+    """
+    lock_function = "pg_try_advisory_lock" if lock else "pg_advisory_unlock"
+    lock_cr.execute(
+        f"SELECT {lock_function}(hashtext(%s), %s)", (WATCHER_LOCK_NAME, server_id)
+    )
+    return lock_cr.fetchone()[0]
+
+
+def _stop_watchers(dbname=None):
+    """Stop running watchers and release their locks.
+    Must be called with `_watchers_lock` acquired.
+
+    Args:
+        dbname (Text, optional): stop watchers of this database only.
+    """
+    for key, watcher in list(_watchers.items()):
+        if dbname is None or key[0] == dbname:
+            watcher.stop()
+            del _watchers[key]
+    for lock_dbname, lock_cr in list(_lock_cursors.items()):
+        if dbname is not None and lock_dbname != dbname:
+            continue
+        del _lock_cursors[lock_dbname]
+        # Connection is returned to the pool, so locks must be released
+        try:
+            lock_cr.execute("SELECT pg_advisory_unlock_all()")
+        except psycopg2.Error:
+            _logger.exception(
+                "Cannot release file watcher locks of database %s", lock_dbname
+            )
+        finally:
+            lock_cr.close()
+
+
+def supervise_watchers(dbname, paths_by_server, limit=WATCHER_LIMIT):
+    """Make sure a watcher is running for each of the servers.
+    Watchers that stopped are restarted, watchers of servers that
+    have no watched files left are stopped. Number of watchers
+    running in the current worker never exceeds `limit`.
+    Servers watched by other workers are skipped.
+
+    Args:
+        dbname (Text): database name
+        paths_by_server (dict): {server_id: tuple of watched paths}
+        limit (int, optional): maximum number of watchers in the worker.
+
+    Returns:
+        set: ids of the servers that have no watcher because of the limit
+    """
+    with _watchers_lock:
+        lock_cr = _get_lock_cursor(dbname)
+        for key, watcher in list(_watchers.items()):
+            if key[0] != dbname:
+                continue
+            if not watcher.is_alive() or paths_by_server.get(key[1]) != watcher.paths:
+                watcher.stop()
+                del _watchers[key]
+                _lock_server(lock_cr, key[1], lock=False)
+
+        unwatched_server_ids = set()
+        for server_id, paths in paths_by_server.items():
+            key = (dbname, server_id)
+            if key in _watchers:
+                continue
+            # Server is watched by another worker
+            if not _lock_server(lock_cr, server_id):
+                continue
+            if len(_watchers) >= limit:
+                _lock_server(lock_cr, server_id, lock=False)
+                unwatched_server_ids.add(server_id)
+                continue
+            watcher = FileWatcher(dbname, server_id, paths)
+            _watchers[key] = watcher
+            watcher.start()
+        return unwatched_server_ids
+
+
+def stop_watchers(dbname=None):
+    """Stop running watchers
+
+    Args:
+        dbname (Text, optional): stop watchers of this database only.
+    """
+    with _watchers_lock:
+        _stop_watchers(dbname)
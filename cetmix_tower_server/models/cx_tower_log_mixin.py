@@ -0,0 +1,203 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import api, fields, models
+
+
+class CxTowerLogMixin(models.AbstractModel):
+    """Writes log records using multi-row SQL statements.
+    Stored computed values are computed in Python instead of
+    the ORM recompute triggers.
+    ORM `create` and `write` overrides are not called for such records.
+    """
+
+    _name = "cx.tower.log.mixin"
+    _description = "Cetmix Tower log writer mixin"
+
+    def _get_log_computed_values(self, vals):
+        """Compute stored computed values of the log record.
+        Inherit to add values of your own computed fields.
+
+        Args:
+            vals (dict): new values of the record.
+                Values that are not provided are taken from the record itself.
+
+        Returns:
+            dict: computed values
+        """
+        res = {}
+        if "start_date" in vals or "finish_date" in vals:
+            start_date = fields.Datetime.to_datetime(
+                vals.get("start_date", self.start_date)
+            )
+            finish_date = fields.Datetime.to_datetime(
+                vals.get("finish_date", self.finish_date)
+            )
+            if start_date and finish_date:
+                res["duration"] = (finish_date - start_date).total_seconds()
+        return res
+
+    def _is_log_column(self, field_name):
+        """Check if value of the field can be written directly
+
+        Args:
+            field_name (Char): field name
+
+        Returns:
+            Bool: True if field is stored in a column of the model table
+        """
+        field = self._fields.get(field_name)
+        return bool(
+            field
+            and field.store
+            and field.column_type
+            and field_name not in models.LOG_ACCESS_COLUMNS
+            and field_name != "id"
+        )
+
+    @api.model
+    def _log_create(self, vals_list):
+        """Create log records with a single INSERT statement.
+        ORM `create` is used if values contain fields
+        that are not stored in the model table.
+
+        Args:
+            vals_list (list of dict): values of the new records
+
+        Returns:
+            Log records created
+        """
+        if not vals_list:
+            return self.browse()
+        field_names = {name for vals in vals_list for name in vals}
+        if not all(map(self._is_log_column, field_names)):
+            return self.create(vals_list)
+
+        rows = []
+        for vals in vals_list:
+            vals = self._add_missing_default_values(vals)
+            vals.update(self._get_log_computed_values(vals))
+            rows.append(
+                {
+                    name: value
+                    for name, value in vals.items()
+                    if self._is_log_column(name)
+                }
+            )
+        columns = sorted({name for row in rows for name in row})
+        template = "({}, %s, %s, {now}, {now})".format(
+            ", ".join(["%s"] * len(columns)), now="now() at time zone 'UTC'"
+        )
+        params = []
+        for row in rows:
+            params += [self._convert_log_value(name, row.get(name)) for name in columns]
+            params += [self.env.uid, self.env.uid]
+        query = """
+            INSERT INTO {table} ({columns}, create_uid, write_uid,
+                create_date, write_date)
+            VALUES {values}
+            RETURNING id
+        """.format(
+            table=self._table,
+            columns=", ".join(f'"{name}"' for name in columns),
+            values=", ".join([template] * len(rows)),
+        )
+        self.env.cr.execute(query, params)
+        records = self.browse([row[0] for row in self.env.cr.fetchall()])
+        records._invalidate_log_inverses(columns)
+        return records
+
+    def _log_write(self, vals):
+        """Update log records with a single UPDATE statement.
+        ORM `write` is used if values contain fields
+        that are not stored in the model table.
+
+        Args:
+            vals (dict): values to write
+        """
+        if not self:
+            return
+        if not all(map(self._is_log_column, vals)):
+            self.write(vals)
+            return
+        self._log_write_rows({record.id: vals for record in self})
+
+    def _log_write_rows(self, vals_by_id):
+        """Update log records with their own values
+        using a single UPDATE statement.
+        All values must be stored in the model table
+        and all records must be updated with the same fields.
+
+        Args:
+            vals_by_id (dict): {record id: values to write}
+        """
+        if not vals_by_id:
+            return
+        records = self.browse(list(vals_by_id))
+        rows = []
+        for record in records:
+            vals = vals_by_id[record.id]
+            row = dict(vals, **record._get_log_computed_values(vals))
+            rows.append((record.id, row))
+        columns = sorted({name for _record_id, row in rows for name in row})
+        # Pending ORM updates must not overwrite the new values
+        records.flush(columns, records)
+        template = "({})".format(", ".join(["%s"] * (len(columns) + 1)))
+        params = []
+        for record_id, row in rows:
+            params.append(record_id)
+            params += [self._convert_log_value(name, row.get(name)) for name in columns]
+        query = """
+            UPDATE {table} AS t SET {assignments},
+                write_uid = %s, write_date = now() at time zone 'UTC'
+            FROM (VALUES {values}) AS v(id, {columns})
+            WHERE t.id = v.id
+        """.format(
+            table=self._table,
+            assignments=", ".join(
+                f'"{name}" = v."{name}"::{self._fields[name].column_type[1]}'
+                for name in columns
+            ),
+            values=", ".join([template] * len(rows)),
+            columns=", ".join(f'"{name}"' for name in columns),
+        )
+        # 'write_uid' goes first in the query
+        self.env.cr.execute(query, [self.env.uid] + params)
+        records.invalidate_cache(columns + ["write_uid", "write_date"], records.ids)
+        records._invalidate_log_inverses(columns)
+
+    def _convert_log_value(self, field_name, value):
+        """Convert field value to the column value
+
+        Args:
+            field_name (Char): field name
+            value: field value
+
+        Returns:
+            value to store in the table column
+        """
+        field = self._fields[field_name]
+        if value is None:
+            value = False
+        return field.convert_to_column(value, self, validate=False)
+
+    def _invalidate_log_inverses(self, field_names):
+        """Invalidate cached one2many fields of the records
+        the logs are linked to, eg `command_log_ids` of the flight plan log.
+
+        Args:
+            field_names (list of Char): updated fields
+        """
+        for field_name in field_names:
+            field = self._fields[field_name]
+            if field.type != "many2one":
+                continue
+            comodel = self.env[field.comodel_name]
+            inverse_names = [
+                name
+                for name, comodel_field in comodel._fields.items()
+                if comodel_field.type == "one2many"
+                and comodel_field.comodel_name == self._name
+                and comodel_field.inverse_name == field_name
+            ]
+            if inverse_names:
+                comodel.invalidate_cache(inverse_names)
@@ -1,6 +1,6 @@
 # Copyright (C) 2022 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
-from operator import indexOf
+from types import MappingProxyType
 
 from odoo import _, api, fields, models
 from odoo.tools.safe_eval import expr_eval
@@ -11,6 +11,15 @@ from .constants import (
     PLAN_LINE_NOT_ASSIGNED,
     PLAN_NOT_ASSIGNED,
 )
+from .cx_tower_plan_artifact import (
+    ARTIFACT_FIELDS,
+    ARTIFACT_SIGNATURE_SQL,
+    PlanArtifact,
+    PlanLineActionData,
+    PlanLineData,
+    get_artifact,
+    store_artifact,
+)
 
 
 class CxTowerPlan(models.Model):
@@ -56,12 +65,162 @@ class CxTowerPlan(models.Model):
     custom_exit_code = fields.Integer(
         help="Will be used instead of the command exit code"
     )
+    max_parallel_lines = fields.Integer(
+        string="Parallel Lines",
+        default=1,
+        help="Maximum number of lines executed at the same time on a server. "
+        "Used only if lines have dependencies",
+    )
+    auto_resume = fields.Boolean(
+        help="If enabled flightplan interrupted by a server restart or a worker "
+        "crash is resumed automatically from the line that was being executed. "
+        "Otherwise it is finished with -26 status and can be resumed manually"
+    )
 
     access_level_warn_msg = fields.Text(
         compute="_compute_command_access_level",
         compute_sudo=True,
     )
 
+    def _is_dag(self):
+        """Check if plan lines are executed based on their dependencies
+        instead of the sequence
+
+        Returns:
+            Bool: True if any line has dependencies
+        """
+        self.ensure_one()
+        return self._get_artifact().is_dag
+
+    def _get_artifact(self, signature=None):
+        """Get compiled flight plan.
+        Plan is compiled again once the plan, its lines,
+        their actions or commands are modified.
+
+        Args:
+            signature (Char, optional): signature computed earlier,
+                eg when the plan was started. Current signature is used
+                if the plan with such signature is not compiled yet.
+
+        Returns:
+            PlanArtifact: compiled plan
+        """
+        self.ensure_one()
+        dbname = self.env.cr.dbname
+        artifact = signature and get_artifact(dbname, self.id, signature)
+        if artifact:
+            return artifact
+        for model_name, field_names in ARTIFACT_FIELDS.items():
+            self.env[model_name].flush(field_names)
+        self.env.cr.execute(ARTIFACT_SIGNATURE_SQL, (self.id,))
+        signature = self.env.cr.fetchone()[0]
+        artifact = get_artifact(dbname, self.id, signature)
+        if artifact is None:
+            artifact = self._compile_artifact(signature)
+            store_artifact(dbname, self.id, artifact)
+        return artifact
+
+    def _compile_artifact(self, signature):
+        """Compile flight plan into an immutable artifact
+
+        Args:
+            signature (Char): signature of the plan structure
+
+        Returns:
+            PlanArtifact: compiled plan
+        """
+        self.ensure_one()
+        key_obj = self.env["cx.tower.key"]
+        lines = self.sudo().line_ids.sorted(lambda line: (line.sequence, line.id))
+        line_data = []
+        secret_references = set()
+        for index, line in enumerate(lines):
+            command = line.command_id
+            next_line_id = lines[index + 1].id if index + 1 < len(lines) else None
+            flight_plan_id = (
+                command.flight_plan_id.id if command.action == "plan" else None
+            )
+            if command.code:
+                for key_string in key_obj._extract_key_strings(command.code):
+                    key_parts = key_obj._extract_key_parts(key_string)
+                    if key_parts:
+                        secret_references.add(key_parts[1])
+            line_data.append(
+                PlanLineData(
+                    id=line.id,
+                    command_id=command.id,
+                    action=command.action,
+                    flight_plan_id=flight_plan_id or None,
+                    path=line.path or command.path,
+                    use_sudo=line.use_sudo,
+                    condition=line.condition,
+                    dependency_ids=frozenset(line.dependency_ids.ids),
+                    next_line_id=next_line_id,
+                    actions=tuple(
+                        PlanLineActionData(
+                            id=action.id,
+                            condition=action.condition,
+                            value_char=action.value_char,
+                            action=action.action,
+                            custom_exit_code=action.custom_exit_code,
+                        )
+                        for action in line.action_ids
+                    ),
+                )
+            )
+        return PlanArtifact(
+            signature=signature,
+            lines=tuple(line_data),
+            line_index=MappingProxyType(
+                {line.id: index for index, line in enumerate(line_data)}
+            ),
+            variable_references=frozenset(lines._get_variable_references()),
+            secret_references=frozenset(secret_references),
+            nested_plan_ids=tuple(
+                sorted({line.flight_plan_id for line in line_data} - {None})
+            ),
+            is_dag=any(line.dependency_ids for line in line_data),
+        )
+
+    def _get_line_data(self, line, plan_log=None):
+        """Get compiled data of the flight plan line
+
+        Args:
+            line (cx.tower.plan.line()): plan line
+            plan_log (cx.tower.plan.log(), optional): running plan log.
+                Plan compiled when the log was started is used.
+
+        Returns:
+            PlanLineData: compiled line
+        """
+        if plan_log:
+            artifact = plan_log._get_plan_artifact()
+        else:
+            artifact = self._get_artifact()
+        return artifact.lines[artifact.line_index[line.id]]
+
+    def _get_variable_references(self, visited_plans=None):
+        """Get references of the variables used in the flight plan
+        including flight plans executed from it.
+
+        Args:
+            visited_plans (set, optional): ids of the plans already processed
+
+        Returns:
+            set: variable references
+        """
+        visited_plans = set() if visited_plans is None else visited_plans
+        references = set()
+        for plan in self:
+            if plan.id in visited_plans:
+                continue
+            visited_plans.add(plan.id)
+            artifact = plan._get_artifact()
+            references |= artifact.variable_references
+            nested_plans = self.browse(artifact.nested_plan_ids)
+            references |= nested_plans._get_variable_references(visited_plans)
+        return references
+
     def execute(self, servers, **kwargs):
         """Execute plans on multiple servers
 
@@ -99,24 +258,47 @@ class CxTowerPlan(models.Model):
 
         plan_log_obj = self.env["cx.tower.plan.log"].sudo()
 
-        # Check if the same plan is being executed on this server right now
-        if not self.allow_parallel_run or self.env.context.get(
+        # Check if the same plan is being executed on this server right now.
+        # Runs are detected using advisory locks held while the plan is running.
+        parallel_run = self.allow_parallel_run and not self.env.context.get(
             "prevent_plan_recursion"
-        ):
-            running_count = plan_log_obj.search_count(
-                [
-                    ("server_id", "=", server.id),
-                    ("plan_id", "=", self.id),
-                    ("is_running", "=", True),
-                ]
-            )
-            if running_count > 0:
+        )
+        if not parallel_run and self._is_running_on_server(server, **kwargs):
+            return ANOTHER_PLAN_RUNNING
+
+        with server._run_lock("plan", self.id, shared=parallel_run) as locked:
+            if not locked:
                 return ANOTHER_PLAN_RUNNING
 
-        # Start Flight Plan log
-        return plan_log_obj.start(
-            server, self, fields.Datetime.now(), **kwargs
-        ).plan_status
+            # Start Flight Plan log
+            return plan_log_obj.start(
+                server, self, fields.Datetime.now(), **kwargs
+            ).plan_status
+
+    def _is_running_on_server(self, server, **kwargs):
+        """Check if the plan is already running on the server
+        in the current database session, eg launched from itself.
+        Runs in other sessions are detected using advisory locks.
+
+        Args:
+            server (cx.tower.server()): Server object
+            kwargs (dict): Optional arguments passed to `_execute_single`
+
+        Returns:
+            Bool: True if plan is running
+        """
+        self.ensure_one()
+        parent_log_id = kwargs.get("plan_log", {}).get("parent_flight_plan_log_id")
+        parent_log = self.env["cx.tower.plan.log"].sudo().browse(parent_log_id)
+        while parent_log:
+            if (
+                parent_log.is_running
+                and parent_log.plan_id == self
+                and parent_log.server_id == server
+            ):
+                return True
+            parent_log = parent_log.parent_flight_plan_log_id
+        return False
 
     def _get_next_action_values(self, command_log):
         """Get next action values based of previous command result:
@@ -139,7 +321,9 @@ class CxTowerPlan(models.Model):
         if not command_log.plan_log_id:  # Exit with custom code "Plan not found"
             return "ec", PLAN_NOT_ASSIGNED, None
 
-        current_line = command_log.plan_log_id.plan_line_executed_id
+        current_line = (
+            command_log.plan_line_id or command_log.plan_log_id.plan_line_executed_id
+        )
         if not current_line:
             return "ec", PLAN_LINE_NOT_ASSIGNED, None
 
@@ -149,24 +333,35 @@ class CxTowerPlan(models.Model):
         server_variable_values = server.variable_value_ids
 
         # Check line condition
-        if not current_line._is_executable_line(server):
+        if not current_line._is_executable_line(server, command_log.plan_log_id):
             # Immediately return to the next line if condition fails
             return self._get_next_action_state(
-                "n", PLAN_LINE_CONDITION_CHECK_FAILED, current_line
+                "n",
+                PLAN_LINE_CONDITION_CHECK_FAILED,
+                current_line,
+                plan_log=command_log.plan_log_id,
             )
 
         # Check plan action lines
-        for action_line in current_line.action_ids:
+        line_data = current_line.plan_id._get_line_data(
+            current_line, plan_log=command_log.plan_log_id
+        )
+        for action_data in line_data.actions:
             conditional_expression = (
-                f"{exit_code} {action_line.condition} {action_line.value_char}"
+                f"{exit_code} {action_data.condition} {action_data.value_char}"
             )
             # Evaluate expression using safe_eval
             if expr_eval(conditional_expression):
-                action = action_line.action
+                action = action_data.action
                 # Use custom exit code if action requires it
-                if action == "ec" and action_line.custom_exit_code:
-                    exit_code = action_line.custom_exit_code
+                if action == "ec" and action_data.custom_exit_code:
+                    exit_code = action_data.custom_exit_code
 
+                action_line = self.env["cx.tower.plan.line.action"].browse(
+                    action_data.id
+                )
+                # Snapshots of the running plans are updated
+                # by the variable values themselves
                 variable_value_obj = self.env["cx.tower.variable.value"]
                 for variable_value in action_line.variable_value_ids:
                     variable = variable_value.variable_id
@@ -186,30 +381,43 @@ class CxTowerPlan(models.Model):
                             }
                         )
 
-                return self._get_next_action_state(action, exit_code, current_line)
+                return self._get_next_action_state(
+                    action, exit_code, current_line, plan_log=command_log.plan_log_id
+                )
 
         # If no action matched, fallback to default ones
-        return self._get_next_action_state(None, exit_code, current_line)
+        return self._get_next_action_state(
+            None, exit_code, current_line, plan_log=command_log.plan_log_id
+        )
 
-    def _get_next_action_state(self, action, exit_code, current_line):
+    def _get_next_action_state(self, action, exit_code, current_line, plan_log=None):
         """
         Determine the next action, exit code, and next line based on the current state.
         """
-        lines = current_line.plan_id.line_ids
-        is_last_line = current_line == lines[-1]
+        plan = current_line.plan_id
+        if plan_log:
+            artifact = plan_log._get_plan_artifact()
+        else:
+            artifact = plan._get_artifact()
+        line_data = artifact.lines[artifact.line_index[current_line.id]]
+        is_last_line = line_data.next_line_id is None
 
         # If no conditions were met fallback to default ones
         if not action:
-            action = "n" if exit_code == 0 else current_line.plan_id.on_error_action
+            action = "n" if exit_code == 0 else plan.on_error_action
 
             # Exit with custom code
             if action == "ec":
-                exit_code = current_line.plan_id.custom_exit_code
+                exit_code = plan.custom_exit_code
+
+        # Lines with dependencies are started by `_run_ready_lines`
+        if artifact.is_dag:
+            return action, exit_code, None
 
         # Determine the next line if current is not the last one
         next_line = None
         if action == "n" and not is_last_line:
-            next_line = lines[indexOf(lines, current_line) + 1]
+            next_line = current_line.browse(line_data.next_line_id)
 
         if is_last_line:
             action = "e"
@@ -223,18 +431,40 @@ class CxTowerPlan(models.Model):
             command_log (cx.tower.command.log()): Command log record
         """
         self.ensure_one()
-        action, exit_code, plan_line_id = self._get_next_action_values(command_log)
         plan_log = command_log.plan_log_id
+        is_dag = plan_log._get_plan_artifact().is_dag
+
+        # Line finished after the plan was stopped by another line
+        if is_dag and not plan_log.is_running:
+            return
+
+        # Retry failed line if its retry policy allows it
+        current_line = command_log.plan_line_id or plan_log.plan_line_executed_id
+        if current_line:
+            retry_delay = current_line._get_retry_delay(
+                command_log.command_status, plan_log._get_line_attempt(current_line)
+            )
+            if retry_delay is not None:
+                plan_log._log_write({"line_attempt": plan_log.line_attempt + 1})
+                current_line._retry(command_log.server_id, plan_log, retry_delay)
+                return
+
+        action, exit_code, plan_line_id = self._get_next_action_values(command_log)
 
         # Update log message
         if exit_code == PLAN_LINE_CONDITION_CHECK_FAILED:
             # save log exit code as success
             exit_code = 0
 
+        # Start lines which dependencies are finished
+        if is_dag and action == "n":
+            self._run_ready_lines(plan_log, exit_code, server=command_log.server_id)
+            return
+
         # Execute next line
         if action == "n" and plan_line_id:
             server = command_log.server_id
-            if plan_line_id._is_executable_line(server):
+            if plan_line_id._is_executable_line(server, plan_log):
                 plan_line_id._execute(server, plan_log)
             else:
                 plan_line_id._skip(server, plan_log)
@@ -246,6 +476,60 @@ class CxTowerPlan(models.Model):
         # NB: we are not putting any fallback here in case
         # someone needs to inherit and extend this function
 
+    def _run_ready_lines(self, plan_log, exit_code=0, server=None, **kwargs):
+        """Start lines which dependencies are finished.
+        Number of running lines never exceeds the plan limit.
+        Plan is finished once there are no lines left.
+
+        Args:
+            plan_log (cx.tower.plan.log()): Log record object
+            exit_code (int, optional): exit code of the last finished line.
+                Used as the plan exit code if there are no lines left.
+            server (cx.tower.server(), optional): server the plan is run on.
+                Its context defines if progress is committed,
+                see `_commit_progress()`. Defaults to the plan log server.
+            kwargs (dict): Optional arguments passed to the started lines
+        """
+        self.ensure_one()
+        server = server or plan_log.server_id
+        # Lines can be finished by several workers at the same time.
+        # Lock is taken before the state of the plan is read
+        # and is held until the started lines are committed.
+        with server._run_lock("plan_lines", plan_log.id, wait=True):
+            # New transaction sees the lines started by other workers.
+            # Otherwise all lines are run by the current transaction.
+            if server._commit_progress():
+                plan_log.invalidate_cache()
+            self._start_ready_lines(plan_log, server, exit_code, **kwargs)
+            server._commit_progress()
+
+    def _start_ready_lines(self, plan_log, server, exit_code=0, **kwargs):
+        """Start ready lines until the plan limit is reached.
+        Must be called under the plan lines lock, see `_run_ready_lines()`.
+
+        Args:
+            plan_log (cx.tower.plan.log()): Log record object
+            server (cx.tower.server()): server the plan is run on
+            exit_code (int, optional): exit code of the last finished line
+            kwargs (dict): Optional arguments passed to the started lines
+        """
+        # Lines executed synchronously start next lines themselves,
+        # so ready lines are fetched again after each started line
+        while plan_log.is_running:
+            ready_lines, running_count = plan_log._get_ready_lines()
+            if not ready_lines:
+                if not running_count:
+                    plan_log.finish(exit_code)
+                return
+            if running_count >= max(self.max_parallel_lines, 1):
+                return
+            line = ready_lines[0]
+            line_kwargs = dict(kwargs, log=dict(kwargs.get("log", {})))
+            if line._is_executable_line(server, plan_log):
+                line._execute(server, plan_log, **line_kwargs)
+            else:
+                line._skip(server, plan_log, **line_kwargs)
+
     @api.depends("line_ids.command_id.access_level", "access_level")
     def _compute_command_access_level(self):
         """Check if the access level of a command in the plan
@@ -285,6 +569,7 @@ class CxTowerPlan(models.Model):
         new_plan = super().copy(default=default)
 
         # Duplicate the lines from the original plan
+        new_lines = {}
         for line in self.line_ids:
             new_line = line.copy(
                 {
@@ -292,6 +577,7 @@ class CxTowerPlan(models.Model):
                     "plan_id": new_plan.id,
                 }
             )
+            new_lines[line] = new_line
 
             # Duplicate actions linked to the line
             for action in line.action_ids:
@@ -306,4 +592,11 @@ class CxTowerPlan(models.Model):
                         {"plan_line_action_id": new_action.id}
                     )
 
+        # Link duplicated lines to the duplicated dependencies
+        for line, new_line in new_lines.items():
+            if line.dependency_ids:
+                new_line.dependency_ids = [
+                    (6, 0, [new_lines[dep].id for dep in line.dependency_ids])
+                ]
+
         return new_plan
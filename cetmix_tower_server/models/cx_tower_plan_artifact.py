@@ -0,0 +1,136 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""
+Compiled flight plans.
+
+Flight plan is compiled into an immutable artifact holding everything
+the engine and the validation code need to know about its structure.
+Artifacts are cached in the worker and are compiled again once the plan,
+its lines, their actions or commands are modified.
+Nested plans are compiled separately and are referenced by their ids.
+"""
+import threading
+from collections import namedtuple
+
+# Signature of the plan structure. Every row version has its own
+# transaction id ('xmin') and command id ('cmin') within the transaction,
+# so rows modified in the same transaction change the signature too.
+# Line dependencies are kept in a relation table without row versions,
+# so the dependencies themselves are part of the signature.
+ARTIFACT_SIGNATURE_SQL = """
+    SELECT md5(concat_ws(';',
+        p.xmin, p.cmin,
+        (SELECT string_agg(
+            concat_ws(',', l.id, l.xmin, l.cmin, c.id, c.xmin, c.cmin), ';'
+            ORDER BY l.id)
+         FROM cx_tower_plan_line l
+         JOIN cx_tower_command c ON c.id = l.command_id
+         WHERE l.plan_id = p.id),
+        (SELECT string_agg(concat_ws(',', a.id, a.xmin, a.cmin), ';' ORDER BY a.id)
+         FROM cx_tower_plan_line_action a
+         JOIN cx_tower_plan_line l ON l.id = a.line_id
+         WHERE l.plan_id = p.id),
+        (SELECT string_agg(concat_ws(',', r.line_id, r.dependency_id), ';'
+            ORDER BY r.line_id, r.dependency_id)
+         FROM cx_tower_plan_line_dependency_rel r
+         JOIN cx_tower_plan_line l ON l.id = r.line_id
+         WHERE l.plan_id = p.id)))
+    FROM cx_tower_plan p
+    WHERE p.id = %s
+"""
+
+# Fields the plan is compiled from: {model name: [field names]}.
+# Only these fields are flushed before the signature is computed.
+ARTIFACT_FIELDS = {
+    "cx.tower.plan.line": [
+        "plan_id",
+        "sequence",
+        "command_id",
+        "path",
+        "use_sudo",
+        "condition",
+        "dependency_ids",
+    ],
+    "cx.tower.plan.line.action": [
+        "line_id",
+        "condition",
+        "value_char",
+        "action",
+        "custom_exit_code",
+    ],
+    "cx.tower.command": ["action", "flight_plan_id", "path", "code"],
+}
+
+PlanArtifact = namedtuple(
+    "PlanArtifact",
+    [
+        "signature",
+        # tuple of PlanLineData ordered by sequence
+        "lines",
+        # {line_id: position in 'lines'}
+        "line_index",
+        "variable_references",
+        "secret_references",
+        # ids of the plans executed from the plan lines
+        "nested_plan_ids",
+        "is_dag",
+    ],
+)
+
+PlanLineData = namedtuple(
+    "PlanLineData",
+    [
+        "id",
+        "command_id",
+        "action",
+        # plan executed by the command, if any
+        "flight_plan_id",
+        # line path or command path
+        "path",
+        "use_sudo",
+        "condition",
+        "dependency_ids",
+        # next line id or None for the last line
+        "next_line_id",
+        # tuple of PlanLineActionData
+        "actions",
+    ],
+)
+
+PlanLineActionData = namedtuple(
+    "PlanLineActionData",
+    ["id", "condition", "value_char", "action", "custom_exit_code"],
+)
+
+# Compiled plans: {(dbname, plan_id): PlanArtifact}
+_artifacts = {}
+_artifacts_lock = threading.Lock()
+
+
+def get_artifact(dbname, plan_id, signature):
+    """Get compiled plan from the cache
+
+    Args:
+        dbname (Text): database name
+        plan_id (int): id of the `cx.tower.plan` record
+        signature (Char): current signature of the plan
+
+    Returns:
+        PlanArtifact: compiled plan or None if not compiled yet or outdated
+    """
+    artifact = _artifacts.get((dbname, plan_id))
+    if artifact and artifact.signature == signature:
+        return artifact
+    return None
+
+
+def store_artifact(dbname, plan_id, artifact):
+    """Put compiled plan into the cache
+
+    Args:
+        dbname (Text): database name
+        plan_id (int): id of the `cx.tower.plan` record
+        artifact (PlanArtifact): compiled plan
+    """
+    with _artifacts_lock:
+        _artifacts[(dbname, plan_id)] = artifact
@@ -7,6 +7,9 @@ from odoo.tools.safe_eval import safe_eval
 
 from .constants import PLAN_LINE_CONDITION_CHECK_FAILED
 
+# Maximum delay between retries of a failed line, seconds
+PLAN_LINE_MAX_RETRY_DELAY = 600
+
 
 class CxTowerPlanLine(models.Model):
     _name = "cx.tower.plan.line"
@@ -57,6 +60,28 @@ class CxTowerPlanLine(models.Model):
         help="Conditions under which this Flight Plan Line "
         "will be launched. e.g.: {{ odoo_version}} == '14.0'",
     )
+    dependency_ids = fields.Many2many(
+        string="Depends On",
+        comodel_name="cx.tower.plan.line",
+        relation="cx_tower_plan_line_dependency_rel",
+        column1="line_id",
+        column2="dependency_id",
+        domain="[('plan_id', '=', plan_id), ('id', '!=', id)]",
+        copy=False,
+        help="Line is executed once all these lines are finished. "
+        "If any line of the flight plan has dependencies, "
+        "lines are executed in parallel as soon as they are ready",
+    )
+    retry_count = fields.Integer(
+        string="Retries",
+        help="How many times the command is run again if it fails. "
+        "Actions are applied to the result of the last attempt",
+    )
+    retry_delay = fields.Integer(
+        string="Retry Delay, sec",
+        default=10,
+        help="Delay before the first retry. It is doubled for each next attempt",
+    )
     variable_ids = fields.Many2many(
         comodel_name="cx.tower.variable",
         relation="cx_tower_plan_line_variable_rel",
@@ -88,23 +113,80 @@ class CxTowerPlanLine(models.Model):
             visited_plans = set()
             self._check_recursive_plan(line.command_id, visited_plans)
 
+    @api.constrains("dependency_ids", "plan_id")
+    def _check_dependency_ids(self):
+        """
+        Check that line dependencies belong to the same plan
+        and don't create a cycle.
+        Plans executed by the line commands are checked too.
+        """
+        for line in self:
+            if line.dependency_ids.filtered(
+                lambda dependency, line=line: dependency.plan_id != line.plan_id
+            ):
+                raise ValidationError(
+                    _(
+                        "Line %(name)s can depend on lines of the same plan only.",
+                        name=line.name,
+                    )
+                )
+            self._check_recursive_dependencies(line, set())
+            for dependency in line.dependency_ids:
+                self._check_recursive_plan(dependency.command_id, set())
+
+    def _check_recursive_dependencies(self, line, path):
+        """
+        Recursively check if the line dependencies create a cycle.
+        Raise a ValidationError if a cycle is detected.
+
+        Args:
+            line (cx.tower.plan.line()): line to check
+            path (set): ids of the lines that depend on this line
+        """
+        if line.id in path:
+            raise ValidationError(
+                _(
+                    "Recursive line dependency detected in plan %(name)s.",
+                    name=line.plan_id.name,
+                )
+            )
+        path.add(line.id)
+        for dependency in line.dependency_ids:
+            self._check_recursive_dependencies(dependency, path)
+        path.discard(line.id)
+
     def _check_recursive_plan(self, command, visited_plans):
         """
         Recursively check if the command plan creates a cycle.
         Raise a ValidationError if a cycle is detected.
         """
         if command.flight_plan_id and command.action == "plan":
-            if command.flight_plan_id.id in visited_plans:
-                raise ValidationError(
-                    _(
-                        "Recursive plan call detected in plan %(name)s.",
-                        name=command.flight_plan_id.name,
-                    )
+            self._check_recursive_plan_graph(command.flight_plan_id, visited_plans)
+
+    def _check_recursive_plan_graph(self, plan, visited_plans):
+        """
+        Recursively check if plans executed from the plan create a cycle.
+        Compiled plans are used to avoid reading the nested plan lines.
+        Raise a ValidationError if a cycle is detected.
+
+        Args:
+            plan (cx.tower.plan()): plan executed by a command
+            visited_plans (set): ids of the plans already checked
+        """
+        if plan.id in visited_plans:
+            raise ValidationError(
+                _(
+                    "Recursive plan call detected in plan %(name)s.",
+                    name=plan.name,
+                )
+            )
+        visited_plans.add(plan.id)
+        # recursively check the lines in the plan
+        for line_data in plan._get_artifact().lines:
+            if line_data.flight_plan_id:
+                self._check_recursive_plan_graph(
+                    plan.browse(line_data.flight_plan_id), visited_plans
                 )
-            visited_plans.add(command.flight_plan_id.id)
-            # recursively check the lines in the plan
-            for line in command.flight_plan_id.line_ids:
-                self._check_recursive_plan(line.command_id, visited_plans)
 
     def _execute(self, server, plan_log_record, **kwargs):
         """Execute command from the Flight Plan line
@@ -121,8 +203,12 @@ class CxTowerPlanLine(models.Model):
         """
         self.ensure_one()
 
-        # Set current line as currently executed in log
-        plan_log_record.plan_line_executed_id = self
+        # Set current line as currently executed in log.
+        # This is the checkpoint the plan is resumed from.
+        if plan_log_record.plan_line_executed_id != self:
+            plan_log_record._log_write(
+                {"plan_line_executed_id": self.id, "line_attempt": 0}
+            )
 
         # It is necessary to save information about which plan log
         # was created for a command log that has the command action “plan”
@@ -132,24 +218,78 @@ class CxTowerPlanLine(models.Model):
 
         # Pass plan_log to command so it will be saved in command log
         log_vals = kwargs.get("log", {})
-        log_vals.update({"plan_log_id": plan_log_record.id})
+        log_vals.update({"plan_log_id": plan_log_record.id, "plan_line_id": self.id})
         kwargs.update({"log": log_vals})
 
+        line_data = self.plan_id._get_line_data(self, plan_log=plan_log_record)
+
         # Set 'sudo' value
-        use_sudo = self.use_sudo and server.use_sudo
+        use_sudo = line_data.use_sudo and server.use_sudo
         # Use sudo to bypass access rules for execute command with higher access level
-        command_id = self.sudo().command_id
+        command_id = self.env["cx.tower.command"].sudo().browse(line_data.command_id)
+
+        # Line path overrides command path
+        server.execute_command(command_id, line_data.path, sudo=use_sudo, **kwargs)
+
+    def _get_retry_delay(self, command_status, attempt):
+        """Get delay before the next attempt to run a failed line
+
+        Args:
+            command_status (int): exit code of the last attempt
+            attempt (int): number of retries already done
+
+        Returns:
+            int: delay in seconds or None if line should not be retried
+        """
+        self.ensure_one()
+        if (
+            command_status in (0, PLAN_LINE_CONDITION_CHECK_FAILED)
+            or attempt >= self.retry_count
+        ):
+            return None
+        return min(max(self.retry_delay, 0) * 2**attempt, PLAN_LINE_MAX_RETRY_DELAY)
 
-        # Set path
-        path = self.path or self.command_id.path
-        server.execute_command(command_id, path, sudo=use_sudo, **kwargs)
+    def _retry(self, server, plan_log_record, delay):
+        """Run the line again after a delay.
+        Delayed lines are run by the cron, so the worker is not blocked.
+        Plans launched from another plan are run again at once
+        because the parent plan waits for them to finish.
+        Inherit to implement other ways to postpone the line.
 
-    def _is_executable_line(self, server):
+        Args:
+            server (cx.tower.server()): Server object
+            plan_log_record (cx.tower.plan.log()): Log record object
+            delay (int): delay in seconds
+        """
+        self.ensure_one()
+        if delay and not plan_log_record.parent_flight_plan_log_id:
+            plan_log_record._schedule_line_retry(self, delay)
+        else:
+            self._execute(server, plan_log_record)
+
+    def _get_variable_references(self):
+        """Get references of the variables used in the line and its command.
+
+        Returns:
+            set: variable references
+        """
+        template_mixin_obj = self.env["cx.tower.template.mixin"]
+        references = set()
+        for line in self:
+            command = line.command_id
+            for code in (command.code, command.path, line.path, line.condition):
+                if code:
+                    references.update(template_mixin_obj.get_variables_from_code(code))
+        return references
+
+    def _is_executable_line(self, server, plan_log_record=None):
         """
         Check if this line can be executed based on its condition.
 
         Args:
             server (cx.tower.server()): The server on which conditions are checked.
+            plan_log_record (cx.tower.plan.log(), optional): Log record object.
+                Variable values are taken from the flight plan run snapshot.
 
         Returns:
             bool: True if the line can be executed, otherwise False.
@@ -159,10 +299,12 @@ class CxTowerPlanLine(models.Model):
         if condition:
             variables = self.command_id.get_variables_from_code(condition)
             if variables:
-                variable_values_dict = (
-                    server.get_variable_values(variables) if variables else {}
-                )
-                variable_values = variable_values_dict.get(server.id, {})
+                if plan_log_record:
+                    variable_values = plan_log_record._get_variable_values(variables)
+                else:
+                    variable_values = server.get_variable_values(variables).get(
+                        server.id, {}
+                    )
                 condition = self.command_id.render_code_custom(
                     condition, pythonic_mode=True, **variable_values
                 )
@@ -181,7 +323,7 @@ class CxTowerPlanLine(models.Model):
         self.ensure_one()
 
         # Set current line as currently executed in log
-        plan_log_record.plan_line_executed_id = self
+        plan_log_record._log_write({"plan_line_executed_id": self.id})
 
         # Log the unsuccessful execution attempt
         now = fields.Datetime.now()
@@ -196,6 +338,7 @@ class CxTowerPlanLine(models.Model):
             None,
             _("Plan line condition check failed."),
             plan_log_id=plan_log_record.id,
+            plan_line_id=self.id,
             condition=self.condition,
             is_skipped=True,
             **log_vals,
@@ -1,12 +1,23 @@
 # Copyright (C) 2022 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
-from odoo import api, fields, models
+import json
 
-from .constants import PLAN_IS_EMPTY
+from dateutil.relativedelta import relativedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+from .constants import (
+    PLAN_INTERRUPTED,
+    PLAN_IS_EMPTY,
+    PLAN_LINE_CONDITION_CHECK_FAILED,
+)
+from .cx_tower_command_log import STALE_RUN_DELAY_MINUTES
 
 
 class CxTowerPlanLog(models.Model):
     _name = "cx.tower.plan.log"
+    _inherit = "cx.tower.log.mixin"
     _description = "Cetmix Tower Flight Plan Log"
     _order = "start_date desc, id desc"
 
@@ -44,6 +55,26 @@ class CxTowerPlanLog(models.Model):
         comodel_name="cx.tower.plan.line",
         help="Flight Plan line that is being currently executed",
     )
+    variable_snapshot = fields.Text(
+        readonly=True,
+        copy=False,
+        help="Variable values resolved when the flight plan is started. "
+        "Stored as JSON",
+    )
+    plan_signature = fields.Char(
+        readonly=True,
+        copy=False,
+        help="Signature of the flight plan structure when the plan was started",
+    )
+    retry_schedule = fields.Text(
+        readonly=True,
+        copy=False,
+        help="Lines waiting to be run again after a delay. Stored as JSON",
+    )
+    line_attempt = fields.Integer(
+        string="Retries Done",
+        help="Number of retries of the line that is being currently executed",
+    )
     command_log_ids = fields.One2many(
         comodel_name="cx.tower.command.log", inverse_name="plan_log_id", auto_join=True
     )
@@ -52,6 +83,18 @@ class CxTowerPlanLog(models.Model):
         "cx.tower.plan.log", string="Main Log", ondelete="cascade"
     )
 
+    def init(self):
+        """
+        Create index used to find running flight plans
+        """
+        self._cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS cx_tower_plan_log_running_index
+            ON cx_tower_plan_log (server_id, plan_id)
+            WHERE is_running
+            """
+        )
+
     @api.depends("server_id.name", "name")
     def _compute_name(self):
         for rec in self:
@@ -65,6 +108,18 @@ class CxTowerPlanLog(models.Model):
                     plan_log.finish_date - plan_log.start_date
                 ).total_seconds()
 
+    def _get_log_computed_values(self, vals):
+        res = super()._get_log_computed_values(vals)
+        if "server_id" in vals or "plan_id" in vals:
+            server = self.env["cx.tower.server"].browse(
+                vals.get("server_id", self.server_id.id)
+            )
+            plan = self.env["cx.tower.plan"].browse(
+                vals.get("plan_id", self.plan_id.id)
+            )
+            res["name"] = ": ".join((server.sudo().name, plan.sudo().name))
+        return res
+
     def _compute_duration_current(self):
         """Shows relative time between now() and start time for running plans,
         and computed duration for finished ones.
@@ -97,18 +152,22 @@ class CxTowerPlanLog(models.Model):
             cx.tower.plan.log(): New flightplan log record.
         """
 
-        def get_executable_line(plan, server):
+        def get_executable_line(plan, server, plan_log):
             """
             Generator to get each line and check if it's executable.
             """
-            for line in plan.line_ids:
-                yield line, line._is_executable_line(server)
+            line_obj = self.env["cx.tower.plan.line"]
+            for line_data in plan_log._get_plan_artifact().lines:
+                line = line_obj.browse(line_data.id)
+                yield line, line._is_executable_line(server, plan_log)
 
         vals = {
             "server_id": server.id,
             "plan_id": plan.id,
             "is_running": True,
             "start_date": start_date or fields.Datetime.now(),
+            # Signature is computed once per run
+            "plan_signature": plan._get_artifact().signature,
         }
 
         # Extract and apply plan log kwargs
@@ -116,10 +175,16 @@ class CxTowerPlanLog(models.Model):
         if plan_log_kwargs:
             vals.update(plan_log_kwargs)
 
-        plan_log = self.sudo().create(vals)
+        plan_log = self.sudo()._log_create([vals])
+        plan_log._init_variable_snapshot()
+
+        # Start all lines that don't depend on other lines
+        if plan_log._get_plan_artifact().is_dag:
+            plan._run_ready_lines(plan_log, server=server, **kwargs)
+            return plan_log
 
         # Process each line until the first executable one is found
-        for line, is_executable in get_executable_line(plan, server):
+        for line, is_executable in get_executable_line(plan, server, plan_log):
             if is_executable:
                 line._execute(server, plan_log, **kwargs)
                 break
@@ -129,7 +194,7 @@ class CxTowerPlanLog(models.Model):
                 line._skip(server, plan_log)
                 break
         else:
-            plan_log.sudo().write(
+            plan_log.sudo()._log_write(
                 {
                     "is_running": False,
                     "finish_date": fields.Datetime.now(),
@@ -155,7 +220,7 @@ class CxTowerPlanLog(models.Model):
         # Apply kwargs
         if kwargs:
             values.update(kwargs)
-        self.sudo().write(values)
+        self.sudo()._log_write(values)
 
         # Call hook
         self._plan_finished()
@@ -189,3 +254,365 @@ class CxTowerPlanLog(models.Model):
         self.ensure_one()
         # Get next line to execute
         self.plan_id._run_next_action(command_log)  # type: ignore
+
+    def action_resume(self):
+        """Resume flight plan from the line where it was stopped"""
+        self.ensure_one()
+        if self.parent_flight_plan_log_id:
+            raise UserError(
+                _("Flight plan launched from another one cannot be resumed.")
+            )
+        if self.is_running and not self._is_interrupted():
+            raise UserError(_("Flight plan is still running."))
+        if not self.is_running and self.plan_status == 0:
+            raise UserError(_("Flight plan is already finished successfully."))
+        if not self.resume():
+            raise UserError(
+                _("Another instance of the flight plan is already running.")
+            )
+
+    def resume(self):
+        """Resume flight plan from the line that was executed last.
+        Lines completed before are not run again.
+        Variable values set by line actions are stored in the server
+        so they are used by the remaining lines.
+        If lines have dependencies all failed lines are run again.
+
+        Returns:
+            Bool: False if the plan is running in another session
+        """
+        self.ensure_one()
+        plan_log = self.sudo()
+        server = plan_log.server_id
+        plan = plan_log.plan_id
+        with server._run_lock(
+            "plan", plan.id, shared=plan.allow_parallel_run
+        ) as locked:
+            if not locked:
+                return False
+            line = plan_log.plan_line_executed_id or plan.line_ids[:1]
+            if not line:
+                plan_log.finish(PLAN_IS_EMPTY)
+                return True
+            plan_log._log_write(
+                {
+                    "is_running": True,
+                    "finish_date": False,
+                    "plan_status": 0,
+                    "line_attempt": 0,
+                    # Plan could be modified while it was stopped
+                    "plan_signature": plan._get_artifact().signature,
+                }
+            )
+            # Values could be modified while the plan was stopped
+            plan_log._init_variable_snapshot()
+            if plan_log._get_plan_artifact().is_dag:
+                # Run failed lines again
+                plan_log.command_log_ids.filtered(
+                    lambda command_log: command_log.plan_line_id
+                    and command_log.command_status
+                    not in (0, PLAN_LINE_CONDITION_CHECK_FAILED)
+                ).write({"plan_line_id": False})
+                plan._run_ready_lines(plan_log, server=server)
+            elif line._is_executable_line(server, plan_log):
+                line._execute(server, plan_log)
+            else:
+                line._skip(server, plan_log)
+        return True
+
+    def _init_variable_snapshot(self):
+        """Resolve values of all variables used in the flight plan
+        and the flight plans executed from it.
+        Flight plans executed from another plan use the parent snapshot.
+        """
+        self.ensure_one()
+        parent_log = self.parent_flight_plan_log_id
+        if parent_log.variable_snapshot:
+            self.sudo().variable_snapshot = parent_log.variable_snapshot
+            return
+        references = self.plan_id._get_variable_references()
+        references.discard("tower")
+        snapshot = {"values": {}, "templated": []}
+        if references:
+            references = sorted(references)
+            server = self.server_id.sudo()
+            snapshot["values"] = server.get_variable_values(references).get(
+                server.id, {}
+            )
+            # Values rendered using other variables
+            snapshot["templated"] = sorted(
+                set(
+                    self.env["cx.tower.variable.value"]
+                    .sudo()
+                    .search(
+                        [
+                            ("variable_reference", "in", references),
+                            "|",
+                            ("server_id", "=", server.id),
+                            ("is_global", "=", True),
+                            ("value_char", "like", "{{ "),
+                        ]
+                    )
+                    .mapped("variable_reference")
+                )
+            )
+        self.sudo().variable_snapshot = json.dumps(snapshot)
+
+    def _get_variable_snapshot(self):
+        """Get variable values snapshot of the flight plan run
+
+        Returns:
+            dict: {"values": {reference: value}, "templated": [reference]}
+        """
+        self.ensure_one()
+        if self.variable_snapshot:
+            return json.loads(self.variable_snapshot)
+        return {"values": {}, "templated": []}
+
+    def _get_variable_values(self, references):
+        """Get variable values for the flight plan run.
+        Values are taken from the snapshot,
+        missing ones are resolved and added to the snapshot.
+        System variables are always resolved.
+
+        Args:
+            references (list of Char): variable references
+
+        Returns:
+            dict: {reference: value}
+        """
+        self.ensure_one()
+        server = self.server_id.sudo()
+        snapshot = self._get_variable_snapshot()
+        result = {}
+        missing_references = []
+        for reference in references:
+            if reference == "tower":
+                result[reference] = server._get_system_variable_value(reference)
+            elif reference in snapshot["values"]:
+                result[reference] = snapshot["values"][reference]
+            else:
+                missing_references.append(reference)
+        if missing_references:
+            values = server.get_variable_values(missing_references).get(server.id, {})
+            result.update(values)
+            snapshot["values"].update(values)
+            self.sudo().variable_snapshot = json.dumps(snapshot)
+        return result
+
+    def _invalidate_variable_snapshot(self, references):
+        """Remove values from the snapshots so they are resolved again.
+        Values rendered using other variables are removed too.
+        Snapshots of the parent flight plans are updated as well.
+        All snapshots are saved with a single statement.
+
+        Args:
+            references (list of Char): references of the updated variables
+        """
+        if not references:
+            return
+        plan_logs = self
+        parent_logs = self.parent_flight_plan_log_id
+        while parent_logs - plan_logs:
+            plan_logs |= parent_logs
+            parent_logs = parent_logs.parent_flight_plan_log_id
+        snapshots = {}
+        for plan_log in plan_logs:
+            snapshot = plan_log._get_variable_snapshot()
+            if snapshot["values"]:
+                for reference in set(references) | set(snapshot["templated"]):
+                    snapshot["values"].pop(reference, None)
+                snapshots[plan_log.id] = {"variable_snapshot": json.dumps(snapshot)}
+        plan_logs.sudo()._log_write_rows(snapshots)
+
+    def _get_line_attempt(self, line):
+        """Get number of retries done for the plan line
+
+        Args:
+            line (cx.tower.plan.line()): plan line
+
+        Returns:
+            int: number of retries
+        """
+        self.ensure_one()
+        if not self._get_plan_artifact().is_dag:
+            return self.line_attempt
+        line_logs = self.command_log_ids.filtered(
+            lambda command_log: command_log.plan_line_id == line
+        )
+        return max(len(line_logs) - 1, 0)
+
+    def _get_plan_artifact(self):
+        """Get flight plan compiled when the plan was started.
+        Plan is compiled again if it is not cached in the worker anymore.
+
+        Returns:
+            PlanArtifact: compiled plan
+        """
+        self.ensure_one()
+        return self.plan_id._get_artifact(self.plan_signature)
+
+    def _get_ready_lines(self):
+        """Get lines which dependencies are finished.
+        Line is finished once its last command is finished,
+        failed lines stop the plan unless line actions allow to continue.
+
+        Returns:
+            tuple: (cx.tower.plan.line(), int) lines ready to run
+                ordered by sequence and number of running lines
+        """
+        self.ensure_one()
+        last_logs = {}
+        for command_log in self.command_log_ids.sorted("id"):
+            if command_log.plan_line_id:
+                last_logs[command_log.plan_line_id.id] = command_log
+        running_line_ids = set()
+        finished_line_ids = set()
+        # Lines waiting to be run again are not finished yet
+        scheduled_line_ids = set(self._get_retry_schedule())
+        for line_id, command_log in last_logs.items():
+            if command_log.is_running or line_id in scheduled_line_ids:
+                running_line_ids.add(line_id)
+            else:
+                finished_line_ids.add(line_id)
+        ready_lines = self.env["cx.tower.plan.line"].browse(
+            [
+                line_data.id
+                for line_data in self._get_plan_artifact().lines
+                if line_data.id not in last_logs
+                and line_data.dependency_ids <= finished_line_ids
+            ]
+        )
+        return ready_lines, len(running_line_ids)
+
+    def _is_interrupted(self):
+        """Check if running flight plan was left by a worker
+        that doesn't exist anymore.
+
+        Returns:
+            Bool: True if plan is not running actually
+        """
+        self.ensure_one()
+        return bool(self._filter_interrupted())
+
+    def _filter_interrupted(self):
+        """Get running flight plans left by workers that don't exist anymore.
+        Run locks of all plans and their commands are checked
+        with a single query for each lock type.
+        Inherit to support runners that execute plan lines later.
+
+        Returns:
+            cx.tower.plan.log(): interrupted plan logs
+        """
+        running_command_logs = self.command_log_ids.filtered("is_running")
+        alive_plan_logs = running_command_logs._filter_alive_runs().plan_log_id
+        locked_plans = self.env["cx.tower.server"]._get_locked_runs(
+            "plan", [(log.server_id.id, log.plan_id.id) for log in self]
+        )
+        return self.filtered(
+            lambda log: log not in alive_plan_logs
+            and (log.server_id.id, log.plan_id.id) not in locked_plans
+            and not log.retry_schedule
+        )
+
+    def _get_retry_schedule(self):
+        """Get lines waiting to be run again
+
+        Returns:
+            dict: {line id: datetime when the line is run again}
+        """
+        self.ensure_one()
+        if not self.retry_schedule:
+            return {}
+        return {
+            int(line_id): fields.Datetime.to_datetime(retry_date)
+            for line_id, retry_date in json.loads(self.retry_schedule).items()
+        }
+
+    def _set_retry_schedule(self, schedule):
+        """Save lines waiting to be run again
+
+        Args:
+            schedule (dict): {line id: datetime when the line is run again}
+        """
+        self.ensure_one()
+        retry_schedule = False
+        if schedule:
+            retry_schedule = json.dumps(
+                {
+                    str(line_id): fields.Datetime.to_string(retry_date)
+                    for line_id, retry_date in schedule.items()
+                }
+            )
+        self.sudo()._log_write({"retry_schedule": retry_schedule})
+
+    def _schedule_line_retry(self, line, delay):
+        """Run the line again once the delay is over.
+        Lines are run by the cron, see `_run_scheduled_retries()`.
+
+        Args:
+            line (cx.tower.plan.line()): plan line
+            delay (int): delay in seconds
+        """
+        self.ensure_one()
+        schedule = self._get_retry_schedule()
+        schedule[line.id] = fields.Datetime.now() + relativedelta(seconds=delay)
+        self._set_retry_schedule(schedule)
+
+    @api.model
+    def _run_scheduled_retries(self):
+        """Run lines which retry delay is over"""
+        now = fields.Datetime.now()
+        line_obj = self.env["cx.tower.plan.line"]
+        plan_logs = self.sudo().search([("retry_schedule", "!=", False)], order="id")
+        for plan_log in plan_logs:
+            if not plan_log.is_running:
+                plan_log._set_retry_schedule({})
+                continue
+            schedule = plan_log._get_retry_schedule()
+            due_line_ids = [
+                line_id for line_id, retry_date in schedule.items() if retry_date <= now
+            ]
+            if not due_line_ids:
+                continue
+            server = plan_log.server_id
+            plan = plan_log.plan_id
+            with server._run_lock(
+                "plan", plan.id, shared=plan.allow_parallel_run
+            ) as locked:
+                # Plan is being executed by another worker
+                if not locked:
+                    continue
+                for line_id in due_line_ids:
+                    del schedule[line_id]
+                plan_log._set_retry_schedule(schedule)
+                for line in line_obj.browse(due_line_ids):
+                    line._execute(server, plan_log)
+
+    @api.model
+    def _recover_interrupted_plans(self):
+        """Resume or finish flight plans interrupted by a worker crash.
+        Interrupted commands are finished first.
+        Plans launched from another plan are finished
+        because the parent plan runs the whole nested plan again.
+        """
+        self.env["cx.tower.command.log"]._recover_stale_runs()
+        plan_logs = self.sudo().search(
+            [
+                ("is_running", "=", True),
+                (
+                    "write_date",
+                    "<",
+                    fields.Datetime.now()
+                    - relativedelta(minutes=STALE_RUN_DELAY_MINUTES),
+                ),
+            ],
+            order="id",
+        )
+        for plan_log in plan_logs._filter_interrupted():
+            if plan_log.plan_id.auto_resume and not (
+                plan_log.parent_flight_plan_log_id
+            ):
+                plan_log.resume()
+            else:
+                plan_log.finish(PLAN_INTERRUPTED)
@@ -65,24 +65,7 @@ class CxTowerReferenceMixin(models.AbstractModel):
             str: Generated or fixed reference.
         """
 
-        # Check if reference matches the pattern
-        reference_pattern = self._get_reference_pattern()
-
-        if re.fullmatch(rf"{reference_pattern}+", reference_source):
-            reference = reference_source
-
-        # Fix reference if it doesn't match
-        else:
-            # Modify the pattern to be used in `sub`
-            inner_pattern = reference_pattern[1:-1]
-            reference = (
-                re.sub(
-                    rf"[^{inner_pattern}]",
-                    "",
-                    reference_source.strip().replace(" ", "_").lower(),
-                )
-                or self._get_model_generic_reference()
-            )
+        reference = self._fix_reference(reference_source)
 
         # Check if the same reference already exists and add a suffix if yes
         counter = 1
@@ -106,6 +89,73 @@ class CxTowerReferenceMixin(models.AbstractModel):
 
         return final_reference
 
+    def _fix_reference(self, reference_source):
+        """
+        Fix reference so it matches the reference pattern.
+
+        Args:
+            reference_source (str): Original string.
+
+        Returns:
+            str: Fixed reference. It may be not unique.
+        """
+        # Check if reference matches the pattern
+        reference_pattern = self._get_reference_pattern()
+
+        if re.fullmatch(rf"{reference_pattern}+", reference_source):
+            return reference_source
+
+        # Fix reference if it doesn't match
+        # Modify the pattern to be used in `sub`
+        inner_pattern = reference_pattern[1:-1]
+        return (
+            re.sub(
+                rf"[^{inner_pattern}]",
+                "",
+                reference_source.strip().replace(" ", "_").lower(),
+            )
+            or self._get_model_generic_reference()
+        )
+
+    @api.model
+    def _generate_references(self, reference_sources):
+        """
+        Generate unique references for several new records at once.
+        Existing references are fetched using a single query,
+        suffixes are added in memory.
+
+        Args:
+            reference_sources (list of str): Original strings.
+
+        Returns:
+            list of str: Generated references in the same order.
+        """
+        references = [self._fix_reference(source) for source in reference_sources]
+        if not references:
+            return references
+
+        # '_' is a wildcard in 'like', so more records than needed may be fetched
+        domain = expression.OR(
+            [[("reference", "=like", f"{reference}%")] for reference in set(references)]
+        )
+        taken_references = {
+            values["reference"]
+            for values in self.sudo()
+            .with_context(active_test=False)
+            .search_read(domain, ["reference"])
+        }
+
+        result = []
+        for reference in references:
+            counter = 1
+            final_reference = reference
+            while final_reference in taken_references:
+                counter += 1
+                final_reference = f"{reference}_{counter}"
+            taken_references.add(final_reference)
+            result.append(final_reference)
+        return result
+
     @api.model
     def _name_search(
         self, name="", args=None, operator="ilike", limit=100, name_get_uid=None
@@ -252,6 +302,38 @@ class CxTowerReferenceMixin(models.AbstractModel):
 
         return copy_name
 
+    def _get_copied_names(self, count):
+        """
+        Return several unique copied names of the record at once.
+        Existing names are fetched using a single query.
+
+        Args:
+            count (int): Number of names to return.
+
+        Returns:
+            list of str: Unique names for the copied records
+        """
+        self.ensure_one()
+        original_name = self.name
+        # Special symbols of 'like' may fetch more records than needed
+        taken_names = set(
+            self.search([("name", "=like", f"{original_name}%")]).mapped("name")
+        )
+
+        names = []
+        counter = 1
+        copy_name = _("%(name)s (copy)", name=original_name)
+        while len(names) < count:
+            if copy_name not in taken_names:
+                names.append(copy_name)
+            counter += 1
+            copy_name = _(
+                "%(name)s (copy %(number)s)",
+                name=original_name,
+                number=str(counter),
+            )
+        return names
+
     def copy(self, default=None):
         """
         Overrides the copy method to ensure unique reference values
@@ -321,6 +403,25 @@ class CxTowerReferenceMixin(models.AbstractModel):
         # This is in case some models will remove reference uniqueness constraint
         return records and records[0].id
 
+    def _get_ids_by_references(self, references):
+        """Get record ids based on their references using a single query.
+
+        Important: references are case sensitive!
+
+        Args:
+            references (list of Char): record references
+
+        Returns:
+            dict: {reference: record id}. References that don't match
+                any record are not present in the result.
+        """
+        result = {}
+        if references:
+            for record in self.search([("reference", "in", list(references))]):
+                # Same record is returned as in `_get_id_by_reference`
+                result.setdefault(record.reference, record.id)
+        return result
+
     @api.model
     def _prepare_references(self, model, key_name, vals_list):
         """
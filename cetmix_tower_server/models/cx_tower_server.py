@@ -3,6 +3,15 @@
 import ast
 import io
 import logging
+import os
+import shlex
+import shutil
+import socket
+import stat
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
 
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
@@ -15,6 +24,7 @@ from .constants import (
     PYTHON_COMMAND_ERROR,
     SSH_CONNECTION_ERROR,
 )
+from .cx_tower_server_selector import compile_selector
 from .tools import generate_random_id
 
 _logger = logging.getLogger(__name__)
@@ -37,6 +47,23 @@ except ImportError:
     )
     AutoAddPolicy = RSAKey = SSHClient = None
 
+# Number of leading bytes used to detect that a file was replaced (eg rotated)
+FILE_FINGERPRINT_SIZE = 64
+
+# SFTP channel settings tuned for large file transfer
+SFTP_WINDOW_SIZE = 2**25
+SFTP_MAX_PACKET_SIZE = 2**18
+# Size of the chunks used for file streaming
+FILE_CHUNK_SIZE = 2**20
+
+# Maximum number of related records archived with a single query
+ACTIVE_UPDATE_CHUNK_SIZE = 50000
+
+# Run locks held by the current thread and the connections holding them:
+# locks: {(dbname, lock type, object id, server id): [(owner, suffix)]}
+# cursors: {dbname: autocommit cursor}
+_held_run_locks = threading.local()
+
 
 class SSH(object):
     """
@@ -145,7 +172,11 @@ class SSH(object):
         """
         Open SFTP connection to remote host.
         """
-        self._sftp = SFTPClient.from_transport(self.connection.get_transport())  # type: ignore
+        self._sftp = SFTPClient.from_transport(  # type: ignore
+            self.connection.get_transport(),
+            window_size=SFTP_WINDOW_SIZE,
+            max_packet_size=SFTP_MAX_PACKET_SIZE,
+        )
         return self._sftp
 
     def disconnect(self):
@@ -196,6 +227,56 @@ class SSH(object):
         error = stderr.readlines()
         return status, response, error
 
+    def exec_command_stream(
+        self, command, stop_event=None, poll_interval=1.0, keepalive=30
+    ):
+        """
+        Run a long-living command and yield its output line by line.
+        A single SSH channel is kept open until the command exits
+        or `stop_event` is set.
+
+        Args:
+            command (Text): Command text
+            stop_event (threading.Event, optional): stop reading the output
+                and close the channel when this event is set.
+            poll_interval (float, optional): time to wait for the output
+                before yielding None, seconds. Defaults to 1.0.
+            keepalive (int, optional): SSH keepalive interval, seconds.
+                Defaults to 30.
+
+        Yields:
+            Text: output line or None if no output was received
+                during `poll_interval`.
+
+        Raises:
+            SSHException: if the command exited or the connection was lost.
+        """
+        transport = self.connection.get_transport()
+        transport.set_keepalive(keepalive)
+        channel = transport.open_session()
+        channel.settimeout(poll_interval)
+        channel.exec_command(command)
+        buffer = b""
+        try:
+            while not (stop_event and stop_event.is_set()):
+                try:
+                    data = channel.recv(32768)
+                except socket.timeout:
+                    if not transport.is_active():
+                        raise SSHException("SSH connection lost") from None
+                    yield None
+                    continue
+                if not data:
+                    raise SSHException(
+                        "Command exited with status %s" % channel.recv_exit_status()
+                    )
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    yield line.decode(errors="replace")
+        finally:
+            channel.close()
+
     def delete_file(self, remote_path):
         """
         Delete file from remote server
@@ -223,11 +304,18 @@ class SSH(object):
         Returns:
             Result (class paramiko.sftp_attr.SFTPAttributes): metadata
              of the uploaded file.
+             `upload_archive()` result if local directory is uploaded.
         """
         if isinstance(file, io.BytesIO):
             result = self.sftp.putfo(file, remote_path)
+        elif isinstance(file, str) and os.path.isdir(file):
+            # SFTP cannot upload directories, send them as an archive
+            result = self.upload_archive(
+                remote_path,
+                lambda tar: tar.add(file, arcname=".", recursive=True),
+            )
         elif isinstance(file, str):
-            result = self.sftp.put(file, remote_path=remote_path, recursive=True)
+            result = self.sftp.put(file, remote_path)
         else:
             raise TypeError(
                 "Incorrect type of file ({}) allowed: string, BytesIO.".format(
@@ -250,6 +338,245 @@ class SSH(object):
         file = self.sftp.open(remote_path)
         return file.read()
 
+    def upload_archive(self, remote_dir, fill_archive):
+        """
+        Stream a tar.gz archive to remote server and extract it there.
+        Archive is composed on the fly and piped to 'tar' running
+        in a single exec channel so many small files are transferred
+        as one compressed stream.
+
+        Args:
+            remote_dir (Text): directory to extract the archive to.
+                Directory is created if it doesn't exist.
+            fill_archive (function): called with an open `tarfile.TarFile`
+                to add the archive members.
+
+        Returns:
+            status (int), extracted (list of Text), error (list of Text):
+                exit status of the remote 'tar' command,
+                names of the members extracted on the remote side
+                and error lines.
+        """
+        quoted_dir = shlex.quote(remote_dir)
+        channel = self._open_exec_channel(
+            f"mkdir -p {quoted_dir} && tar -xzvf - -C {quoted_dir}"
+        )
+        try:
+            stdin = channel.makefile_stdin("wb")
+            with tarfile.open(fileobj=stdin, mode="w|gz") as tar:
+                fill_archive(tar)
+            stdin.flush()
+            channel.shutdown_write()
+            extracted = [
+                line.decode(errors="replace").rstrip("\n")
+                for line in channel.makefile("rb")
+            ]
+            error = [
+                line.decode(errors="replace") for line in channel.makefile_stderr("rb")
+            ]
+            status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        return status, extracted, error
+
+    def download_archive(self, remote_dir, paths, process_member):
+        """
+        Download files packed by remote 'tar' into a tar.gz stream
+        using a single exec channel. Archive is read as a stream
+        and is never saved as a whole.
+
+        Args:
+            remote_dir (Text): directory the `paths` are relative to.
+            paths (list of Text): paths of the files or directories
+                relative to `remote_dir`.
+            process_member (function): called with `tarfile.TarInfo`
+                and a file object to read the content from
+                for each regular file in the archive.
+
+        Returns:
+            status (int), error (list of Text):
+                exit status of the remote 'tar' command and error lines.
+        """
+        quoted_paths = " ".join(shlex.quote(path) for path in paths)
+        channel = self._open_exec_channel(
+            f"tar -czf - -C {shlex.quote(remote_dir)} -- {quoted_paths}"
+        )
+        try:
+            channel.shutdown_write()
+            try:
+                with tarfile.open(fileobj=channel.makefile("rb"), mode="r|gz") as tar:
+                    for member in tar:
+                        if member.isfile():
+                            process_member(member, tar.extractfile(member))
+            except tarfile.ReadError:
+                # Nothing was sent, eg none of the files exist
+                pass
+            error = [
+                line.decode(errors="replace") for line in channel.makefile_stderr("rb")
+            ]
+            status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        return status, error
+
+    def _open_exec_channel(self, command):
+        """
+        Open a new session channel tuned for bulk transfer and run command in it.
+
+        Args:
+            command (Text): Command text
+
+        Returns:
+            paramiko.Channel: channel the command is running in
+        """
+        channel = self.connection.get_transport().open_session(
+            window_size=SFTP_WINDOW_SIZE, max_packet_size=SFTP_MAX_PACKET_SIZE
+        )
+        channel.exec_command(command)
+        return channel
+
+    def download_file_stream(self, remote_path, file_obj, max_size=0, callback=None):
+        """
+        Download file from remote server into a file object chunk by chunk.
+        Chunks are requested ahead using SFTP prefetch so file content
+        is never kept in memory as a whole.
+
+        Args:
+            remote_path (Text): full path file location with file type
+             (e.g. /test/my_file.txt).
+            file_obj (file): open binary file object to write the content to.
+            max_size (int, optional): maximum file size in bytes.
+                0 means no limit. Defaults to 0.
+            callback (function, optional): called with the number of bytes
+                transferred so far and the total file size after each chunk.
+
+        Raise:
+            ValidationError: if file size exceeds `max_size`.
+
+        Returns:
+            int: number of bytes downloaded.
+        """
+        with self.sftp.open(remote_path, "rb") as remote_file:
+            file_size = remote_file.stat().st_size
+            if max_size and file_size > max_size:
+                raise ValidationError(
+                    _(
+                        "File size %(size)s exceeds the limit of %(limit)s bytes",
+                        size=file_size,
+                        limit=max_size,
+                    )
+                )
+            remote_file.prefetch(file_size)
+            size = 0
+            while True:
+                data = remote_file.read(FILE_CHUNK_SIZE)
+                if not data:
+                    break
+                file_obj.write(data)
+                size += len(data)
+                if callback:
+                    callback(size, file_size)
+        return size
+
+    def upload_file_stream(self, file_obj, remote_path, file_size=0, callback=None):
+        """
+        Upload file object to remote server chunk by chunk.
+
+        Args:
+            file_obj (file): open binary file object to read the content from.
+            remote_path (Text): full path file location with file type
+             (e.g. /test/my_file.txt).
+            file_size (int, optional): size of the file, used for the callback.
+            callback (function, optional): called with the number of bytes
+                transferred so far and the total file size after each chunk.
+
+        Returns:
+            Result (class paramiko.sftp_attr.SFTPAttributes): metadata
+             of the uploaded file.
+        """
+        return self.sftp.putfo(
+            file_obj, remote_path, file_size=file_size, callback=callback
+        )
+
+    def stat_files(self, remote_paths, follow_symlinks=True):
+        """
+        Get metadata of several remote files using a single SFTP session.
+
+        Args:
+            remote_paths (list of Text): full paths of the files
+             (e.g. ['/test/my_file.txt', '/test/other_file.txt']).
+            follow_symlinks (Bool, optional): get metadata of the symlink
+             target instead of the symlink itself. Defaults to True.
+
+        Returns:
+            Dict: {remote_path: paramiko.sftp_attr.SFTPAttributes or None}
+                None is returned for files that do not exist.
+        """
+        sftp = self.sftp
+        stat_file = sftp.stat if follow_symlinks else sftp.lstat
+        result = {}
+        for remote_path in remote_paths:
+            try:
+                result[remote_path] = stat_file(remote_path)
+            except FileNotFoundError:
+                result[remote_path] = None
+        return result
+
+    def read_file_tail(
+        self, remote_path, offset=0, fingerprint=None, window_size=0, max_size=0
+    ):
+        """
+        Read bytes appended to a remote file since the previous read.
+        Whole file is never transferred: only the new part or
+        the latest `max_size` bytes are read.
+
+        File is considered replaced (eg rotated or truncated) if it is smaller
+        than `offset` or its leading bytes don't match the `fingerprint`.
+
+        Args:
+            remote_path (Text): full path file location with file type
+             (e.g. /var/log/nginx/access.log).
+            offset (int): position up to which the file was read previously.
+            fingerprint (Char): hex encoded leading bytes of the file
+                received during the previous read.
+            window_size (int): number of bytes that are already kept locally.
+            max_size (int): maximum number of bytes to keep locally.
+                0 means no limit.
+
+        Returns:
+            Dict: {
+                "data": Bytes, data read from the file,
+                "start": int, position the data was read from,
+                "size": int, file size,
+                "fingerprint": Char, new file fingerprint,
+                "append": bool, True if data continues the previously read one,
+            }
+        """
+        with self.sftp.open(remote_path, "rb") as remote_file:
+            size = remote_file.stat().st_size
+            new_fingerprint = remote_file.read(FILE_FINGERPRINT_SIZE).hex()
+            is_replaced = size < offset or bool(
+                fingerprint and not new_fingerprint.startswith(fingerprint)
+            )
+            append = bool(offset) and not is_replaced
+            if not append:
+                start = max(size - max_size, 0) if max_size else 0
+            elif max_size and window_size + size - offset > max_size:
+                # Too much data: re-read the latest window instead of appending
+                start = max(size - max_size, 0)
+                append = False
+            else:
+                start = offset
+            remote_file.seek(start)
+            data = remote_file.read(size - start) if size > start else b""
+        return {
+            "data": data,
+            "start": start,
+            "size": size,
+            "fingerprint": new_fingerprint,
+            "append": append,
+        }
+
 
 class CxTowerServer(models.Model):
     """Represents a server entity
@@ -405,19 +732,94 @@ class CxTowerServer(models.Model):
             ("delete_error", "Deletion Error"),
         ]
 
+    @api.model
+    def _search_by_selector(self, selector):
+        """Search servers using selector expression.
+        Check `cx_tower_server_selector` for the syntax.
+
+        Args:
+            selector (Char): selector expression,
+                eg 'tag:prod and var.odoo_version == "16.0" and os:ubuntu'
+
+        Returns:
+            cx.tower.server: matching servers
+        """
+        return self.search(self._get_selector_domain(selector))
+
+    @api.model
+    def _get_selector_domain(self, selector):
+        """Compose domain that matches servers selected by expression.
+        Selector is compiled into a single SQL subquery.
+
+        Args:
+            selector (Char): selector expression
+
+        Raises:
+            ValidationError: if selector is not valid
+
+        Returns:
+            list: domain
+        """
+        try:
+            query, params = compile_selector(selector or "")
+        except ValueError as error:
+            raise ValidationError(
+                _("Invalid server selector: %(error)s", error=error)
+            ) from error
+        return [("id", "inselect", (query, params))]
+
+    def _get_fields_follow_active(self):
+        """Return One2many fields whose records are archived
+        and unarchived together with the server.
+        Override this function to add custom fields.
+
+        Returns:
+            list: field names
+        """
+        return ["file_ids", "command_log_ids", "plan_log_ids", "variable_value_ids"]
+
     def server_toggle_active(self, self_active):
         """
-        Change active status of related records
+        Change active status of related records.
+        Records of all servers are updated using set-based queries
+        without loading them into memory.
+        Access to the related records follows access to the servers.
 
         Args:
             self_active (bool): active status of the record
         """
-        self.file_ids.filtered(lambda f: f.active == self_active).toggle_active()
-        self.command_log_ids.filtered(lambda c: c.active == self_active).toggle_active()
-        self.plan_log_ids.filtered(lambda p: p.active == self_active).toggle_active()
-        self.variable_value_ids.filtered(
-            lambda vv: vv.active == self_active
-        ).toggle_active()
+        if not self:
+            return
+        for field_name in self._get_fields_follow_active():
+            field = self._fields[field_name]
+            model = self.env[field.comodel_name]
+            model.flush([field.inverse_name, "active"])
+            # Update in chunks to keep transaction locks and WAL size reasonable
+            query = f"""
+                UPDATE {model._table}
+                SET active = %(active)s,
+                    write_uid = %(uid)s,
+                    write_date = (now() at time zone 'UTC')
+                WHERE id IN (
+                    SELECT id FROM {model._table}
+                    WHERE {field.inverse_name} IN %(server_ids)s
+                        AND COALESCE(active, FALSE) = %(self_active)s
+                    LIMIT %(limit)s
+                )
+            """
+            params = {
+                "active": not self_active,
+                "uid": self.env.uid,
+                "server_ids": tuple(self.ids),
+                "self_active": self_active,
+                "limit": ACTIVE_UPDATE_CHUNK_SIZE,
+            }
+            while True:
+                self.env.cr.execute(query, params)
+                if self.env.cr.rowcount < ACTIVE_UPDATE_CHUNK_SIZE:
+                    break
+            model.invalidate_cache(["active", "write_uid", "write_date"])
+        self.invalidate_cache(self._get_fields_follow_active(), self.ids)
 
     def toggle_active(self):
         """Archiving related server"""
@@ -551,6 +953,100 @@ class CxTowerServer(models.Model):
 
         return result
 
+    def clone(self, count=1):
+        """Create several copies of the server at once.
+        Related records of the server are read once, the copies and their
+        related records are created in batch. Names and references
+        are generated in memory.
+
+        Unlike `copy`, secrets keep their names and references
+        because they are unique per server.
+
+        Args:
+            count (int, optional): number of copies. Defaults to 1.
+
+        Returns:
+            cx.tower.server: new server records
+        """
+        self.ensure_one()
+        if count < 1:
+            return self.browse()
+
+        names = self._get_copied_names(count)
+        references = self._generate_references(names)
+        server_values = self.copy_data({"status": None})[0]
+        servers = self.with_context(reference_mixin_override=True).create(
+            [
+                dict(server_values, name=name, reference=reference)
+                for name, reference in zip(names, references)
+            ]
+        )
+
+        # Files
+        file_values = [
+            file.copy_data({"auto_sync": False, "keep_when_deleted": True})[0]
+            for file in self.file_ids
+        ]
+        if file_values:
+            self.env["cx.tower.file"].create(
+                [
+                    dict(values, server_id=server.id)
+                    for server in servers
+                    for values in file_values
+                ]
+            )
+
+        # Secrets
+        secret_values = [secret.copy_data()[0] for secret in self.secret_ids.sudo()]
+        if secret_values:
+            self.env["cx.tower.key"].sudo().create(
+                [
+                    dict(values, server_id=server.id)
+                    for server in servers
+                    for values in secret_values
+                ]
+            )
+
+        # Variable values and server logs get unique references
+        for records in [self.variable_value_ids, self.server_log_ids]:
+            if not records:
+                continue
+            vals_list = []
+            reference_sources = []
+            for server in servers:
+                for record in records:
+                    vals_list.append(record.copy_data({"server_id": server.id})[0])
+                    # Same references as in `copy` are used as a basis.
+                    # Variable values don't have own name,
+                    # so references are generated from the existing ones.
+                    reference_sources.append(
+                        _("%(name)s (copy)", name=record.reference)
+                        if record._name == "cx.tower.variable.value"
+                        else record.name
+                    )
+            for values, reference in zip(
+                vals_list, records._generate_references(reference_sources)
+            ):
+                values["reference"] = reference
+            records.with_context(reference_mixin_override=True).create(vals_list)
+
+        return servers
+
+    def action_clone_server(self):
+        """
+        Returns wizard action to clone the server several times
+        """
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Clone Server"),
+            "res_model": "cx.tower.server.clone.wizard",
+            "view_mode": "form",
+            "view_type": "form",
+            "target": "new",
+            "context": {"default_server_id": self.id},
+        }
+
     def action_update_server_logs(self):
         """Update selected log from its source."""
         for server in self:
@@ -783,13 +1279,15 @@ class CxTowerServer(models.Model):
 
         return test_result
 
-    def _render_command(self, command, path=None):
+    def _render_command(self, command, path=None, plan_log=None):
         """Renders command code for selected command for current server
 
         Args:
             command (cx.tower.command): Command to render
             path (Char): Path where to execute the command.
                 Provide in case you need to override default command path
+            plan_log (cx.tower.plan.log(), optional): Flight plan log.
+                Variable values are taken from the flight plan run snapshot.
 
         Returns:
             dict: rendered values
@@ -818,16 +1316,19 @@ class CxTowerServer(models.Model):
                     variables.append(ve)
 
         # Get variable values for current server
-        variable_values_dict = (
-            self.sudo().get_variable_values(variables)  # pylint: disable=no-member
-            if variables
-            else False
-        )
+        if variables and plan_log:
+            variable_values = plan_log._get_variable_values(variables)
+        else:
+            variable_values_dict = (
+                self.sudo().get_variable_values(variables)  # pylint: disable=no-member
+                if variables
+                else False
+            )
 
-        # Extract variable values for current server
-        variable_values = (
-            variable_values_dict.get(self.id) if variable_values_dict else False
-        )  # pylint: disable=no-member
+            # Extract variable values for current server
+            variable_values = (
+                variable_values_dict.get(self.id) if variable_values_dict else False
+            )  # pylint: disable=no-member
 
         # Render command code using variables
         if variable_values:
@@ -879,6 +1380,9 @@ class CxTowerServer(models.Model):
             an exception will be raised.
             IMPORTANT: be aware when running commands with `no_log=True`
             because no `Allow Parallel Run` check will be done!
+            cx_tower_commit_progress (Bool): commit the transaction before
+            remote operations and after saving command results.
+            See `_commit_progress()` for details.
         Returns:
             dict(): command execution result if `no_log` context value == True else None
         """
@@ -896,39 +1400,21 @@ class CxTowerServer(models.Model):
 
         no_log = self._context.get("no_log")
 
-        # Get log vals from kwargs and update them
+        # Get log vals from kwargs and update them.
+        # Parallel run is checked by the command runner.
         if not no_log:
             log_obj = self.env["cx.tower.command.log"]
             log_vals = kwargs.get("log", {})
             log_vals.update({"use_sudo": sudo})
 
-            # Check if command is already running and parallel run is not allowed
-            if not command.allow_parallel_run:
-                running_count = log_obj.sudo().search_count(
-                    [
-                        ("server_id", "=", self.id),  # pylint: disable=no-member
-                        ("command_id", "=", command.id),
-                        ("is_running", "=", True),
-                    ]
-                )
-                # Create log record and exit
-                # if the same command is currently running on the same server
-                if running_count > 0:
-                    now = fields.Datetime.now()
-                    log_obj.record(
-                        self.id,  # pylint: disable=no-member
-                        command.id,
-                        now,
-                        now,
-                        ANOTHER_COMMAND_RUNNING,
-                        None,
-                        [_("Another instance of the command is already running")],
-                        **log_vals,
-                    )
-                    return
-
-        # Render command
-        rendered_command = self._render_command(command, path)
+        # Render command.
+        # Flight plan commands use variable values resolved for the plan run.
+        plan_log = (
+            self.env["cx.tower.plan.log"]
+            .sudo()
+            .browse(kwargs.get("log", {}).get("plan_log_id"))
+        )
+        rendered_command = self._render_command(command, path, plan_log=plan_log)
         rendered_command_code = rendered_command["rendered_code"]
         rendered_command_path = rendered_command["rendered_path"]
 
@@ -958,6 +1444,252 @@ class CxTowerServer(models.Model):
             **kwargs,
         )
 
+    def _get_run_lock_keys(self, lock_type, object_id):
+        """Get keys of the advisory lock that marks a running
+        command or flight plan on this server.
+
+        Args:
+            lock_type (Char): "command", "command_log", "plan" or "plan_lines"
+            object_id (int): id of the command, command log,
+                flight plan or flight plan log
+
+        Returns:
+            tuple: (Char, int) lock name and server id
+        """
+        self.ensure_one()
+        return f"cx_tower_{lock_type}_{object_id}", self.id
+
+    @contextmanager
+    def _run_lock(self, lock_type, object_id, shared=False, owner=None, wait=False):
+        """Hold a session level PostgreSQL advisory lock
+        while a command or a flight plan is running on this server.
+        Locks are held by an autocommit connection shared by all runs
+        of the current thread, so they are kept across commits,
+        are released even if the current transaction fails
+        and are released automatically if the worker dies.
+        Crashed runs never block new ones.
+
+        Args:
+            lock_type (Char): "command", "command_log", "plan" or "plan_lines"
+            object_id (int): id of the command, command log,
+                flight plan or flight plan log
+            shared (Bool, optional): use shared lock for runs
+                that allow parallel execution. Defaults to False.
+            owner (int, optional): id of the record the lock is held for,
+                eg command log. Used to release the lock earlier
+                with `_release_run_lock()`.
+            wait (Bool, optional): wait until the lock is released
+                instead of giving up. Lock held by the current thread
+                is reused. Defaults to False.
+
+        Yields:
+            Bool: True if lock was acquired
+        """
+        lock_id = (self.env.cr.dbname, lock_type, object_id, self.id)
+        held_locks = self._get_held_run_locks().get(lock_id)
+        if held_locks:
+            # PostgreSQL grants the lock to the session holding it,
+            # so runs of the current thread are checked here.
+            # Waiting for the lock held by the current thread would never end.
+            if not wait and not (shared and all(lock[1] for lock in held_locks)):
+                yield False
+                return
+        lock_keys = self._get_run_lock_keys(lock_type, object_id)
+        suffix = "_shared" if shared else ""
+        lock_function = "pg_advisory_lock" if wait else "pg_try_advisory_lock"
+        lock_cr = self._get_run_lock_cursor()
+        try:
+            lock_cr.execute(
+                f"SELECT {lock_function}{suffix}(hashtext(%s), %s)", lock_keys
+            )
+            # Waiting lock functions return nothing
+            locked = wait or lock_cr.fetchone()[0]
+        except Exception:
+            self._close_run_lock_cursor()
+            raise
+        if not locked:
+            yield False
+            return
+        self._get_held_run_locks().setdefault(lock_id, []).append((owner, suffix))
+        try:
+            yield True
+        finally:
+            self._release_run_lock(lock_type, object_id, owner)
+
+    def _get_held_run_locks(self):
+        """Get run locks held by the current thread
+
+        Returns:
+            dict: {(dbname, lock type, object id, server id): [(owner, suffix)]}
+        """
+        if not hasattr(_held_run_locks, "locks"):
+            _held_run_locks.locks = {}
+        return _held_run_locks.locks
+
+    def _get_run_lock_cursor(self):
+        """Get the connection holding run locks of the current thread.
+        Connection is opened once and kept open for the thread lifetime.
+
+        Returns:
+            Cursor: autocommit cursor
+        """
+        if not hasattr(_held_run_locks, "cursors"):
+            _held_run_locks.cursors = {}
+        dbname = self.env.cr.dbname
+        lock_cr = _held_run_locks.cursors.get(dbname)
+        if lock_cr is None or lock_cr.closed:
+            lock_cr = self.pool.cursor()
+            lock_cr.autocommit(True)
+            _held_run_locks.cursors[dbname] = lock_cr
+        return lock_cr
+
+    def _close_run_lock_cursor(self):
+        """Close the run lock connection of the current thread after a failure.
+        Locks held by it are released by PostgreSQL.
+        """
+        dbname = self.env.cr.dbname
+        lock_cr = getattr(_held_run_locks, "cursors", {}).pop(dbname, None)
+        for lock_id in list(self._get_held_run_locks()):
+            if lock_id[0] == dbname:
+                del self._get_held_run_locks()[lock_id]
+        if lock_cr is not None and not lock_cr.closed:
+            lock_cr.close()
+
+    def _release_run_lock(self, lock_type, object_id, owner=None):
+        """Release run lock held by the current thread
+
+        Args:
+            lock_type (Char): "command", "command_log", "plan" or "plan_lines"
+            object_id (int): id of the command, command log,
+                flight plan or flight plan log
+            owner (int, optional): id of the record the lock is held for
+
+        Returns:
+            Bool: True if lock was released
+        """
+        self.ensure_one()
+        held_locks = self._get_held_run_locks()
+        lock_id = (self.env.cr.dbname, lock_type, object_id, self.id)
+        lock_list = held_locks.get(lock_id, [])
+        lock_index = next(
+            (
+                index
+                for index in reversed(range(len(lock_list)))
+                if lock_list[index][0] == owner
+            ),
+            None,
+        )
+        if lock_index is None:
+            return False
+        __, suffix = lock_list.pop(lock_index)
+        if not lock_list:
+            del held_locks[lock_id]
+        try:
+            self._get_run_lock_cursor().execute(
+                f"SELECT pg_advisory_unlock{suffix}(hashtext(%s), %s)",
+                self._get_run_lock_keys(lock_type, object_id),
+            )
+        except Exception:
+            self._close_run_lock_cursor()
+            raise
+        return True
+
+    def _is_run_locked(self, lock_type, object_id):
+        """Check if a command or a flight plan is running on this server.
+
+        Args:
+            lock_type (Char): "command", "command_log", "plan" or "plan_lines"
+            object_id (int): id of the command, command log,
+                flight plan or flight plan log
+
+        Returns:
+            Bool: True if run lock is held
+        """
+        self.ensure_one()
+        return (self.id, object_id) in self._get_locked_runs(
+            lock_type, [(self.id, object_id)]
+        )
+
+    @api.model
+    def _get_locked_runs(self, lock_type, run_keys):
+        """Check which commands or flight plans are running
+        using a single query for all of them.
+
+        Args:
+            lock_type (Char): "command", "command_log", "plan" or "plan_lines"
+            run_keys (list): [(server id, object id)]
+
+        Returns:
+            set: {(server id, object id)} which run lock is held
+        """
+        run_keys = list(set(run_keys))
+        if not run_keys:
+            return set()
+        server_obj = self.browse()
+        lock_names = [
+            server_obj.browse(server_id)._get_run_lock_keys(lock_type, object_id)[0]
+            for server_id, object_id in run_keys
+        ]
+        # Lock with two int4 keys is stored as classid, objid and objsubid 2
+        self.env.cr.execute(
+            """
+            SELECT keys.idx
+            FROM unnest(%s::text[], %s::int[], %s::int[])
+                AS keys(lock_name, server_id, idx)
+            WHERE EXISTS (
+                SELECT 1 FROM pg_locks
+                WHERE locktype = 'advisory'
+                    AND granted
+                    AND objsubid = 2
+                    AND database = (
+                        SELECT oid FROM pg_database WHERE datname = current_database()
+                    )
+                    AND classid = hashtext(keys.lock_name)::oid
+                    AND objid = keys.server_id::oid
+            )
+            """,
+            (
+                lock_names,
+                [server_id for server_id, __ in run_keys],
+                list(range(len(run_keys))),
+            ),
+        )
+        return {run_keys[row[0]] for row in self.env.cr.fetchall()}
+
+    def _can_commit_progress(self):
+        """Check if command progress can be committed in the current transaction.
+        Commit is never done in tests because they rely on the transaction rollback.
+
+        Returns:
+            Bool: True if commit is allowed
+        """
+        return (
+            bool(self._context.get("cx_tower_commit_progress"))
+            and not getattr(threading.current_thread(), "testing", False)
+            and not self.env.registry.in_test_mode()
+        )
+
+    def _commit_progress(self):
+        """Commit the current transaction to make command progress
+        visible to other users and release row locks.
+        Used before remote operations so that no database transaction
+        is kept open while waiting for the remote server,
+        and after command results are saved so they are persisted
+        in a short transaction.
+        Does nothing unless the `cx_tower_commit_progress` context key is set.
+        Set it only in flows which own their transaction, eg queue jobs.
+        Never set it in user requests: a request retried after
+        a serialization failure would run the committed part again.
+
+        Returns:
+            Bool: True if transaction was committed
+        """
+        if not self._can_commit_progress():
+            return False
+        self.flush()
+        self.env.cr.commit()  # pylint: disable=invalid-commit
+        return True
+
     def _command_runner_wrapper(
         self,
         command,
@@ -1010,6 +1742,76 @@ class CxTowerServer(models.Model):
         """Top level command runner function.
         Calls command type specific runners.
 
+        Args:
+            command (cx.tower.command()): Command
+            log_record (cx.tower.command.log()): Command log record
+            rendered_command_code (Text): Rendered command code.
+                We are passing in case it differs from command code in the log record.
+            rendered_command_path (Char, optional): Rendered command path.
+            ssh_connection (SSH client instance, optional): SSH connection to reuse.
+            kwargs (dict):  extra arguments. Use to pass external values.
+                Following keys are supported by default:
+                    - "log": {values passed to logger}
+                    - "key": {values passed to key parser}
+        Context:
+            use_sudo (Bool): use sudo for command execution
+
+        Returns:
+            dict(): command execution result if `log_record` is defined else None
+        """
+        # Concurrent runs are detected using advisory locks
+        # which are held while the command is running.
+        if log_record:
+            # Log is finished with the server context,
+            # so the flight plan is continued with the same one
+            log_record = log_record.with_context(self._context)
+            with self._run_lock(
+                "command",
+                command.id,
+                shared=command.allow_parallel_run,
+                owner=log_record.id,
+            ) as locked:
+                if locked:
+                    # Log lock tells this run apart from parallel runs
+                    # of the same command
+                    with self._run_lock(
+                        "command_log", log_record.id, owner=log_record.id
+                    ):
+                        return self._command_runner_action(
+                            command,
+                            log_record,
+                            rendered_command_code,
+                            rendered_command_path,
+                            ssh_connection,
+                            **kwargs,
+                        )
+            return log_record.finish(
+                fields.Datetime.now(),
+                ANOTHER_COMMAND_RUNNING,
+                None,
+                _("Another instance of the command is already running"),
+            )
+
+        return self._command_runner_action(
+            command,
+            log_record,
+            rendered_command_code,
+            rendered_command_path,
+            ssh_connection,
+            **kwargs,
+        )
+
+    def _command_runner_action(
+        self,
+        command,
+        log_record,
+        rendered_command_code,
+        rendered_command_path=None,
+        ssh_connection=None,
+        **kwargs,
+    ):
+        """Call command type specific runner.
+
         Args:
             command (cx.tower.command()): Command
             log_record (cx.tower.command.log()): Command log record
@@ -1071,6 +1873,9 @@ class CxTowerServer(models.Model):
             )
         ):
             self.write({"status": command.server_status})
+            # Release the server row lock
+            if log_record:
+                self._commit_progress()
 
         if need_check_server_status:
             return response
@@ -1147,6 +1952,10 @@ class CxTowerServer(models.Model):
                 else:
                     return command_result
 
+            # Persist "running" state and release locks before file transfer
+            if log_record:
+                self._commit_progress()
+
             if file.source == "server":
                 file.action_pull_from_server()
             elif file.source == "tower":
@@ -1206,6 +2015,10 @@ class CxTowerServer(models.Model):
         if not ssh_connection:
             ssh_connection = self._get_ssh_client(raise_on_error=True)
 
+        # Persist "running" state and release locks before remote execution
+        if log_record:
+            self._commit_progress()
+
         # Execute command
         command_result = self._execute_command_using_ssh(
             client=ssh_connection,
@@ -1738,6 +2551,346 @@ class CxTowerServer(models.Model):
             ) from fe
         return result
 
+    def download_file_stream(self, remote_path, file_obj, **kwargs):
+        """
+        Download file from remote server into a file object chunk by chunk.
+        Check `SSH.download_file_stream()` for the arguments.
+
+        Args:
+            remote_path (Text): full path file location with file type
+             (e.g. /test/my_file.txt).
+            file_obj (file): open binary file object to write the content to.
+
+        Raise:
+            ValidationError: raise if file not found.
+
+        Returns:
+            int: number of bytes downloaded.
+        """
+        self.ensure_one()
+        client = self._get_ssh_client(raise_on_error=True)
+        try:
+            result = client.download_file_stream(remote_path, file_obj, **kwargs)
+        except FileNotFoundError as fe:
+            raise ValidationError(
+                _("The file %(f_path)s not found.", f_path=remote_path)
+            ) from fe
+        return result
+
+    def upload_file_stream(self, file_obj, remote_path, **kwargs):
+        """
+        Upload file object to remote server chunk by chunk.
+        Check `SSH.upload_file_stream()` for the arguments.
+
+        Args:
+            file_obj (file): open binary file object to read the content from.
+            remote_path (Text): full path file location with file type
+             (e.g. /test/my_file.txt).
+
+        Returns:
+            Result (class paramiko.sftp_attr.SFTPAttributes): metadata of the
+             uploaded file.
+        """
+        self.ensure_one()
+        client = self._get_ssh_client(raise_on_error=True)
+        return client.upload_file_stream(file_obj, remote_path, **kwargs)
+
+    def upload_directory(self, local_path, remote_dir):
+        """
+        Upload local directory to remote server as a single
+        compressed archive stream.
+
+        Args:
+            local_path (Text): path of the local directory.
+            remote_dir (Text): remote directory to upload the content to.
+
+        Raise:
+            ValidationError: if the archive was not extracted successfully.
+
+        Returns:
+            list of Text: names of the extracted files and directories
+        """
+        self.ensure_one()
+        client = self._get_ssh_client(raise_on_error=True)
+        status, extracted, error = client.upload_archive(
+            remote_dir, lambda tar: tar.add(local_path, arcname=".", recursive=True)
+        )
+        if status != 0:
+            raise ValidationError(
+                _(
+                    "Cannot upload %(path)s to server: %(err)s",
+                    path=local_path,
+                    err="".join(error),
+                )
+            )
+        return extracted
+
+    def download_directory(self, remote_dir, local_path):
+        """
+        Download remote directory as a single compressed archive stream
+        and extract its regular files into a local directory.
+
+        Args:
+            remote_dir (Text): remote directory to download.
+            local_path (Text): path of the local directory.
+
+        Raise:
+            ValidationError: if the archive was not received successfully
+                or contains unsafe paths.
+
+        Returns:
+            list of Text: paths of the extracted files relative to `local_path`
+        """
+        self.ensure_one()
+        client = self._get_ssh_client(raise_on_error=True)
+        local_root = os.path.realpath(local_path)
+        extracted = []
+
+        def process_member(member, file_obj):
+            target_path = os.path.realpath(os.path.join(local_root, member.name))
+            if os.path.commonpath([local_root, target_path]) != local_root:
+                raise ValidationError(
+                    _("Unsafe file path in archive: %(path)s", path=member.name)
+                )
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(target_path, "wb") as target_file:
+                shutil.copyfileobj(file_obj, target_file)
+            extracted.append(os.path.relpath(target_path, local_root))
+
+        status, error = client.download_archive(remote_dir, ["."], process_member)
+        if status != 0:
+            raise ValidationError(
+                _(
+                    "Cannot download %(path)s from server: %(err)s",
+                    path=remote_dir,
+                    err="".join(error),
+                )
+            )
+        return extracted
+
+    def _get_file_archive_groups(self, files):
+        """Group files by the directory used as the archive root.
+        Absolute and relative paths can't share the same root.
+
+        Args:
+            files (cx.tower.file): files to group
+
+        Returns:
+            list of tuples: (root directory, {file: path relative to root})
+        """
+        tower_key_obj = self.env["cx.tower.key"]
+        groups = {}
+        for file in files:
+            path = os.path.normpath(tower_key_obj._parse_code(file.full_server_path))
+            groups.setdefault(os.path.isabs(path), {})[file] = path
+        result = []
+        for file_paths in groups.values():
+            root_dir = os.path.commonpath(
+                [os.path.dirname(path) for path in file_paths.values()]
+            )
+            result.append(
+                (
+                    root_dir or ".",
+                    {
+                        file: os.path.relpath(path, root_dir or ".")
+                        for file, path in file_paths.items()
+                    },
+                )
+            )
+        return result
+
+    @api.model
+    def _get_archive_member_response(self, arcname, error):
+        """Get response for a file that was not transferred in an archive
+
+        Args:
+            arcname (Text): file path in the archive
+            error (list of Text): error lines of the remote 'tar' command
+
+        Returns:
+            Text: error message
+        """
+        file_error = [line for line in error if arcname in line]
+        return "".join(file_error or error) or _("File was not transferred")
+
+    def upload_files_archive(self, files):
+        """
+        Upload files to server in a single compressed archive stream
+        per root directory. Content is piped to 'tar' running on server.
+        Existing files keep their mode and owner. Symlinks are not
+        replaced by 'tar', so their targets are uploaded one by one.
+
+        Args:
+            files (cx.tower.file): files to upload. Files of other servers
+                are ignored.
+
+        Returns:
+            dict: {file_id: server response}, 'ok' for uploaded files
+        """
+        self.ensure_one()
+        tower_key_obj = self.env["cx.tower.key"]
+        files = files.filtered(lambda file_: file_.server_id == self)
+        if not files:
+            return {}
+        client = self._get_ssh_client(raise_on_error=True)
+        result = {}
+        for root_dir, file_paths in self._get_file_archive_groups(files):
+            remote_paths = {
+                file: os.path.join(root_dir, arcname)
+                for file, arcname in file_paths.items()
+            }
+            remote_stats = self.stat_files(
+                list(set(remote_paths.values())), follow_symlinks=False
+            )
+            file_stats = {
+                file: remote_stats.get(remote_path)
+                for file, remote_path in remote_paths.items()
+            }
+            for file, remote_stat in file_stats.items():
+                if remote_stat and stat.S_ISLNK(remote_stat.st_mode):
+                    result[file.id] = self._upload_file_by_symlink(file)
+                    del file_paths[file]
+            if not file_paths:
+                continue
+
+            def fill_archive(tar, file_paths=file_paths, file_stats=file_stats):
+                mtime = int(time.time())
+                for file, arcname in file_paths.items():
+                    info = tarfile.TarInfo(arcname)
+                    info.mtime = mtime
+                    info.mode = 0o644
+                    remote_stat = file_stats[file]
+                    if remote_stat:
+                        info.mode = stat.S_IMODE(remote_stat.st_mode)
+                        info.uid = remote_stat.st_uid
+                        info.gid = remote_stat.st_gid
+                    if file.file_type == "binary":
+                        with file._open_file_stream() as (file_obj, size):
+                            info.size = size
+                            tar.addfile(info, file_obj)
+                    else:
+                        data = tower_key_obj._parse_code(
+                            file.rendered_code or ""
+                        ).encode()
+                        info.size = len(data)
+                        tar.addfile(info, io.BytesIO(data))
+
+            status, extracted, error = client.upload_archive(root_dir, fill_archive)
+            extracted = {os.path.normpath(name) for name in extracted}
+            for file, arcname in file_paths.items():
+                result[file.id] = (
+                    "ok"
+                    if arcname in extracted
+                    else self._get_archive_member_response(arcname, error)
+                )
+        return result
+
+    def _upload_file_by_symlink(self, file):
+        """Upload file which remote path is a symlink.
+        Content is written to the symlink target.
+
+        Args:
+            file (cx.tower.file): file to upload
+
+        Returns:
+            Text: 'ok' or error message
+        """
+        try:
+            file._process("upload", raise_error=True)
+        except Exception as error:
+            return repr(error)
+        return "ok"
+
+    def download_files_archive(self, files):
+        """
+        Download files from server in a single compressed archive stream
+        per root directory and save their content.
+
+        Args:
+            files (cx.tower.file): files to download. Files of other servers
+                are ignored.
+
+        Returns:
+            dict: {file_id: server response}, 'ok' for downloaded files
+        """
+        self.ensure_one()
+        files = files.filtered(lambda file_: file_.server_id == self)
+        if not files:
+            return {}
+        client = self._get_ssh_client(raise_on_error=True)
+        result = {}
+        for root_dir, file_paths in self._get_file_archive_groups(files):
+            files_by_arcname = {}
+            for file, arcname in file_paths.items():
+                files_by_arcname.setdefault(arcname, []).append(file)
+
+            def process_member(member, file_obj, files_by_arcname=files_by_arcname):
+                member_files = files_by_arcname.get(os.path.normpath(member.name))
+                if not member_files:
+                    return
+                # Same remote file can be linked to several records
+                data = file_obj.read() if len(member_files) > 1 else None
+                for file in member_files:
+                    result[file.id] = file._save_pulled_content(
+                        io.BytesIO(data) if data is not None else file_obj,
+                        member.size,
+                        int(member.mtime),
+                    )
+
+            __, error = client.download_archive(
+                root_dir, sorted(files_by_arcname), process_member
+            )
+            for file, arcname in file_paths.items():
+                if file.id not in result:
+                    result[file.id] = self._get_archive_member_response(arcname, error)
+        return result
+
+    def read_file_tail(self, remote_path, **kwargs):
+        """
+        Read bytes appended to a remote file since the previous read.
+        Check `SSH.read_file_tail()` for the arguments and result format.
+
+        Args:
+            remote_path (Text): full path file location with file type
+             (e.g. /var/log/nginx/access.log).
+
+        Raise:
+            ValidationError: raise if file not found.
+
+        Returns:
+            Dict: read result
+        """
+        self.ensure_one()
+        client = self._get_ssh_client(raise_on_error=True)
+        try:
+            result = client.read_file_tail(remote_path, **kwargs)
+        except FileNotFoundError as fe:
+            raise ValidationError(
+                _("The file %(f_path)s not found.", f_path=remote_path)
+            ) from fe
+        return result
+
+    def stat_files(self, remote_paths, follow_symlinks=True):
+        """
+        Get metadata of remote files.
+        All files are checked using a single SFTP session.
+
+        Args:
+            remote_paths (list of Text): full paths of the files
+             (e.g. ['/test/my_file.txt', '/test/other_file.txt']).
+            follow_symlinks (Bool, optional): get metadata of the symlink
+             target instead of the symlink itself. Defaults to True.
+
+        Returns:
+            Dict: {remote_path: paramiko.sftp_attr.SFTPAttributes or None}
+                None is returned for files that do not exist.
+        """
+        self.ensure_one()
+        if not remote_paths:
+            return {}
+        client = self._get_ssh_client(raise_on_error=True)
+        return client.stat_files(remote_paths, follow_symlinks=follow_symlinks)
+
     def action_open_files(self):
         """
         Open current server files
@@ -55,6 +55,39 @@ class CxTowerServerLog(models.Model):
     )
     log_text = fields.Html(readonly=True)
 
+    # --- Tail mode
+    use_tail = fields.Boolean(
+        string="Tail Mode",
+        groups="cetmix_tower_server.group_root,cetmix_tower_server.group_manager",
+        help="Fetch only lines appended to the file since the previous read "
+        "instead of the entire file",
+    )
+    tail_max_size = fields.Integer(
+        string="Max Log Size, KB",
+        default=512,
+        groups="cetmix_tower_server.group_root,cetmix_tower_server.group_manager",
+        help="Only the latest part of the file of this size is kept in the log. "
+        "Set 0 to keep the entire file",
+    )
+    tail_offset = fields.Integer(
+        readonly=True,
+        copy=False,
+        groups="cetmix_tower_server.group_root,cetmix_tower_server.group_manager",
+        help="Position in the file up to which it was read",
+    )
+    tail_window_size = fields.Integer(
+        readonly=True,
+        copy=False,
+        groups="cetmix_tower_server.group_root,cetmix_tower_server.group_manager",
+        help="Number of file bytes currently kept in the log",
+    )
+    tail_fingerprint = fields.Char(
+        readonly=True,
+        copy=False,
+        groups="cetmix_tower_server.group_root,cetmix_tower_server.group_manager",
+        help="Leading bytes of the file. Used to detect file rotation",
+    )
+
     # --- Server template related
     server_template_id = fields.Many2one("cx.tower.server.template", ondelete="cascade")
     file_template_id = fields.Many2one(
@@ -65,6 +98,14 @@ class CxTowerServerLog(models.Model):
         " when server is created from a template",
     )
 
+    def write(self, vals):
+        # Read file from scratch if tail settings are changed
+        if any(field in vals for field in ["file_id", "use_tail", "tail_max_size"]):
+            vals.update(
+                {"tail_offset": 0, "tail_window_size": 0, "tail_fingerprint": False}
+            )
+        return super().write(vals)
+
     def copy(self, default=None):
         return super(
             CxTowerServerLog, self.with_context(reference_mixin_skip_self=True)
@@ -107,6 +148,9 @@ class CxTowerServerLog(models.Model):
 
         # We are using `sudo` to override command/file access limitations
         for rec in self.sudo():
+            if rec.log_type == "file" and rec.file_id and rec.use_tail:
+                rec._update_log_from_file_tail()
+                continue
             if rec.log_type == "file" and rec.file_id:
                 log_text = rec._get_log_from_file()
             elif rec.log_type == "command" and rec.command_id:
@@ -128,6 +172,60 @@ class CxTowerServerLog(models.Model):
         if self.file_id.source == "tower":
             return self.file_id.code_on_server or self.NO_LOG_FETCHED_MESSAGE
 
+    def _update_log_from_file_tail(self):
+        """Update log with the lines appended to the file since the previous read.
+        Only the new part of the log is formatted and appended to the log text.
+        Log is fully re-read if the file is rotated or the log size limit
+        is exceeded.
+        """
+        self.ensure_one()
+        file_path = self.env["cx.tower.key"]._parse_code(self.file_id.full_server_path)
+        result = self.server_id.read_file_tail(
+            file_path,
+            offset=self.tail_offset,
+            fingerprint=self.tail_fingerprint,
+            window_size=self.tail_window_size,
+            max_size=self.tail_max_size * 1024,
+        )
+        data = result["data"]
+        append = result["append"]
+
+        # Process complete lines only. The rest will be read next time
+        last_newline = data.rfind(b"\n")
+        if last_newline >= 0:
+            data = data[: last_newline + 1]
+        elif append:
+            data = b""
+
+        vals = {
+            "tail_offset": result["start"] + len(data),
+            "tail_fingerprint": result["fingerprint"],
+        }
+        if append:
+            if data:
+                vals.update(
+                    {
+                        "log_text": (self.log_text or "")
+                        + self._format_log_text(data.decode(errors="replace")),
+                        "tail_window_size": self.tail_window_size + len(data),
+                    }
+                )
+        else:
+            # Skip the first line if it was cut
+            if result["start"] > 0:
+                data = data[data.find(b"\n") + 1 :]
+            log_text = data.decode(errors="replace") or self.NO_LOG_FETCHED_MESSAGE
+            vals.update(
+                {
+                    "log_text": self._format_log_text(log_text),
+                    "tail_window_size": len(data),
+                }
+            )
+        # Do not update the record if nothing has changed
+        vals = {key: value for key, value in vals.items() if self[key] != value}
+        if vals:
+            self.write(vals)
+
     def _get_log_from_command(self):
         """Get log from a command.
         Returns:
@@ -0,0 +1,231 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""
+Server selector language.
+
+Selector is an expression used to pick servers, eg:
+    tag:prod and var.odoo_version == "16.0" and os:ubuntu
+
+Supported terms:
+    tag:<reference>             server has a tag with this reference
+    os:<text>                   OS reference equals or OS name contains text
+    name:<text>                 server name or reference contains text
+    var.<reference>             variable value is set
+    var.<reference> == <value>  variable value equals value
+    var.<reference> != <value>  variable value differs from value
+    var.<reference> ~ <value>   variable value contains value
+
+Terms are combined with 'and', 'or', 'not' and parentheses.
+Values containing spaces or special symbols must be quoted.
+Server variable value is used if set, global value otherwise.
+
+Selector is compiled into a single SQL query returning server ids.
+"""
+import re
+
+# Token types
+TOKEN_REGEX = re.compile(
+    r"""
+    \s*(?:
+        (?P<lparen>\()
+        |(?P<rparen>\))
+        |(?P<op>==|!=|~)
+        |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        |(?P<word>[^\s()"'=!~]+)
+    )
+    """,
+    re.VERBOSE,
+)
+KEYWORDS = ("and", "or", "not")
+
+# Server value is preferred, global value is used as a fallback
+VARIABLE_VALUE_SQL = """
+    COALESCE(
+        (SELECT NULLIF(vv.value_char, '') FROM cx_tower_variable_value vv
+         WHERE vv.server_id = s.id AND vv.variable_reference = %s AND vv.active
+         LIMIT 1),
+        (SELECT gv.value_char FROM cx_tower_variable_value gv
+         WHERE gv.is_global AND gv.variable_reference = %s AND gv.active
+         LIMIT 1)
+    )
+"""
+
+
+def escape_like(value):
+    """Escape special symbols of the 'like' pattern
+
+    Args:
+        value (Text): value to escape
+
+    Returns:
+        Text: escaped value
+    """
+    return re.sub(r"([\\%_])", r"\\\1", value)
+
+
+def tokenize(selector):
+    """Split selector into tokens
+
+    Args:
+        selector (Text): selector expression
+
+    Raises:
+        ValueError: if selector contains unexpected symbols
+
+    Returns:
+        list of tuple: (token type, token value)
+    """
+    tokens = []
+    position = 0
+    selector = selector.strip()
+    while position < len(selector):
+        match = TOKEN_REGEX.match(selector, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Unexpected symbol at position {position + 1}")
+        token_type = match.lastgroup
+        value = match.group(token_type)
+        if token_type == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        elif token_type == "word" and value.lower() in KEYWORDS:
+            token_type = value = value.lower()
+        tokens.append((token_type, value))
+        position = match.end()
+    return tokens
+
+
+class SelectorCompiler:
+    """
+    Recursive descent parser that compiles selector into SQL condition
+    over the 'cx_tower_server' table aliased as 's'.
+    """
+
+    def __init__(self, selector):
+        self.tokens = tokenize(selector)
+        self.position = 0
+
+    def compile(self):
+        """Compile selector into SQL query
+
+        Raises:
+            ValueError: if selector is not valid
+
+        Returns:
+            tuple: (query, params). Query returns ids of active servers.
+        """
+        if not self.tokens:
+            raise ValueError("Selector is empty")
+        condition, params = self._parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.position][1]}'")
+        query = f"SELECT s.id FROM cx_tower_server s WHERE s.active AND ({condition})"
+        return query, params
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise ValueError("Unexpected end of selector")
+        self.position += 1
+        return token
+
+    def _parse_or(self):
+        condition, params = self._parse_and()
+        while self._peek()[0] == "or":
+            self._next()
+            right_condition, right_params = self._parse_and()
+            condition = f"({condition} OR {right_condition})"
+            params += right_params
+        return condition, params
+
+    def _parse_and(self):
+        condition, params = self._parse_not()
+        while self._peek()[0] == "and":
+            self._next()
+            right_condition, right_params = self._parse_not()
+            condition = f"({condition} AND {right_condition})"
+            params += right_params
+        return condition, params
+
+    def _parse_not(self):
+        if self._peek()[0] == "not":
+            self._next()
+            condition, params = self._parse_not()
+            return f"(NOT {condition})", params
+        return self._parse_atom()
+
+    def _parse_atom(self):
+        token_type, value = self._next()
+        if token_type == "lparen":
+            condition, params = self._parse_or()
+            if self._next()[0] != "rparen":
+                raise ValueError("Missing ')'")
+            return condition, params
+        if token_type != "word":
+            raise ValueError(f"Unexpected '{value}'")
+        if value.startswith("var."):
+            return self._parse_variable(value[4:])
+        key, separator, argument = value.partition(":")
+        if not separator:
+            raise ValueError(f"Unknown term '{value}'")
+        if not argument:
+            argument_type, argument = self._next()
+            if argument_type not in ("word", "string"):
+                raise ValueError(f"Missing value for '{key}'")
+        return self._compile_term(key.lower(), argument)
+
+    def _compile_term(self, key, argument):
+        if key == "tag":
+            return (
+                "EXISTS (SELECT 1 FROM cx_tower_server_tag_rel tr"
+                " JOIN cx_tower_tag t ON t.id = tr.tag_id"
+                " WHERE tr.server_id = s.id AND t.reference = %s)",
+                [argument],
+            )
+        if key == "os":
+            return (
+                "EXISTS (SELECT 1 FROM cx_tower_os o WHERE o.id = s.os_id"
+                " AND (o.reference = %s OR o.name ILIKE %s))",
+                [argument, f"%{escape_like(argument)}%"],
+            )
+        if key == "name":
+            pattern = f"%{escape_like(argument)}%"
+            return "(s.name ILIKE %s OR s.reference ILIKE %s)", [pattern, pattern]
+        raise ValueError(f"Unknown term '{key}'")
+
+    def _parse_variable(self, reference):
+        if not reference:
+            raise ValueError("Missing variable reference")
+        params = [reference, reference]
+        if self._peek()[0] != "op":
+            return f"COALESCE({VARIABLE_VALUE_SQL}, '') <> ''", params
+        _token_type, operator = self._next()
+        value_type, value = self._next()
+        if value_type not in ("word", "string"):
+            raise ValueError(f"Missing value for 'var.{reference}'")
+        if operator == "==":
+            return f"{VARIABLE_VALUE_SQL} = %s", params + [value]
+        if operator == "!=":
+            return f"{VARIABLE_VALUE_SQL} IS DISTINCT FROM %s", params + [value]
+        return (
+            f"{VARIABLE_VALUE_SQL} ILIKE %s",
+            params + [f"%{escape_like(value)}%"],
+        )
+
+
+def compile_selector(selector):
+    """Compile selector into SQL query
+
+    Args:
+        selector (Text): selector expression
+
+    Raises:
+        ValueError: if selector is not valid
+
+    Returns:
+        tuple: (query, params). Query returns ids of active servers.
+    """
+    return SelectorCompiler(selector).compile()
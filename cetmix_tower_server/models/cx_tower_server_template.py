@@ -1,5 +1,6 @@
 # Copyright (C) 2024 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from copy import deepcopy
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
@@ -189,6 +190,26 @@ class CxTowerServerTemplate(models.Model):
         template = self.get_by_reference(template_reference)
         return template._create_new_server(server_name, **kwargs)
 
+    @api.model
+    def create_servers_from_template(self, template_reference, server_specs):
+        """Create several servers from specific server template at once.
+        Use it instead of calling `create_server_from_template` in a loop.
+
+        Args:
+            template_reference (Char): Server template reference
+            server_specs (list of dict): Values of the new servers.
+                Each dict contains the `name` key and any of the keyword
+                arguments supported by `create_server_from_template`, eg:
+                    [{'name': 'Server 1', 'ipv4': '10.0.0.1'},
+                     {'name': 'Server 2', 'ipv4': '10.0.0.2',
+                      'configuration_variables': {'branch': 'dev'}}]
+
+        Returns:
+            cx.tower.server: newly created server records
+        """
+        template = self.get_by_reference(template_reference)
+        return template._create_new_servers(server_specs)
+
     def _create_new_server(self, name, **kwargs):
         """Creates a new server from template
 
@@ -216,34 +237,54 @@ class CxTowerServerTemplate(models.Model):
         Returns:
             cx.tower.server: newly created server record
         """
-        # Retrieving the passed variables
-        configuration_variables = kwargs.get("configuration_variables", {})
+        return self._create_new_servers([dict(kwargs, name=name)])
+
+    def _create_new_servers(self, server_specs):
+        """Creates several servers from template at once.
+        Template values are read once, servers and their related records
+        are created in batch. Flight plan is executed on all servers
+        after they are created.
+
+        Args:
+            server_specs (list of dict): Values of the new servers.
+                Each dict contains the `name` key and any of the keyword
+                arguments supported by `_create_new_server`.
+
+        Returns:
+            cx.tower.server: newly created server records
+        """
+        self.ensure_one()
 
         # We validate mandatory variables
-        self._validate_required_variables(configuration_variables)
+        for server_spec in server_specs:
+            self._validate_required_variables(
+                server_spec.get("configuration_variables") or {}
+            )
 
+        template_values = self._read_server_template_values()
+        configuration_cache = self._prepare_configuration_cache(server_specs)
+        vals_list = []
+        for server_spec in server_specs:
+            vals_list += self._prepare_server_values(
+                template_values=template_values,
+                configuration_cache=configuration_cache,
+                server_template_id=self.id,  # pylint: disable=no-member
+                **server_spec,
+            )
         servers = (
             self.env["cx.tower.server"]
             .with_context(skip_ssh_settings_check=True)
-            .create(
-                self._prepare_server_values(
-                    name=name,
-                    server_template_id=self.id,
-                    **kwargs,  # pylint: disable=no-member
-                ),
-            )
+            .create(vals_list)
         )
 
-        for server in servers:
-            logs = server.server_log_ids.filtered(lambda rec: rec.log_type == "file")
+        logs = servers.server_log_ids.filtered(lambda rec: rec.log_type == "file")
+        if logs:
+            files = logs.file_template_id._create_files(servers)
             for log in logs:
-                log.file_id = log.file_template_id.create_file(
-                    server=server, raise_if_exists=False
-                ).id
+                log.file_id = files[(log.file_template_id.id, log.server_id.id)].id
 
-            flight_plan = server.server_template_id.flight_plan_id
-            if flight_plan:
-                flight_plan.execute(server)
+        if self.flight_plan_id:
+            self.flight_plan_id.execute(servers)
 
         return servers
 
@@ -265,7 +306,102 @@ class CxTowerServerTemplate(models.Model):
             "server_log_ids",
         ]
 
-    def _prepare_server_values(self, pick_all_template_variables=True, **kwargs):
+    def _read_server_template_values(self):
+        """Read values required to create new servers from the templates.
+        Related records of each One2many field are read at once
+        and converted into creation commands.
+
+        Returns:
+            list: A list of dictionaries with template values.
+        """
+        model_fields = self._fields
+
+        # define the magic fields that should not be copied
+        # (including ID and concurrency fields)
+        MAGIC_FIELDS = models.MAGIC_COLUMNS + [self.CONCURRENCY_CHECK_FIELD]
+
+        # read all values required to create a new server from the template
+        vals_list = self.read(self._get_fields_tower_server(), load=False)
+        if not vals_list:
+            return vals_list
+
+        for field in vals_list[0].keys():
+            if not isinstance(model_fields[field], fields.One2many):
+                continue
+            related_values = {
+                record_data["id"]: record_data
+                for record_data in self.mapped(field).read(load=False)
+            }
+            for values in vals_list:
+                new_records = []
+                # for each related record prepare its data for copying
+                for record_id in values[field]:
+                    record_data = {
+                        k: v
+                        for k, v in related_values[record_id].items()
+                        if k not in MAGIC_FIELDS
+                    }
+                    # set the inverse field (link back to the template)
+                    # to False to unlink from the original template
+                    record_data[model_fields[field].inverse_name] = False
+                    new_records.append((0, 0, record_data))
+                values[field] = new_records
+        return vals_list
+
+    @api.model
+    def _prepare_configuration_cache(self, server_specs):
+        """Get variables and variable options used in configuration
+        of the new servers. Records are searched at once,
+        missing variables are created.
+
+        Args:
+            server_specs (list of dict): Values of the new servers.
+                Check `_create_new_servers` for details.
+
+        Returns:
+            dict: {
+                "variables": {reference: cx.tower.variable()},
+                "options": {reference: cx.tower.variable.option()},
+            }
+        """
+        variable_references = set()
+        option_references = set()
+        for server_spec in server_specs:
+            variable_references.update(
+                (server_spec.get("configuration_variables") or {}).keys()
+            )
+            option_references.update(
+                (server_spec.get("configuration_variable_options") or {}).values()
+            )
+
+        options = self.env["cx.tower.variable.option"]
+        if option_references:
+            options = options.search([("reference", "in", list(option_references))])
+
+        variable_obj = self.env["cx.tower.variable"]
+        variables = variable_obj
+        if variable_references:
+            variables = variable_obj.search(
+                [("reference", "in", list(variable_references))]
+            )
+            missing_references = variable_references - set(
+                variables.mapped("reference")
+            )
+            variables |= variable_obj.create(
+                [{"name": reference} for reference in sorted(missing_references)]
+            )
+        return {
+            "variables": {variable.reference: variable for variable in variables},
+            "options": {option.reference: option for option in options},
+        }
+
+    def _prepare_server_values(
+        self,
+        pick_all_template_variables=True,
+        template_values=None,
+        configuration_cache=None,
+        **kwargs,
+    ):
         """
         Prepare the server values to create a new server based on
         the current template. It reads all fields from the template, copies them,
@@ -278,48 +414,28 @@ class CxTowerServerTemplate(models.Model):
                 being created considers existing variables from the template.
                 If enabled, the template variables will also be included in the server
                 variables. The default value is True.
+            template_values (list, optional): values returned by
+                `_read_server_template_values`. Read from template if not provided.
+            configuration_cache (dict, optional): values returned by
+                `_prepare_configuration_cache`. Computed if not provided.
             **kwargs: Additional values to update in the final server record.
 
         Returns:
             list: A list of dictionaries representing the values for the new server
                   records.
         """
-        model_fields = self._fields
-        field_o2m_type = fields.One2many
-
-        # define the magic fields that should not be copied
-        # (including ID and concurrency fields)
-        MAGIC_FIELDS = models.MAGIC_COLUMNS + [self.CONCURRENCY_CHECK_FIELD]
-
-        # read all values required to create a new server from the template
-        vals_list = self.read(self._get_fields_tower_server(), load=False)
+        # values are modified below, so shared template values are copied
+        vals_list = (
+            deepcopy(template_values)
+            if template_values is not None
+            else self._read_server_template_values()
+        )
 
         # prepare server config values from kwargs
         server_config_values = self._parse_server_config_values(kwargs)
 
         # process each template record
         for values in vals_list:
-            template = self.browse(values["id"])
-
-            for field in values.keys():
-                if isinstance(model_fields[field], field_o2m_type):
-                    # get related records for One2many field
-                    related_records = getattr(template, field)
-                    new_records = []
-                    # for each related record, read its data and prepare it for copying
-                    for record in related_records:
-                        record_data = {
-                            k: v
-                            for k, v in record.read(load=False)[0].items()
-                            if k not in MAGIC_FIELDS
-                        }
-                        # set the inverse field (link back to the template)
-                        # to False to unlink from the original template
-                        record_data[model_fields[field].inverse_name] = False
-                        new_records.append((0, 0, record_data))
-
-                    values[field] = new_records
-
             # Handle configuration variables if provided.
             configuration_variables = kwargs.pop("configuration_variables", None)
             configuration_variable_options = kwargs.pop(
@@ -330,11 +446,25 @@ class CxTowerServerTemplate(models.Model):
                 # Validate required variables
                 self._validate_required_variables(configuration_variables)
 
-                # Search for existing variable options.
+                if configuration_cache is None:
+                    configuration_cache = self._prepare_configuration_cache(
+                        [
+                            {
+                                "configuration_variables": configuration_variables,
+                                "configuration_variable_options": (
+                                    configuration_variable_options
+                                ),
+                            }
+                        ]
+                    )
+
+                # Get existing variable options.
                 option_references = list(configuration_variable_options.values())
-                existing_options = option_references and self.env[
-                    "cx.tower.variable.option"
-                ].search([("reference", "in", option_references)])
+                existing_options = [
+                    configuration_cache["options"][reference]
+                    for reference in option_references
+                    if reference in configuration_cache["options"]
+                ]
                 missing_options = list(
                     set(option_references)
                     - {option.reference for option in existing_options}
@@ -370,22 +500,12 @@ class CxTowerServerTemplate(models.Model):
                     option.variable_id.id: option for option in existing_options
                 }
 
-                variable_obj = self.env["cx.tower.variable"]
-                variable_references = list(configuration_variables.keys())
-
-                # Search for existing variables or create new ones if missing.
-                exist_variables = variable_obj.search(
-                    [("reference", "in", variable_references)]
-                )
-                missing_references = list(
-                    set(variable_references)
-                    - {variable.reference for variable in exist_variables}
-                )
-                variable_vals_list = [
-                    {"name": reference} for reference in missing_references
+                # Existing variables or new ones created for missing references.
+                all_variables = [
+                    configuration_cache["variables"][reference]
+                    for reference in configuration_variables
+                    if reference in configuration_cache["variables"]
                 ]
-                new_variables = variable_obj.create(variable_vals_list)
-                all_variables = exist_variables | new_variables
 
                 # Build a dictionary {variable: variable_value}.
                 configuration_variable_dict = {
@@ -57,3 +57,24 @@ class TowerVariable(models.Model):
             "context": context,
             "domain": [("variable_id", "=", self.id)],
         }
+
+    def _get_dependent_variables(self):
+        """Get variables along with the variables whose values use them.
+        Eg if value of 'url' is 'https://{{ domain }}' then 'url'
+        depends on 'domain'.
+
+        Returns:
+            cx.tower.variable: variables including the dependent ones
+        """
+        value_obj = self.env["cx.tower.variable.value"].with_context(active_test=False)
+        variables = self
+        new_variables = self
+        while new_variables:
+            new_variables = (
+                value_obj.search([("variable_ids", "in", new_variables.ids)]).mapped(
+                    "variable_id"
+                )
+                - variables
+            )
+            variables |= new_variables
+        return variables
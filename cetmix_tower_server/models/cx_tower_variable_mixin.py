@@ -42,7 +42,7 @@ class TowerVariableMixin(models.AbstractModel):
                 )  # set global values as defaults
                 for variable_reference in variable_references:
                     # Check if this is a system variable
-                    system_value = self._get_system_variable_value(variable_reference)
+                    system_value = rec._get_system_variable_value(variable_reference)
                     if system_value:
                         res_vars.update({variable_reference: system_value})
 
@@ -109,6 +109,26 @@ class TowerVariableValue(models.Model):
         ),
     ]
 
+    def init(self):
+        """
+        Create indexes used to select servers by variable values.
+        Check `cx_tower_server_selector` for details.
+        """
+        self._cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS cx_tower_variable_value_reference_server_index
+            ON cx_tower_variable_value (variable_reference, server_id)
+            WHERE server_id IS NOT NULL
+            """
+        )
+        self._cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS cx_tower_variable_value_reference_global_index
+            ON cx_tower_variable_value (variable_reference)
+            WHERE is_global
+            """
+        )
+
     @api.depends("option_id", "variable_id.option_ids")
     def _compute_value_char(self):
         """
@@ -189,6 +209,72 @@ class TowerVariableValue(models.Model):
                         )
                     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._recompute_file_render()
+        records._invalidate_plan_snapshots()
+        return records
+
+    def write(self, vals):
+        changed_fields = set(vals)
+        owner_changed = bool(changed_fields & self._get_owner_fields())
+        # Files and flight plans that used the value
+        # before it was moved must be updated too
+        if owner_changed:
+            self._recompute_file_render()
+            self._invalidate_plan_snapshots()
+        res = super().write(vals)
+        if owner_changed or changed_fields & {"value_char", "option_id", "active"}:
+            self._recompute_file_render()
+            self._invalidate_plan_snapshots()
+        return res
+
+    def unlink(self):
+        self._recompute_file_render()
+        self._invalidate_plan_snapshots()
+        return super().unlink()
+
+    def _recompute_file_render(self):
+        """
+        Mark files that use these values to be rendered again.
+        Only server and global values are used to render files.
+        """
+        values = self.filtered(lambda value: value.server_id or value.is_global)
+        if values:
+            self.env["cx.tower.file"]._recompute_render_for_variables(
+                values.mapped("variable_id"),
+                servers=None
+                if any(values.mapped("is_global"))
+                else values.mapped("server_id"),
+            )
+
+    def _invalidate_plan_snapshots(self):
+        """
+        Make running flight plans resolve these values again.
+        Only server and global values are stored in the snapshots.
+        """
+        values = self.filtered(lambda value: value.server_id or value.is_global)
+        if not values:
+            return
+        domain = [("is_running", "=", True), ("variable_snapshot", "!=", False)]
+        if not any(values.mapped("is_global")):
+            domain.append(("server_id", "in", values.mapped("server_id").ids))
+        references = values.mapped("variable_id.reference")
+        self.env["cx.tower.plan.log"].sudo().search(
+            domain
+        )._invalidate_variable_snapshot(references)
+
+    def _get_owner_fields(self):
+        """Fields that define where the value is used
+
+        Returns:
+            set: field names
+        """
+        return {"variable_id", "is_global"} | {
+            field_name for field_name, __ in self._used_in_models().values()
+        }
+
     def _used_in_models(self):
         """Returns information about models which use this mixin.
 
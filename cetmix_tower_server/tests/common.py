@@ -1,6 +1,7 @@
 # Copyright (C) 2022 Cetmix OÜ
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 import os
+import stat
 from unittest.mock import MagicMock, patch
 
 from odoo import _
@@ -261,6 +262,16 @@ class TestTowerCommon(TransactionCase):
             - Returns a `MagicMock` object to simulate file deletion behavior without
               actual execution.
 
+        5. `stat_files` method:
+            - Returns metadata of regular files with the same size as the content
+              returned by the `download_file` patch, a fixed modification time,
+              mode and owner.
+
+        6. `download_file_stream` and `upload_file_stream` methods:
+            - Write the content returned by the `download_file` patch
+              to the file object and return a `MagicMock` object for upload.
+              File size limit and progress callback are respected.
+
         The patches are applied immediately using `patch.object` and are added to
         `addCleanup` to ensure they are automatically stopped after the tests are
         executed.
@@ -327,6 +338,52 @@ class TestTowerCommon(TransactionCase):
         delete_file_patch.start()
         self.addCleanup(delete_file_patch.stop)
 
+        def ssh_stat_files(self, remote_paths, follow_symlinks=True):
+            return {
+                remote_path: MagicMock(
+                    st_size=len(ssh_download_file(self, remote_path)),
+                    st_mtime=1700000000,
+                    st_mode=stat.S_IFREG | 0o640,
+                    st_uid=1000,
+                    st_gid=1000,
+                )
+                for remote_path in remote_paths
+            }
+
+        stat_files_patch = patch.object(SSH, "stat_files", ssh_stat_files)
+        stat_files_patch.start()
+        self.addCleanup(stat_files_patch.stop)
+
+        def ssh_download_file_stream(
+            self, remote_path, file_obj, max_size=0, callback=None
+        ):
+            content = ssh_download_file(self, remote_path)
+            if max_size and len(content) > max_size:
+                raise ValidationError(_("File size exceeds the limit"))
+            file_obj.write(content)
+            if callback:
+                callback(len(content), len(content))
+            return len(content)
+
+        download_file_stream_patch = patch.object(
+            SSH, "download_file_stream", ssh_download_file_stream
+        )
+        download_file_stream_patch.start()
+        self.addCleanup(download_file_stream_patch.stop)
+
+        def ssh_upload_file_stream(
+            self, file_obj, remote_path, file_size=0, callback=None
+        ):
+            if callback:
+                callback(file_size, file_size)
+            return MagicMock()
+
+        upload_file_stream_patch = patch.object(
+            SSH, "upload_file_stream", ssh_upload_file_stream
+        )
+        upload_file_stream_patch.start()
+        self.addCleanup(upload_file_stream_patch.stop)
+
     def add_to_group(self, user, group_refs):
         """Add user to groups
 
@@ -2,6 +2,8 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 from unittest.mock import patch
 
+from odoo.exceptions import ValidationError
+
 from ..models.constants import SSH_CONNECTION_ERROR
 from .common import TestTowerCommon
 
@@ -93,6 +95,146 @@ class TestCetmixTower(TestTowerCommon):
         )
         self.assertEqual(value, server_value.value_char)
 
+    def test_server_set_get_variable_values(self):
+        """Test setting and getting values for several servers at once"""
+        server_2 = self.server_test_1.copy()
+        variable_meme = self.Variable.create(
+            {"name": "Meme Variable", "reference": "meme_variable"}
+        )
+        variable_doge = self.Variable.create(
+            {"name": "Doge Variable", "reference": "doge_variable"}
+        )
+        self.VariableValue.create(
+            [
+                {"variable_id": variable_doge.id, "value_char": "Global Doge"},
+                {
+                    "variable_id": variable_meme.id,
+                    "server_id": self.server_test_1.id,
+                    "value_char": "Old Meme",
+                },
+            ]
+        )
+
+        # -- 1 --
+        # Nothing is changed if any reference is not found
+        result = self.CetmixTower.server_set_variable_values(
+            {self.server_test_1.reference: {"no_such_variable": "Doge"}}
+        )
+        self.assertEqual(result["exit_code"], -1)
+        result = self.CetmixTower.server_set_variable_values(
+            {"no_such_server": {variable_meme.reference: "Doge"}}
+        )
+        self.assertEqual(result["exit_code"], -1)
+
+        # -- 2 --
+        # Values are created and updated in batch
+        variable_value_class = type(self.VariableValue)
+        with patch.object(
+            variable_value_class,
+            "create",
+            autospec=True,
+            side_effect=variable_value_class.create,
+        ) as create_mock:
+            result = self.CetmixTower.server_set_variable_values(
+                {
+                    self.server_test_1.reference: {variable_meme.reference: "Meme"},
+                    server_2.reference: {
+                        variable_meme.reference: "Meme",
+                        variable_doge.reference: "Server Doge",
+                    },
+                }
+            )
+        self.assertEqual(result["exit_code"], 0)
+        self.assertEqual(create_mock.call_count, 1)
+
+        # -- 3 --
+        # Values are read at once, global value is used as a fallback
+        values = self.CetmixTower.server_get_variable_values(
+            [self.server_test_1.reference, server_2.reference, "no_such_server"],
+            [variable_meme.reference, variable_doge.reference],
+        )
+        self.assertEqual(
+            values,
+            {
+                self.server_test_1.reference: {
+                    variable_meme.reference: "Meme",
+                    variable_doge.reference: "Global Doge",
+                },
+                server_2.reference: {
+                    variable_meme.reference: "Meme",
+                    variable_doge.reference: "Server Doge",
+                },
+                "no_such_server": {
+                    variable_meme.reference: None,
+                    variable_doge.reference: None,
+                },
+            },
+        )
+        values = self.CetmixTower.server_get_variable_values(
+            [self.server_test_1.reference],
+            [variable_doge.reference],
+            check_global=False,
+        )
+        self.assertEqual(
+            values, {self.server_test_1.reference: {variable_doge.reference: None}}
+        )
+
+    def test_server_search_by_selector(self):
+        """Test selecting servers using selector expression"""
+        server_2 = self.server_test_1.copy()
+        server_3 = self.server_test_1.copy()
+        servers = self.server_test_1 | server_2 | server_3
+        tag_prod = self.Tag.create({"name": "Prod", "reference": "prod"})
+        (self.server_test_1 | server_2).tag_ids = tag_prod
+        os_ubuntu = self.env["cx.tower.os"].create({"name": "Ubuntu 22.04"})
+        server_2.os_id = os_ubuntu
+        variable_version = self.Variable.create(
+            {"name": "Odoo Version", "reference": "odoo_version"}
+        )
+        self.VariableValue.create(
+            [
+                {"variable_id": variable_version.id, "value_char": "17.0"},
+                {
+                    "variable_id": variable_version.id,
+                    "server_id": self.server_test_1.id,
+                    "value_char": "16.0",
+                },
+            ]
+        )
+
+        def select(selector):
+            return self.CetmixTower.server_search_by_selector(selector) & servers
+
+        # -- 1 --
+        # Tags and operating systems
+        self.assertEqual(select("tag:prod"), self.server_test_1 | server_2)
+        self.assertEqual(select("not tag:prod"), server_3)
+        self.assertEqual(select("os:ubuntu"), server_2)
+        self.assertEqual(
+            select(f"os:{self.os_debian_10.reference} and tag:prod"),
+            self.server_test_1,
+        )
+
+        # -- 2 --
+        # Server value is used first, global value is used as a fallback
+        self.assertEqual(
+            select('tag:prod and var.odoo_version == "16.0"'), self.server_test_1
+        )
+        self.assertEqual(select("var.odoo_version == 17.0"), server_2 | server_3)
+        self.assertEqual(
+            select(
+                "var.odoo_version != '17.0' or (tag:prod and var.odoo_version ~ 17)"
+            ),
+            self.server_test_1 | server_2,
+        )
+        self.assertEqual(select("var.no_such_variable"), self.Server)
+
+        # -- 3 --
+        # Invalid selectors
+        for selector in ["", "tag:prod and", "(tag:prod", "unknown:value", "var."]:
+            with self.assertRaises(ValidationError, msg=selector):
+                self.CetmixTower.server_search_by_selector(selector)
+
     def test_server_check_ssh_connection(self):
         """
         Test SSH connection check with a mocked function that
@@ -122,3 +264,96 @@ class TestCetmixTower(TestTowerCommon):
                 SSH_CONNECTION_ERROR,
                 "SSH connection should timeout after maximum attempts.",
             )
+
+    def test_server_create_from_template_bulk(self):
+        """Test creating several servers from template at once"""
+
+        # Template with variables, file log and flight plan
+        file_template = self.FileTemplate.create(
+            {
+                "name": "Bulk Log Template",
+                "file_name": "bulk.log",
+                "server_dir": "/var/log",
+                "source": "server",
+            }
+        )
+        self.server_template_sample.write(
+            {
+                "flight_plan_id": self.plan_1.id,
+                "variable_value_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "variable_id": self.variable_version.id,
+                            "value_char": "template",
+                        },
+                    )
+                ],
+                "server_log_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "name": "Bulk Log",
+                            "log_type": "file",
+                            "file_template_id": file_template.id,
+                        },
+                    )
+                ],
+            }
+        )
+        server_specs = [
+            {
+                "name": f"Bulk Server {index}",
+                "ipv4": f"10.0.0.{index}",
+                "configuration_variables": {"bulk_branch": f"branch_{index}"},
+            }
+            for index in range(3)
+        ]
+
+        template_class = type(self.ServerTemplate)
+        with patch.object(
+            template_class,
+            "_read_server_template_values",
+            autospec=True,
+            side_effect=template_class._read_server_template_values,
+        ) as read_mock, patch.object(
+            type(self.Plan), "execute", autospec=True
+        ) as execute_mock:
+            servers = self.CetmixTower.server_create_from_template_bulk(
+                self.server_template_sample.reference, server_specs
+            )
+
+        # -- 1 --
+        # Template is read once, flight plan is executed once for all servers
+        self.assertEqual(read_mock.call_count, 1)
+        execute_mock.assert_called_once()
+        self.assertEqual(execute_mock.call_args.args[1], servers)
+
+        # -- 2 --
+        # Servers are created with their own values
+        self.assertEqual(servers.mapped("name"), [s["name"] for s in server_specs])
+        self.assertEqual(
+            servers.mapped("ip_v4_address"), ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+        )
+        bulk_variable = self.Variable.search([("reference", "=", "bulk_branch")])
+        self.assertEqual(len(bulk_variable), 1, "Variable must be created once")
+        for index, server in enumerate(servers):
+            self.assertEqual(
+                server.variable_value_ids.filtered(
+                    lambda value, variable=bulk_variable: value.variable_id == variable
+                ).value_char,
+                f"branch_{index}",
+            )
+            self.assertEqual(
+                server.variable_value_ids.filtered(
+                    lambda value: value.variable_id == self.variable_version
+                ).value_char,
+                "template",
+            )
+
+            # -- 3 --
+            # Log files are created for each server
+            self.assertEqual(server.server_log_ids.file_id.server_id, server)
+            self.assertEqual(server.server_log_ids.file_id.template_id, file_template)
@@ -911,6 +911,50 @@ COMMAND_RESULT = {
             command_result["error"], "Command error doesn't match expected one"
         )
 
+    def test_execute_command_commit_progress(self):
+        """Transaction is committed before remote execution
+        and after saving the result only if explicitly enabled.
+        Commit is never done in tests.
+        """
+        server_class = type(self.Server)
+        with patch.object(
+            server_class,
+            "_commit_progress",
+            autospec=True,
+            side_effect=server_class._commit_progress,
+        ) as commit_progress:
+            # Progress is not committed by default
+            self.server_test_1.execute_command(self.command_create_dir)
+            self.assertFalse(
+                commit_progress.call_args_list[0][0][0]._context.get(
+                    "cx_tower_commit_progress"
+                )
+            )
+
+            # Committed before execution and after saving the result
+            commit_progress.reset_mock()
+            self.server_test_1.with_context(
+                cx_tower_commit_progress=True
+            ).execute_command(self.command_create_dir)
+            self.assertEqual(commit_progress.call_count, 2)
+            self.assertTrue(
+                commit_progress.call_args_list[0][0][0]._context.get(
+                    "cx_tower_commit_progress"
+                )
+            )
+
+        # Never commit in tests
+        self.assertFalse(
+            self.server_test_1.with_context(
+                cx_tower_commit_progress=True
+            )._can_commit_progress()
+        )
+        log = self.CommandLog.search(
+            [("server_id", "=", self.server_test_1.id)], order="id desc", limit=1
+        )
+        self.assertFalse(log.is_running)
+        self.assertEqual(log.command_status, 0)
+
     # ---------------------
     # *********************
     #   Python commands
@@ -1,5 +1,9 @@
+from dateutil.relativedelta import relativedelta
+
+from odoo import SUPERUSER_ID, api, fields
 from odoo.exceptions import AccessError
 
+from ..models.constants import ANOTHER_COMMAND_RUNNING, COMMAND_INTERRUPTED
 from .common import TestTowerCommon
 
 
@@ -126,3 +130,153 @@ class TestTowerCommandlog(TestTowerCommon):
             test_command_log_1.name,
             "Command name should be same",
         )
+
+    def test_command_run_lock(self):
+        """Command is not executed while its run lock is held
+        by another database session
+        """
+        command = self.command_create_dir
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            server = env["cx.tower.server"].browse(self.server_test_1.id)
+            with server._run_lock("command", command.id) as locked:
+                self.assertTrue(locked, "Lock must be acquired")
+                self.assertTrue(
+                    self.server_test_1._is_run_locked("command", command.id),
+                    "Lock must be visible from other sessions",
+                )
+                self.server_test_1.execute_command(command)
+                log = self.CommandLog.search(
+                    [("server_id", "=", self.server_test_1.id)],
+                    order="id desc",
+                    limit=1,
+                )
+                self.assertEqual(log.command_status, ANOTHER_COMMAND_RUNNING)
+                self.assertFalse(log.is_running)
+
+        # Lock is released
+        self.assertFalse(self.server_test_1._is_run_locked("command", command.id))
+        self.server_test_1.execute_command(command)
+        log = self.CommandLog.search(
+            [("server_id", "=", self.server_test_1.id)], order="id desc", limit=1
+        )
+        self.assertEqual(log.command_status, 0)
+
+    def test_recover_stale_runs(self):
+        """Commands without a run lock are finished as interrupted"""
+        start_date = fields.Datetime.now() - relativedelta(hours=1)
+        stale_log = self.CommandLog.create(
+            {
+                "server_id": self.server_test_1.id,
+                "command_id": self.command_create_dir.id,
+                "is_running": True,
+                "start_date": start_date,
+            }
+        )
+        # Recently started command is not checked
+        recent_log = self.CommandLog.create(
+            {
+                "server_id": self.server_test_1.id,
+                "command_id": self.command_create_dir.id,
+                "is_running": True,
+                "start_date": fields.Datetime.now(),
+            }
+        )
+        # Command lock held by another run of the same command
+        # doesn't keep the log alive, only the log lock does
+        alive_log = self.CommandLog.create(
+            {
+                "server_id": self.server_test_1.id,
+                "command_id": self.command_create_dir.id,
+                "is_running": True,
+                "start_date": start_date,
+            }
+        )
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            server = env["cx.tower.server"].browse(self.server_test_1.id)
+            with server._run_lock(
+                "command", self.command_create_dir.id, shared=True
+            ), server._run_lock("command_log", alive_log.id):
+                self.assertEqual(self.CommandLog._recover_stale_runs(), stale_log)
+        self.assertTrue(alive_log.is_running)
+        self.assertFalse(stale_log.is_running)
+        self.assertEqual(stale_log.command_status, COMMAND_INTERRUPTED)
+        self.assertTrue(recent_log.is_running)
+
+    def test_run_lock_wait(self):
+        """Waiting run lock is reused by the thread that holds it"""
+        server = self.server_test_1
+        with server._run_lock("plan_lines", 1, wait=True) as locked:
+            self.assertTrue(locked)
+            with server._run_lock("plan_lines", 1, wait=True) as locked_again:
+                self.assertTrue(locked_again)
+            self.assertTrue(
+                server._is_run_locked("plan_lines", 1),
+                "Lock must be held until the outer block is left",
+            )
+        self.assertFalse(server._is_run_locked("plan_lines", 1))
+
+    def test_finish_releases_run_lock(self):
+        """Command run lock is released before the next command is triggered"""
+        log = self.CommandLog.start(
+            self.server_test_1.id,
+            self.command_create_dir.id,
+            fields.Datetime.now(),
+        )
+        with self.server_test_1._run_lock(
+            "command", self.command_create_dir.id, owner=log.id
+        ) as locked:
+            self.assertTrue(locked)
+            log.finish(fields.Datetime.now(), status=0)
+            self.assertFalse(
+                self.server_test_1._is_run_locked("command", self.command_create_dir.id)
+            )
+
+    def test_log_writer(self):
+        """Logs are written with plain SQL, computed values are set in Python"""
+        start_date = fields.Datetime.now() - relativedelta(seconds=5)
+        # Cache server logs to make sure they are updated
+        server_logs = self.server_test_1.command_log_ids
+        log = self.CommandLog.start(
+            self.server_test_1.id,
+            self.command_create_dir.id,
+            start_date,
+            label="Log writer",
+        )
+        self.assertNotIn(log, server_logs)
+        self.assertIn(log, self.server_test_1.command_log_ids)
+        self.assertTrue(log.active)
+        self.assertTrue(log.is_running)
+        self.assertEqual(log.label, "Log writer")
+        self.assertEqual(log.create_uid, self.env.user)
+        self.assertEqual(
+            log.name,
+            f"{self.server_test_1.name}: {self.command_create_dir.name}",
+        )
+        self.assertEqual(log.command_action, self.command_create_dir.action)
+        self.assertEqual(log.access_level, self.command_create_dir.access_level)
+
+        log.finish(start_date + relativedelta(seconds=3), 0, "Done")
+        self.assertFalse(log.is_running)
+        self.assertEqual(log.command_status, 0)
+        self.assertEqual(log.command_response, "Done")
+        self.assertEqual(log.duration, 3)
+
+        # Several records are created and updated with a single query
+        logs = self.CommandLog._log_create(
+            [
+                {
+                    "server_id": self.server_test_1.id,
+                    "command_id": command.id,
+                    "start_date": start_date,
+                }
+                for command in (self.command_create_dir, self.command_list_dir)
+            ]
+        )
+        self.assertEqual(len(logs), 2)
+        self.assertEqual(
+            logs.mapped("command_id"), self.command_create_dir | self.command_list_dir
+        )
+        logs._log_write({"finish_date": start_date + relativedelta(seconds=2)})
+        self.assertEqual(logs.mapped("duration"), [2, 2])
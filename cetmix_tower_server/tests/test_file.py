@@ -1,6 +1,16 @@
+import hashlib
+import io
+import stat
+import tarfile
+from base64 import b64encode
+from unittest.mock import MagicMock, patch
+
 from odoo import exceptions
 from odoo.exceptions import AccessError
 
+from odoo.addons.cetmix_tower_server.models import cx_tower_file_watcher
+from odoo.addons.cetmix_tower_server.models.cx_tower_server import SSH
+
 from .common import TestTowerCommon
 
 
@@ -70,6 +80,521 @@ class TestTowerFile(TestTowerCommon):
             ),
         )
 
+    def test_download_file_unchanged(self):
+        """
+        Files that were not modified on server are not downloaded again
+        """
+        self.file_2.action_pull_from_server()
+        self.assertEqual(self.file_2.code, "ok")
+        self.assertEqual(self.file_2.server_file_size, 2)
+        self.assertEqual(self.file_2.server_file_mtime, 1700000000)
+        self.assertTrue(self.file_2.server_file_hash)
+
+        # Modify code to detect if the file is downloaded again
+        self.file_2.code = "not ok"
+        self.file_2.action_pull_from_server()
+        self.assertEqual(
+            self.file_2.code, "not ok", msg="Unchanged file must not be downloaded"
+        )
+
+        # Force download
+        self.file_2.with_context(force_file_download=True).action_pull_from_server()
+        self.assertEqual(self.file_2.code, "ok")
+        self.assertEqual(self.file_2.server_file_mtime, 1700000000)
+
+        # Metadata is reset when file location is changed
+        self.file_2.server_dir = "/var/log"
+        self.assertFalse(self.file_2.server_file_hash)
+        self.assertEqual(self.file_2.server_file_mtime, 0)
+
+    def test_download_binary_file_stream(self):
+        """
+        Binary files are streamed to the filestore
+        """
+        # Transfer progress is saved using a separate cursor
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self.file_2.write({"name": "binary.zip", "file_type": "binary"})
+        self.file_2.action_pull_from_server()
+        self.assertEqual(self.file_2.server_response, "ok")
+        self.assertEqual(self.file_2.file, b64encode(b"ok\x00"))
+        self.assertEqual(self.file_2.transfer_progress, 100.0)
+        attachment = self.file_2.blob_id._get_attachment()
+        self.assertEqual(attachment.file_size, 3)
+        self.assertEqual(attachment.checksum, hashlib.sha1(b"ok\x00").hexdigest())
+
+        # File size limit
+        self.file_2.write({"name": "other.zip", "max_file_size": 1})
+        self.file_2.with_context(force_file_download=True).download()
+        self.assertEqual(self.file_2.server_response, "ok")
+        self.file_2.max_file_size = 0
+        with patch.object(
+            type(self.file_2), "_get_max_file_size", return_value=2
+        ), self.assertRaises(exceptions.ValidationError):
+            self.file_2.download(raise_error=True)
+
+    def test_upload_binary_file_stream(self):
+        """
+        Binary files are streamed from the filestore
+        """
+        # Transfer progress is saved using a separate cursor
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        file = self.File.create(
+            {
+                "name": "binary.zip",
+                "source": "tower",
+                "file_type": "binary",
+                "file": b64encode(b"binary content"),
+                "server_id": self.server_test_1.id,
+                "server_dir": "/var/tmp",
+            }
+        )
+        file.upload(raise_error=True)
+        self.assertEqual(file.server_response, "ok")
+        self.assertEqual(file.transfer_progress, 100.0)
+        transfer = self.env["cx.tower.file.transfer"].search(
+            [("file_id", "=", file.id)]
+        )
+        self.assertEqual(transfer.progress, 100.0)
+
+        with patch.object(
+            type(file), "_get_max_file_size", return_value=1
+        ), self.assertRaises(exceptions.ValidationError):
+            file.upload(raise_error=True)
+
+        # Transfer progress is removed along with the file
+        file.unlink()
+        self.assertFalse(transfer.exists())
+
+    def test_file_content_deduplication(self):
+        """
+        Files with the same binary content share a single content record
+        """
+        vals = {
+            "source": "tower",
+            "file_type": "binary",
+            "file": b64encode(b"binary content"),
+            "server_dir": "/var/tmp",
+            "server_id": self.server_test_1.id,
+        }
+        file_1 = self.File.create(dict(vals, name="binary_1.zip"))
+        file_2 = self.File.create(dict(vals, name="binary_2.zip"))
+        self.assertTrue(file_1.blob_id)
+        self.assertEqual(file_1.blob_id, file_2.blob_id)
+        self.assertEqual(
+            file_1.blob_id.checksum, hashlib.sha256(b"binary content").hexdigest()
+        )
+        self.assertEqual(file_2.file, b64encode(b"binary content"))
+
+        # Modified file gets its own content
+        blob = file_1.blob_id
+        file_2.file = b64encode(b"other content")
+        self.assertNotEqual(file_2.blob_id, blob)
+        self.assertEqual(file_1.blob_id, blob)
+
+        # Unreferenced content is removed
+        file_1.unlink()
+        self.env.cr.execute(
+            "UPDATE cx_tower_file_blob SET create_date = create_date - "
+            "interval '2 hours'"
+        )
+        self.env["cx.tower.file.blob"].invalidate_cache()
+        self.env["cx.tower.file.blob"]._gc_unreferenced_blobs()
+        self.assertFalse(blob.exists())
+        self.assertTrue(file_2.blob_id.exists())
+
+    def test_push_template_to_servers(self):
+        """
+        Template is rendered once per unique variable values
+        and pushed to all servers
+        """
+        servers = self.server_test_1
+        for number in (2, 3):
+            servers |= self.Server.create(
+                {
+                    "name": f"Test {number}",
+                    "ip_v4_address": f"10.0.0.{number}",
+                    "ssh_username": "admin",
+                    "ssh_password": "password",
+                    "ssh_auth_mode": "p",
+                }
+            )
+        for server, version in zip(servers, ("16.0", "16.0", "17.0")):
+            self.VariableValue.create(
+                {
+                    "variable_id": self.variable_version.id,
+                    "server_id": server.id,
+                    "value_char": version,
+                }
+            )
+        template = self.FileTemplate.create(
+            {
+                "name": "Nginx",
+                "file_name": "nginx.conf",
+                "server_dir": "/etc/nginx",
+                "code": "version {{ test_version }}",
+            }
+        )
+        uploads = {}
+
+        def upload_file(this, file, remote_path):
+            uploads[this.host] = (remote_path, file.getvalue())
+
+        template_class = type(template)
+        with patch.object(SSH, "upload_file", upload_file), patch.object(
+            template_class,
+            "render_code_custom",
+            autospec=True,
+            side_effect=template_class.render_code_custom,
+        ) as render_mock:
+            responses = template.push_to_servers(servers)
+
+        self.assertEqual(responses, {server.id: "ok" for server in servers})
+        self.assertEqual(
+            uploads,
+            {
+                "localhost": ("/etc/nginx/nginx.conf", b"version 16.0"),
+                "10.0.0.2": ("/etc/nginx/nginx.conf", b"version 16.0"),
+                "10.0.0.3": ("/etc/nginx/nginx.conf", b"version 17.0"),
+            },
+        )
+        # Directory, name and content are rendered once for each unique output
+        self.assertEqual(render_mock.call_count, 6)
+        self.assertEqual(len(template.file_ids), 3)
+        self.assertEqual(set(template.file_ids.mapped("server_response")), {"ok"})
+
+        # Existing files are reused
+        template.push_to_servers(servers)
+        self.assertEqual(len(template.file_ids), 3)
+
+    def test_rendered_values_recompute(self):
+        """
+        Rendered values are stored and rendered again only
+        when variable values used in the file are modified
+        """
+        server_2 = self.Server.create(
+            {
+                "name": "Test 2",
+                "ip_v4_address": "10.0.0.2",
+                "ssh_username": "admin",
+                "ssh_password": "password",
+                "ssh_auth_mode": "p",
+            }
+        )
+        value_1, value_2 = self.VariableValue.create(
+            [
+                {
+                    "variable_id": self.variable_version.id,
+                    "server_id": server.id,
+                    "value_char": "16.0",
+                }
+                for server in (self.server_test_1, server_2)
+            ]
+        )
+        self.VariableValue.create(
+            {
+                "variable_id": self.variable_url.id,
+                "server_id": server_2.id,
+                "value_char": "odoo-{{ test_version }}",
+            }
+        )
+        file_1, file_2, file_3 = self.File.create(
+            [
+                {
+                    "name": "version.txt",
+                    "source": "tower",
+                    "server_id": server.id,
+                    "server_dir": "/opt/{{ test_version }}",
+                    "code": code,
+                }
+                for server, code in (
+                    (self.server_test_1, "version {{ test_version }}"),
+                    (server_2, "version {{ test_version }}"),
+                    (server_2, "url {{ test_url }}"),
+                )
+            ]
+        )
+        self.assertEqual(file_1.rendered_code, "version 16.0")
+        self.assertEqual(file_1.full_server_path, "/opt/16.0/version.txt")
+        self.assertEqual(file_3.rendered_code, "url odoo-16.0")
+        self.assertFalse(file_1.render_is_dynamic)
+        file_2_hash = file_2.render_hash
+
+        file_class = type(self.File)
+        with patch.object(
+            file_class,
+            "render_code_custom",
+            autospec=True,
+            side_effect=file_class.render_code_custom,
+        ) as render_mock:
+            value_1.value_char = "17.0"
+            self.assertEqual(file_1.rendered_code, "version 17.0")
+            self.assertEqual(file_1.full_server_path, "/opt/17.0/version.txt")
+            self.assertEqual(file_2.rendered_code, "version 16.0")
+            # Name, directory and code of a single file are rendered
+            self.assertEqual(render_mock.call_count, 3)
+        self.assertEqual(file_2.render_hash, file_2_hash)
+
+        # Values that use the modified variable are considered too
+        value_2.value_char = "18.0"
+        self.assertEqual(file_2.rendered_code, "version 18.0")
+        self.assertEqual(file_3.rendered_code, "url odoo-18.0")
+
+    def test_auto_sync_after_commit(self):
+        """
+        Files are synced once after the transaction is committed.
+        Sync errors are saved without reverting the changes.
+        """
+        # Files are synced using a separate cursor
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        file_class = type(self.File)
+        with patch.object(file_class, "upload_bulk", autospec=True) as upload_mock:
+            files = self.File.create(
+                [
+                    {
+                        "name": f"auto_{number}.txt",
+                        "source": "tower",
+                        "auto_sync": True,
+                        "server_id": self.server_test_1.id,
+                        "server_dir": "/var/tmp",
+                        "code": "version 1",
+                    }
+                    for number in (1, 2)
+                ]
+            )
+            files.write({"code": "version 2"})
+            files[0].code = "version 3"
+            upload_mock.assert_not_called()
+
+            self.File.flush()
+            self.env.cr.postcommit.run()
+        upload_mock.assert_called_once()
+        self.assertEqual(upload_mock.call_args[0][0].ids, files.ids)
+
+        with patch.object(
+            file_class, "upload_bulk", side_effect=Exception("Connection lost")
+        ):
+            files.write({"code": "version 4"})
+            self.File.flush()
+            self.env.cr.postcommit.run()
+        files.invalidate_cache()
+        self.assertEqual(set(files.mapped("code")), {"version 4"})
+        self.assertIn("Connection lost", files[0].server_response)
+
+    def test_upload_bulk(self):
+        """
+        Files are uploaded in a single archive per server
+        """
+        file_3 = self.File.create(
+            {
+                "name": "other.txt",
+                "source": "tower",
+                "code": "Other",
+                "server_id": self.server_test_1.id,
+                "server_dir": "/var/tmp/sub",
+            }
+        )
+        archives = []
+        modes = {}
+
+        def upload_archive(this, remote_dir, fill_archive):
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode="w|gz") as tar:
+                fill_archive(tar)
+            archive.seek(0)
+            with tarfile.open(fileobj=archive, mode="r:gz") as tar:
+                contents = {}
+                for member in tar:
+                    contents[member.name] = tar.extractfile(member).read()
+                    modes[member.name] = (member.mode, member.uid, member.gid)
+            archives.append((remote_dir, contents))
+            return 0, list(contents), []
+
+        with patch.object(SSH, "upload_archive", upload_archive):
+            (self.file | file_3).upload_bulk(raise_error=True)
+
+        self.assertEqual(
+            archives,
+            [
+                (
+                    "/var/tmp",
+                    {"test.txt": b"Hello, world!", "sub/other.txt": b"Other"},
+                )
+            ],
+            msg="All files must be sent in a single archive",
+        )
+        self.assertEqual(self.file.server_response, "ok")
+        self.assertEqual(file_3.server_response, "ok")
+        self.assertEqual(
+            modes["test.txt"],
+            (0o640, 1000, 1000),
+            msg="Existing files must keep their mode and owner",
+        )
+
+        # Symlinks are not replaced with regular files
+        def stat_files(this, remote_paths, follow_symlinks=True):
+            return {
+                remote_path: MagicMock(st_mode=stat.S_IFLNK | 0o777)
+                if remote_path.endswith("other.txt")
+                else None
+                for remote_path in remote_paths
+            }
+
+        archives.clear()
+        modes.clear()
+        with patch.object(SSH, "upload_archive", upload_archive), patch.object(
+            SSH, "stat_files", stat_files
+        ), patch.object(SSH, "upload_file", autospec=True) as upload_file:
+            (self.file | file_3).upload_bulk(raise_error=True)
+        self.assertEqual(archives, [("/var/tmp", {"test.txt": b"Hello, world!"})])
+        self.assertEqual(modes["test.txt"][0], 0o644, msg="New files use default mode")
+        upload_file.assert_called_once()
+        self.assertEqual(upload_file.call_args[0][2], "/var/tmp/sub/other.txt")
+        self.assertEqual(file_3.server_response, "ok")
+
+    def test_download_bulk(self):
+        """
+        Files are downloaded in a single archive per server
+        """
+        file_3 = self.File.create(
+            {
+                "name": "missing.txt",
+                "source": "server",
+                "server_id": self.server_test_1.id,
+                "server_dir": "/var/tmp",
+            }
+        )
+
+        def download_archive(this, remote_dir, paths, process_member):
+            self.assertEqual(remote_dir, "/var/tmp")
+            self.assertEqual(paths, ["missing.txt", "test.txt"])
+            info = tarfile.TarInfo("test.txt")
+            info.size = 4
+            info.mtime = 1700000000
+            process_member(info, io.BytesIO(b"bulk"))
+            return 2, ["tar: missing.txt: Cannot stat: No such file or directory\n"]
+
+        with patch.object(SSH, "download_archive", download_archive):
+            (self.file_2 | file_3).download_bulk()
+
+        self.assertEqual(self.file_2.server_response, "ok")
+        self.assertEqual(self.file_2.code, "bulk")
+        self.assertEqual(self.file_2.server_file_size, 4)
+        self.assertEqual(self.file_2.server_file_mtime, 1700000000)
+        self.assertIn("missing.txt", file_3.server_response)
+        self.assertFalse(file_3.code)
+
+        # Source must match the action
+        with self.assertRaises(exceptions.UserError):
+            self.file.download_bulk(raise_error=True)
+
+    def test_auto_pull_files_watch_mode(self):
+        """
+        Watched files are not pulled by the polling cron
+        """
+        self.file_2.write(
+            {
+                "auto_sync": True,
+                "auto_sync_interval": "10-minutes",
+                "auto_sync_mode": "watch",
+            }
+        )
+        self.File._run_auto_pull_files()
+        self.assertFalse(self.file_2.code, msg="Watched file must not be polled")
+
+        # Only files reported as changed are pulled
+        self.File._pull_watched_files(self.server_test_1.id, {"/var/tmp/other.txt"})
+        self.assertFalse(self.file_2.code)
+        self.File._pull_watched_files(self.server_test_1.id, {"/var/tmp/test.txt"})
+        self.assertEqual(self.file_2.code, "ok")
+
+    def test_run_file_watchers(self):
+        """
+        Watchers are started once per server and capped per worker
+        """
+        self.file_2.write(
+            {
+                "auto_sync": True,
+                "auto_sync_interval": "10-minutes",
+                "auto_sync_mode": "watch",
+            }
+        )
+        dbname = self.env.cr.dbname
+        self.addCleanup(cx_tower_file_watcher.stop_watchers, dbname)
+        with patch.object(cx_tower_file_watcher.FileWatcher, "start"), patch.object(
+            cx_tower_file_watcher.FileWatcher, "is_alive", return_value=True
+        ):
+            self.File._run_file_watchers()
+            watcher = cx_tower_file_watcher._watchers.get(
+                (dbname, self.server_test_1.id)
+            )
+            self.assertTrue(watcher, msg="Watcher must be started for the server")
+            self.assertEqual(watcher.paths, ("/var/tmp/test.txt",))
+            self.assertFalse(self.file_2.code)
+
+            # Running watcher is kept
+            self.File._run_file_watchers()
+            self.assertIs(
+                cx_tower_file_watcher._watchers[(dbname, self.server_test_1.id)],
+                watcher,
+            )
+
+            # Server watched by another worker is skipped
+            cx_tower_file_watcher.stop_watchers(dbname)
+            with self.registry.cursor() as cr:
+                cr.execute(
+                    "SELECT pg_advisory_lock(hashtext(%s), %s)",
+                    (cx_tower_file_watcher.WATCHER_LOCK_NAME, self.server_test_1.id),
+                )
+                self.File._run_file_watchers()
+                cr.execute("SELECT pg_advisory_unlock_all()")
+            self.assertNotIn(
+                (dbname, self.server_test_1.id), cx_tower_file_watcher._watchers
+            )
+            self.assertFalse(self.file_2.code, msg="File must not be polled")
+
+            # Files are polled if watcher limit is reached
+            cx_tower_file_watcher.stop_watchers(dbname)
+            self.env["ir.config_parameter"].sudo().set_param(
+                "cetmix_tower_server.file_watcher_limit", 0
+            )
+            self.File._run_file_watchers()
+            self.assertNotIn(
+                (dbname, self.server_test_1.id), cx_tower_file_watcher._watchers
+            )
+            self.assertEqual(self.file_2.code, "ok")
+
+    def test_file_watcher_parse_line(self):
+        """
+        Changed files are detected from the watch command output
+        """
+        watcher = cx_tower_file_watcher.FileWatcher(
+            "test", 1, ("/var/tmp/test.txt", "/etc/my file.conf")
+        )
+        command = cx_tower_file_watcher.get_watch_command(watcher.paths)
+        self.assertIn("inotifywait", command)
+        self.assertIn("'/etc/my file.conf'", command)
+        self.assertIn("/var/tmp/", command)
+
+        # inotify events
+        self.assertEqual(
+            watcher._parse_line("E /var/tmp/test.txt"), {"/var/tmp/test.txt"}
+        )
+        self.assertFalse(watcher._parse_line("E /var/tmp/other.txt"))
+
+        # 'stat' fallback reports only files with new size or mtime
+        self.assertEqual(
+            watcher._parse_line("S 1700000000 10 /etc/my file.conf"),
+            {"/etc/my file.conf"},
+        )
+        self.assertFalse(watcher._parse_line("S 1700000000 10 /etc/my file.conf"))
+        self.assertEqual(
+            watcher._parse_line("S 1700000001 10 /etc/my file.conf"),
+            {"/etc/my file.conf"},
+        )
+
     def test_get_current_server_code(self):
         """
         Download file from server to tower
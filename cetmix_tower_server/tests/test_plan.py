@@ -2,9 +2,12 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 from unittest.mock import patch
 
+from dateutil.relativedelta import relativedelta
+
 from odoo import _, fields
-from odoo.exceptions import AccessError, ValidationError
+from odoo.exceptions import AccessError, UserError, ValidationError
 
+from ..models.constants import PLAN_INTERRUPTED
 from .common import TestTowerCommon
 
 
@@ -301,6 +304,380 @@ class TestTowerPlan(TestTowerCommon):
             "Path in command log must be the same as in the flight plan line",
         )
 
+    def test_plan_line_retry_and_resume(self):
+        """Failed line is retried and the plan is resumed from it"""
+        command_fail = self.Command.create(
+            {"name": "Unstable command", "action": "ssh_command", "code": "fail"}
+        )
+        plan = self.Plan.create(
+            {
+                "name": "Resumable plan",
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "sequence": 1,
+                            "command_id": self.command_create_dir.id,
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "sequence": 2,
+                            "command_id": command_fail.id,
+                            "retry_count": 2,
+                            "retry_delay": 0,
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "sequence": 3,
+                            "command_id": self.command_create_dir.id,
+                        },
+                    ),
+                ],
+            }
+        )
+        line_1, line_2, line_3 = plan.line_ids
+
+        # Line is run 3 times and plan exits with the command exit code
+        plan._execute_single(self.server_test_1)
+        plan_log = self.PlanLog.search([("plan_id", "=", plan.id)])
+        self.assertEqual(plan_log.plan_status, -1)
+        self.assertEqual(plan_log.line_attempt, 2)
+        self.assertEqual(plan_log.plan_line_executed_id, line_2)
+        command_logs = plan_log.command_log_ids
+        self.assertEqual(
+            len(command_logs.filtered(lambda log: log.command_id == command_fail)), 3
+        )
+
+        # Resume from the failed line. Completed lines are not run again.
+        command_fail.code = "echo ok"
+        plan_log.action_resume()
+        self.assertFalse(plan_log.is_running)
+        self.assertEqual(plan_log.plan_status, 0)
+        self.assertEqual(plan_log.plan_line_executed_id, line_3)
+        command_logs = plan_log.command_log_ids
+        self.assertEqual(
+            len(command_logs.filtered(lambda log: log.command_id == command_fail)), 4
+        )
+        self.assertEqual(
+            len(command_logs.filtered(lambda log: log.command_id == line_1.command_id)),
+            2,
+            "First line must not be run again",
+        )
+
+        # Successful plan cannot be resumed
+        with self.assertRaises(UserError):
+            plan_log.action_resume()
+
+    def test_plan_line_delayed_retry(self):
+        """Delayed retry is run by the cron instead of blocking the worker"""
+        command_fail = self.Command.create(
+            {"name": "Unstable command", "action": "ssh_command", "code": "fail"}
+        )
+        plan = self.Plan.create(
+            {
+                "name": "Delayed retry plan",
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "command_id": command_fail.id,
+                            "retry_count": 1,
+                            "retry_delay": 30,
+                        },
+                    ),
+                ],
+            }
+        )
+        line = plan.line_ids
+
+        # Plan waits for the retry
+        plan._execute_single(self.server_test_1)
+        plan_log = self.PlanLog.search([("plan_id", "=", plan.id)])
+        self.assertTrue(plan_log.is_running)
+        self.assertEqual(list(plan_log._get_retry_schedule()), [line.id])
+        self.assertFalse(plan_log._is_interrupted())
+
+        # Line is not run before the delay is over
+        self.PlanLog._run_scheduled_retries()
+        self.assertEqual(len(plan_log.command_log_ids), 1)
+
+        command_fail.code = "echo ok"
+        plan_log._set_retry_schedule(
+            {line.id: fields.Datetime.now() - relativedelta(minutes=1)}
+        )
+        self.PlanLog._run_scheduled_retries()
+        self.assertFalse(plan_log.is_running)
+        self.assertEqual(plan_log.plan_status, 0)
+        self.assertFalse(plan_log.retry_schedule)
+        self.assertEqual(len(plan_log.command_log_ids), 2)
+
+    def test_plan_with_line_dependencies(self):
+        """Lines are executed once their dependencies are finished"""
+        command_fail = self.Command.create(
+            {"name": "Failing command", "action": "ssh_command", "code": "fail"}
+        )
+        plan = self.Plan.create(
+            {
+                "name": "Parallel plan",
+                "max_parallel_lines": 2,
+                "line_ids": [
+                    (0, 0, {"sequence": 1, "command_id": self.command_create_dir.id}),
+                    (0, 0, {"sequence": 2, "command_id": self.command_list_dir.id}),
+                    (0, 0, {"sequence": 3, "command_id": self.command_create_dir.id}),
+                ],
+            }
+        )
+        line_1, line_2, line_3 = plan.line_ids
+        line_3.dependency_ids = line_1 | line_2
+        self.assertTrue(plan._is_dag())
+
+        plan._execute_single(self.server_test_1)
+        plan_log = self.PlanLog.search([("plan_id", "=", plan.id)])
+        self.assertEqual(plan_log.plan_status, 0)
+        self.assertFalse(plan_log.is_running)
+        command_logs = plan_log.command_log_ids.sorted("id")
+        self.assertEqual(command_logs.mapped("plan_line_id").ids, plan.line_ids.ids)
+
+        # Failed line stops the plan, dependent line is not executed
+        line_2.command_id = command_fail
+        plan._execute_single(self.server_test_1)
+        plan_log = self.PlanLog.search([("plan_id", "=", plan.id)], limit=1)
+        self.assertEqual(plan_log.plan_status, -1)
+        self.assertNotIn(line_3, plan_log.command_log_ids.mapped("plan_line_id"))
+
+        # Resume runs the failed line and its dependent line only
+        line_2.command_id = self.command_list_dir
+        plan_log.action_resume()
+        self.assertEqual(plan_log.plan_status, 0)
+        self.assertEqual(len(plan_log.command_log_ids), 4)
+        self.assertEqual(plan_log.command_log_ids.mapped("plan_line_id"), plan.line_ids)
+
+        # Progress commit flag of the server is kept by the started lines
+        server_class = type(self.Server)
+        with patch.object(
+            server_class,
+            "_commit_progress",
+            autospec=True,
+            side_effect=server_class._commit_progress,
+        ) as commit_progress:
+            plan._execute_single(
+                self.server_test_1.with_context(cx_tower_commit_progress=True)
+            )
+        self.assertTrue(commit_progress.called)
+        self.assertTrue(
+            all(
+                call[0][0]._context.get("cx_tower_commit_progress")
+                for call in commit_progress.call_args_list
+            )
+        )
+
+        # Dependencies are copied with the plan
+        plan_copy = plan.copy()
+        self.assertEqual(plan_copy.line_ids[2].dependency_ids, plan_copy.line_ids[:2])
+
+        # Cycles are not allowed
+        with self.assertRaises(ValidationError):
+            line_1.dependency_ids = line_3
+
+    def test_plan_variable_snapshot(self):
+        """Variable values are resolved once per flight plan run.
+        Values updated by line actions are resolved again.
+        """
+        self.VariableValue.create(
+            {
+                "variable_id": self.variable_version.id,
+                "value_char": "14.0",
+                "server_id": self.server_test_1.id,
+            }
+        )
+        self.VariableValue.create(
+            {
+                "variable_id": self.variable_version.id,
+                "value_char": "16.0",
+                "plan_line_action_id": self.plan_line_1_action_1.id,
+            }
+        )
+        self.plan_line_1.condition = "{{ test_version }} != '15.0'"
+        self.plan_line_2.condition = "{{ test_version }} == '16.0'"
+        server_class = type(self.Server)
+        with patch.object(
+            server_class,
+            "get_variable_values",
+            autospec=True,
+            side_effect=server_class.get_variable_values,
+        ) as get_variable_values:
+            self.plan_1._execute_single(self.server_test_1)
+        plan_log = self.PlanLog.search([("plan_id", "=", self.plan_1.id)])
+
+        # Line condition uses the value updated by the action of line #1
+        self.assertEqual(len(plan_log.command_log_ids), 2)
+        self.assertFalse(plan_log.command_log_ids.filtered("is_skipped"))
+        snapshot = plan_log._get_variable_snapshot()
+        self.assertEqual(snapshot["values"]["test_version"], "16.0")
+        self.assertNotIn("tower", snapshot["values"])
+
+        # Value is resolved when the snapshot is created
+        # and once again after it is updated by the action
+        version_calls = [
+            call
+            for call in get_variable_values.call_args_list
+            if "test_version" in call[0][1]
+        ]
+        self.assertEqual(len(version_calls), 2)
+
+    def test_plan_variable_snapshot_invalidation(self):
+        """Running plans resolve values updated outside of the plan again"""
+        server_value = self.VariableValue.create(
+            {
+                "variable_id": self.variable_version.id,
+                "value_char": "14.0",
+                "server_id": self.server_test_1.id,
+            }
+        )
+        self.plan_line_1.condition = "{{ test_version }} != '15.0'"
+        plan_log = self.PlanLog.create(
+            {
+                "server_id": self.server_test_1.id,
+                "plan_id": self.plan_1.id,
+                "is_running": True,
+            }
+        )
+        plan_log._init_variable_snapshot()
+        self.assertEqual(
+            plan_log._get_variable_snapshot()["values"]["test_version"], "14.0"
+        )
+
+        server_value.value_char = "16.0"
+        self.assertNotIn("test_version", plan_log._get_variable_snapshot()["values"])
+        self.assertEqual(
+            plan_log._get_variable_values(["test_version"])["test_version"], "16.0"
+        )
+
+        # Snapshots are not touched if the value is not changed
+        value_class = type(self.VariableValue)
+        with patch.object(
+            value_class, "_invalidate_plan_snapshots", autospec=True
+        ) as invalidate_plan_snapshots:
+            server_value.required = True
+            invalidate_plan_snapshots.assert_not_called()
+            server_value.value_char = "17.0"
+            invalidate_plan_snapshots.assert_called()
+
+    def test_plan_artifact(self):
+        """Compiled plan is reused until the plan structure is modified"""
+        command = self.Command.create(
+            {
+                "name": "Command with secret",
+                "code": "cd {{ test_path_ }} && echo #!cxtower.secret.TEST_TOKEN!#",
+            }
+        )
+        plan = self.Plan.create(
+            {
+                "name": "Compiled plan",
+                "line_ids": [
+                    (0, 0, {"sequence": 1, "command_id": command.id}),
+                    (0, 0, {"sequence": 2, "command_id": self.command_list_dir.id}),
+                ],
+            }
+        )
+        line_1, line_2 = plan.line_ids
+        artifact = plan._get_artifact()
+        self.assertIs(plan._get_artifact(), artifact)
+        self.assertEqual([line.id for line in artifact.lines], plan.line_ids.ids)
+        self.assertEqual(artifact.lines[0].next_line_id, line_2.id)
+        self.assertIsNone(artifact.lines[1].next_line_id)
+        self.assertEqual(artifact.lines[1].path, self.command_list_dir.path)
+        self.assertIn("test_path_", artifact.variable_references)
+        self.assertEqual(artifact.secret_references, {"TEST_TOKEN"})
+        self.assertFalse(artifact.nested_plan_ids)
+
+        # Lines and commands modified in the same transaction are compiled again
+        line_2.write({"sequence": 0, "path": "/tmp"})
+        command.code = "ls"
+        artifact = plan._get_artifact()
+        self.assertEqual([line.id for line in artifact.lines], [line_2.id, line_1.id])
+        self.assertEqual(artifact.lines[0].path, "/tmp")
+        self.assertFalse(artifact.secret_references)
+
+        # Line dependencies are part of the signature
+        line_1.dependency_ids = line_2
+        artifact = plan._get_artifact()
+        self.assertTrue(artifact.is_dag)
+        self.assertEqual(artifact.lines[1].dependency_ids, {line_2.id})
+        line_1.dependency_ids = False
+        artifact = plan._get_artifact()
+        self.assertFalse(artifact.is_dag)
+
+        # Running plan uses the signature computed when it was started
+        plan_log = self.PlanLog.create(
+            {
+                "server_id": self.server_test_1.id,
+                "plan_id": plan.id,
+                "plan_signature": artifact.signature,
+            }
+        )
+        self.assertIs(plan_log._get_plan_artifact(), artifact)
+        plan_log.plan_signature = "outdated"
+        self.assertIs(plan_log._get_plan_artifact(), artifact)
+
+        # Nested plans are part of the plan graph used to detect recursion
+        self.assertEqual(self.plan_2._get_artifact().nested_plan_ids, (self.plan_1.id,))
+        command_run_plan_2 = self.Command.create(
+            {
+                "name": "Run Flight Plan 2",
+                "action": "plan",
+                "flight_plan_id": self.plan_2.id,
+            }
+        )
+        with self.assertRaises(ValidationError):
+            self.plan_line_1.command_id = command_run_plan_2
+
+    def test_recover_interrupted_plans(self):
+        """Interrupted plans are resumed or finished by the cron"""
+        plan_log_values = {
+            "server_id": self.server_test_1.id,
+            "is_running": True,
+            "start_date": fields.Datetime.now(),
+        }
+        plan_log_resume = self.PlanLog.create(
+            dict(
+                plan_log_values,
+                plan_id=self.plan_1.id,
+                plan_line_executed_id=self.plan_1.line_ids[-1].id,
+            )
+        )
+        plan_log_finish = self.PlanLog.create(
+            dict(plan_log_values, plan_id=self.plan_3.id)
+        )
+        self.plan_1.auto_resume = True
+        self.assertTrue(plan_log_resume._is_interrupted())
+        self.PlanLog.flush()
+        self.env.cr.execute(
+            "UPDATE cx_tower_plan_log SET write_date = %s WHERE id IN %s",
+            (
+                fields.Datetime.now() - relativedelta(hours=1),
+                (plan_log_resume.id, plan_log_finish.id),
+            ),
+        )
+        self.PlanLog.invalidate_cache()
+
+        self.PlanLog._recover_interrupted_plans()
+
+        # Only the last line is run again
+        self.assertFalse(plan_log_resume.is_running)
+        self.assertEqual(plan_log_resume.plan_status, 0)
+        self.assertEqual(len(plan_log_resume.command_log_ids), 1)
+        self.assertFalse(plan_log_finish.is_running)
+        self.assertEqual(plan_log_finish.plan_status, PLAN_INTERRUPTED)
+
     def test_plan_user_access_rule(self):
         """Test plan user access rule"""
         # Create the test plan without assigned plan.lines
@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from odoo.exceptions import AccessError
 
 from .common import TestTowerCommon
@@ -249,6 +251,81 @@ COMMAND_RESULT = {
             ),
         )
 
+    def test_server_clone(self):
+        """Test cloning server several times at once"""
+        self.env["cx.tower.variable.value"].create(
+            {
+                "server_id": self.server_test_2.id,
+                "variable_id": self.variable_dir.id,
+                "value_char": "test",
+            }
+        )
+        self.ServerLog.create(
+            {
+                "name": "Log from command",
+                "server_id": self.server_test_2.id,
+                "log_type": "command",
+                "command_id": self.command_delete_server.id,
+            }
+        )
+
+        # References are generated without probing suffixes one by one
+        with patch.object(
+            type(self.Server), "_generate_or_fix_reference", autospec=True
+        ) as server_mock, patch.object(
+            type(self.ServerLog), "_generate_or_fix_reference", autospec=True
+        ) as log_mock, patch.object(
+            type(self.env["cx.tower.variable.value"]),
+            "_generate_or_fix_reference",
+            autospec=True,
+        ) as value_mock:
+            clones = self.server_test_2.clone(3)
+        server_mock.assert_not_called()
+        log_mock.assert_not_called()
+        value_mock.assert_not_called()
+
+        # -- 1 --
+        # Names and references are unique
+        self.assertEqual(len(clones), 3)
+        self.assertEqual(
+            clones.mapped("name"),
+            [
+                f"{self.server_test_2.name} (copy)",
+                f"{self.server_test_2.name} (copy 2)",
+                f"{self.server_test_2.name} (copy 3)",
+            ],
+        )
+        self.assertEqual(len(set(clones.mapped("reference"))), 3)
+        variable_value_references = clones.variable_value_ids.mapped("reference")
+        self.assertEqual(len(set(variable_value_references)), 3)
+        self.assertEqual(len(set(clones.server_log_ids.mapped("reference"))), 3)
+
+        # -- 2 --
+        # Related records are copied to each clone
+        for clone in clones:
+            self.assertEqual(
+                clone.variable_value_ids.mapped("variable_reference"),
+                self.server_test_2.variable_value_ids.mapped("variable_reference"),
+            )
+            self.assertEqual(
+                clone.server_log_ids.mapped("name"),
+                self.server_test_2.server_log_ids.mapped("name"),
+            )
+            self.assertEqual(len(clone.file_ids), len(self.server_test_2.file_ids))
+            self.assertTrue(
+                all(file.keep_when_deleted for file in clone.file_ids),
+            )
+            self.assertFalse(any(file.auto_sync for file in clone.file_ids))
+            self.assertEqual(
+                clone.secret_ids.sudo().mapped("secret_value"),
+                self.server_test_2.secret_ids.sudo().mapped("secret_value"),
+            )
+
+        # -- 3 --
+        # Next clones continue the numbering
+        next_clone = self.server_test_2.clone()
+        self.assertEqual(next_clone.name, f"{self.server_test_2.name} (copy 4)")
+
     def test_server_access_rights(self):
         """Test Server access rights"""
 
@@ -362,6 +439,50 @@ COMMAND_RESULT = {
         server.toggle_active()
         self.assertTrue(server, msg="Server must be unarchived")
 
+    def test_server_archive_related_records(self):
+        """Test related records are archived together with servers"""
+        servers = self.server_test_1 | self.server_test_2
+        command_logs = self.CommandLog.create(
+            [
+                {"server_id": server.id, "command_id": self.command_create_dir.id}
+                for server in servers
+            ]
+        )
+        variable_values = self.env["cx.tower.variable.value"].create(
+            [
+                {
+                    "server_id": server.id,
+                    "variable_id": self.variable_dir.id,
+                    "value_char": "archive",
+                }
+                for server in servers
+            ]
+        )
+        # Record of another server is not affected
+        other_server = servers[0].copy()
+        other_command_log = self.CommandLog.create(
+            {"server_id": other_server.id, "command_id": self.command_create_dir.id}
+        )
+
+        # -- 1 --
+        # Archive several servers at once
+        servers.toggle_active()
+        self.assertFalse(any(servers.mapped("active")))
+        self.assertFalse(any(command_logs.mapped("active")))
+        self.assertFalse(any(variable_values.mapped("active")))
+        self.assertFalse(
+            any(servers.with_context(active_test=False).file_ids.mapped("active"))
+        )
+        self.assertTrue(other_command_log.active)
+        self.assertFalse(servers.command_log_ids, "Archived logs must be hidden")
+
+        # -- 2 --
+        # Unarchive servers
+        servers.toggle_active()
+        self.assertTrue(all(command_logs.mapped("active")))
+        self.assertTrue(all(variable_values.mapped("active")))
+        self.assertEqual(servers.command_log_ids & command_logs, command_logs)
+
     def test_server_unlink(self):
         """
         Test cascading deletion of server and its related records.
@@ -1,5 +1,10 @@
+import io
+from unittest.mock import MagicMock, PropertyMock, patch
+
 from odoo.exceptions import AccessError
 
+from odoo.addons.cetmix_tower_server.models.cx_tower_server import SSH
+
 from .common import TestTowerCommon
 
 
@@ -230,6 +235,60 @@ class TestTowerServerLog(TestTowerCommon):
             "Log text doesn't match expected one",
         )
 
+    def test_log_update_tail(self):
+        """Test log update in tail mode"""
+
+        log = self.server_log_file_server
+        log.use_tail = True
+        remote_file = {"content": b"line 1\nline 2\npartial"}
+
+        class RemoteFile(io.BytesIO):
+            def stat(self):
+                return MagicMock(st_size=len(self.getvalue()))
+
+        sftp_mock = MagicMock()
+        sftp_mock.open.side_effect = lambda path, mode="r": RemoteFile(
+            remote_file["content"]
+        )
+
+        with patch.object(
+            SSH, "sftp", new_callable=PropertyMock, return_value=sftp_mock
+        ):
+            # Initial read: incomplete line is not fetched
+            log.action_get_log_text()
+            self.assertEqual(
+                log.log_text, self.ServerLog._format_log_text("line 1\nline 2\n")
+            )
+            self.assertEqual(log.tail_offset, 14)
+
+            # Only new lines are appended
+            remote_file["content"] += b" line 3\nline 4\n"
+            log.action_get_log_text()
+            self.assertEqual(
+                log.log_text,
+                self.ServerLog._format_log_text("line 1\nline 2\n")
+                + self.ServerLog._format_log_text("partial line 3\nline 4\n"),
+            )
+            self.assertEqual(log.tail_offset, len(remote_file["content"]))
+
+            # Rotated file is read from the beginning
+            remote_file["content"] = b"new line\n"
+            log.action_get_log_text()
+            self.assertEqual(
+                log.log_text, self.ServerLog._format_log_text("new line\n")
+            )
+            self.assertEqual(log.tail_offset, 9)
+
+            # Only the latest lines are kept if the log size is exceeded
+            log.tail_max_size = 1
+            remote_file["content"] = b"".join(
+                b"line %d\n" % number for number in range(200)
+            )
+            log.action_get_log_text()
+            self.assertNotIn("line 0<", log.log_text)
+            self.assertIn("line 199", log.log_text)
+            self.assertLessEqual(log.tail_window_size, 1024)
+
     def test_log_update_all(self):
         """
         Test log update results when triggered all
@@ -1,3 +1,4 @@
 from . import cx_tower_command_execute_wizard
 from . import cx_tower_plan_execute_wizard
 from . import cx_tower_server_template_create_wizard
+from . import cx_tower_server_clone_wizard
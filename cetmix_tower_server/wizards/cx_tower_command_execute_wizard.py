@@ -15,6 +15,14 @@ class CxTowerCommandExecuteWizard(models.TransientModel):
         "cx.tower.server",
         string="Servers",
     )
+    server_selector = fields.Char(
+        string="Selector",
+        help="Select servers using expression, eg\n"
+        'tag:prod and var.odoo_version == "16.0" and os:ubuntu\n'
+        "Supported terms: tag:<reference>, os:<text>, name:<text>,\n"
+        "var.<reference> [==, !=, ~ <value>].\n"
+        "Use 'and', 'or', 'not' and parentheses to combine them.",
+    )
     command_id = fields.Many2one(
         "cx.tower.command",
     )
@@ -60,6 +68,16 @@ class CxTowerCommandExecuteWizard(models.TransientModel):
         compute="_compute_show_servers",
     )
 
+    @api.onchange("server_selector")
+    def _onchange_server_selector(self):
+        """
+        Select servers matching the selector
+        """
+        if self.server_selector:
+            self.server_ids = self.env["cx.tower.server"]._search_by_selector(
+                self.server_selector
+            )
+
     @api.depends("server_ids")
     def _compute_show_servers(self):
         """
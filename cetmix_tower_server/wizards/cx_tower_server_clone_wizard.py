@@ -0,0 +1,43 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+
+
+class CxTowerServerCloneWizard(models.TransientModel):
+    """Clone server several times"""
+
+    _name = "cx.tower.server.clone.wizard"
+    _description = "Clone server several times"
+
+    server_id = fields.Many2one(
+        "cx.tower.server",
+        string="Server",
+        required=True,
+        readonly=True,
+    )
+    count = fields.Integer(
+        string="Number of Copies",
+        default=1,
+        required=True,
+    )
+
+    @api.constrains("count")
+    def _check_count(self):
+        """Number of copies must be positive"""
+        for wizard in self:
+            if wizard.count < 1:
+                raise ValidationError(_("Number of copies must be positive"))
+
+    def action_confirm(self):
+        """
+        Clone the server and open new servers
+        """
+        self.ensure_one()
+        servers = self.server_id.clone(self.count)
+        action = self.env["ir.actions.actions"]._for_xml_id(
+            "cetmix_tower_server.action_cx_tower_server"
+        )
+        action.update({"domain": [("id", "in", servers.ids)]})
+        return action
@@ -1 +1,6 @@
+from . import cx_tower_command_log
+from . import cx_tower_file
+from . import cx_tower_plan
+from . import cx_tower_plan_line
+from . import cx_tower_plan_log
 from . import cx_tower_server
@@ -0,0 +1,41 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import api, fields, models
+
+# Jobs that are not picked by a worker yet
+WAITING_JOB_STATES = ["wait_dependencies", "pending", "enqueued"]
+
+
+class CxTowerCommandLog(models.Model):
+    _inherit = "cx.tower.command.log"
+
+    job_uuid = fields.Char(
+        readonly=True, copy=False, help="Queue job executing the command"
+    )
+
+    def _filter_alive_runs(self):
+        # Command is not locked until the job is started
+        waiting_job_uuids = self._get_waiting_job_uuids(self.mapped("job_uuid"))
+        return super()._filter_alive_runs() | self.filtered(
+            lambda log: log.job_uuid in waiting_job_uuids
+        )
+
+    @api.model
+    def _get_waiting_job_uuids(self, job_uuids):
+        """Get queue jobs that are waiting to be executed
+
+        Args:
+            job_uuids (list): job UUIDs
+
+        Returns:
+            set: UUIDs of jobs waiting for a worker
+        """
+        job_uuids = [job_uuid for job_uuid in job_uuids if job_uuid]
+        if not job_uuids:
+            return set()
+        jobs = (
+            self.env["queue.job"]
+            .sudo()
+            .search([("uuid", "in", job_uuids), ("state", "in", WAITING_JOB_STATES)])
+        )
+        return set(jobs.mapped("uuid"))
@@ -0,0 +1,21 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import models
+
+from odoo.addons.queue_job.job import identity_exact
+
+
+class CxTowerFile(models.Model):
+    _inherit = "cx.tower.file"
+
+    def _add_to_auto_sync_queue(self):
+        # Jobs are created in the current transaction so they are
+        # only run once it is committed and dropped if it is rolled back.
+        # No separate cursor is needed to schedule them.
+        self._run_auto_sync()
+
+    def _auto_sync_wrapper(self):
+        # Sync files of each server in a separate job
+        # so the transfers don't block the worker that committed the changes.
+        # Files modified several times in a transaction are synced once.
+        self.with_delay(identity_key=identity_exact)._auto_sync()
@@ -0,0 +1,27 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import models
+
+
+class CxTowerPlan(models.Model):
+    _inherit = "cx.tower.plan"
+
+    def _is_running_on_server(self, server, **kwargs):
+        # Flight plan commands are executed in separate jobs,
+        # so the run lock is not held between them.
+        # Check running plan logs too. Plans left by a crashed worker
+        # are ignored here and are recovered by the cron.
+        if super()._is_running_on_server(server, **kwargs):
+            return True
+        running_logs = (
+            self.env["cx.tower.plan.log"]
+            .sudo()
+            .search(
+                [
+                    ("server_id", "=", server.id),
+                    ("plan_id", "=", self.id),
+                    ("is_running", "=", True),
+                ]
+            )
+        )
+        return bool(running_logs - running_logs._filter_interrupted())
@@ -0,0 +1,17 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import models
+
+
+class CxTowerPlanLine(models.Model):
+    _inherit = "cx.tower.plan.line"
+
+    def _retry(self, server, plan_log_record, delay):
+        # Plans launched from another plan are run synchronously,
+        # so the parent plan gets their result. Nothing to postpone either.
+        if not delay or plan_log_record.parent_flight_plan_log_id:
+            return super()._retry(server, plan_log_record, delay)
+        # Postpone the line with a job instead of the cron
+        job = self.with_delay(eta=delay)._execute(server, plan_log_record)
+        # Plan log is checked for a waiting job by the recovery cron
+        plan_log_record._log_write({"job_uuid": job.uuid})
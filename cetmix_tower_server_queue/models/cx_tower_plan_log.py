@@ -0,0 +1,21 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo import fields, models
+
+
+class CxTowerPlanLog(models.Model):
+    _inherit = "cx.tower.plan.log"
+
+    job_uuid = fields.Char(
+        readonly=True, copy=False, help="Queue job retrying the flight plan line"
+    )
+
+    def _filter_interrupted(self):
+        # Plan waiting for a line retry is not interrupted
+        interrupted_logs = super()._filter_interrupted()
+        waiting_job_uuids = self.env["cx.tower.command.log"]._get_waiting_job_uuids(
+            interrupted_logs.mapped("job_uuid")
+        )
+        return interrupted_logs.filtered(
+            lambda log: log.job_uuid not in waiting_job_uuids
+        )
@@ -21,7 +21,10 @@ class CxTowerServer(models.Model):
         # preserve the order of execution of commands with action “Run flight plan”.
         # Use runner only if command log record is provided.
         if log_record and not log_record.plan_log_id.parent_flight_plan_log_id:
-            self.with_delay()._command_runner(
+            # Job runs in its own transaction,
+            # so command progress can be committed safely.
+            server = self.with_context(cx_tower_commit_progress=True)
+            job = server.with_delay()._command_runner(
                 command,
                 log_record,
                 rendered_command_code,
@@ -29,6 +32,8 @@ class CxTowerServer(models.Model):
                 ssh_connection,
                 **kwargs,
             )
+            # Command log is checked for a waiting job by the recovery cron
+            log_record._log_write({"job_uuid": job.uuid})
 
         # Otherwise fallback to `super` to return the command output
         else:
@@ -40,3 +45,9 @@ class CxTowerServer(models.Model):
                 ssh_connection,
                 **kwargs,
             )
+
+    def _job_prepare_context_before_enqueue_keys(self):
+        # Keep the progress commit flag in the job context
+        return tuple(super()._job_prepare_context_before_enqueue_keys()) + (
+            "cx_tower_commit_progress",
+        )
@@ -0,0 +1,2 @@
+from . import test_file
+from . import test_plan_line
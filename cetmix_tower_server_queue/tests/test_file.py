@@ -0,0 +1,24 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from odoo.addons.cetmix_tower_server.tests.common import TestTowerCommon
+
+
+class TestTowerFileQueue(TestTowerCommon):
+    def test_auto_sync_enqueued(self):
+        """Auto sync job is enqueued once in the same transaction"""
+        Job = self.env["queue.job"]
+        jobs_before = Job.search([("method_name", "=", "_auto_sync")])
+        file_ = self.File.create(
+            {
+                "name": "auto.txt",
+                "source": "tower",
+                "auto_sync": True,
+                "server_id": self.server_test_1.id,
+                "server_dir": "/var/tmp",
+                "code": "version 1",
+            }
+        )
+        file_.code = "version 2"
+        jobs = Job.search([("method_name", "=", "_auto_sync")]) - jobs_before
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs.records, file_)
@@ -0,0 +1,76 @@
+# Copyright (C) 2024 Cetmix OÜ
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from unittest.mock import patch
+
+from odoo.addons.cetmix_tower_server.tests.common import TestTowerCommon
+
+
+class TestTowerPlanLineQueue(TestTowerCommon):
+    def setUp(self, *args, **kwargs):
+        super().setUp(*args, **kwargs)
+        self.plan = self.Plan.create(
+            {
+                "name": "Retry plan",
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "command_id": self.command_create_dir.id,
+                            "retry_count": 1,
+                            "retry_delay": 30,
+                        },
+                    ),
+                ],
+            }
+        )
+        self.line = self.plan.line_ids
+        self.parent_plan_log = self.PlanLog.create(
+            {"server_id": self.server_test_1.id, "plan_id": self.plan_1.id}
+        )
+
+    def _retry(self, plan_log, delay):
+        """Retry the line with the line execution patched
+
+        Returns:
+            MagicMock: patched line execution
+        """
+        with patch.object(
+            self.registry["cx.tower.plan.line"], "_execute", autospec=True
+        ) as execute:
+            self.line._retry(self.server_test_1, plan_log, delay)
+        return execute
+
+    def test_retry_delayed(self):
+        """Delayed retry of a top level plan line is enqueued"""
+        plan_log = self.PlanLog.create(
+            {"server_id": self.server_test_1.id, "plan_id": self.plan.id}
+        )
+        execute = self._retry(plan_log, 30)
+        execute.assert_not_called()
+        self.assertTrue(plan_log.job_uuid)
+        self.assertTrue(
+            self.env["queue.job"].search([("uuid", "=", plan_log.job_uuid)])
+        )
+
+    def test_retry_no_delay(self):
+        """Retry without a delay is run at once"""
+        plan_log = self.PlanLog.create(
+            {"server_id": self.server_test_1.id, "plan_id": self.plan.id}
+        )
+        execute = self._retry(plan_log, 0)
+        execute.assert_called_once_with(self.line, self.server_test_1, plan_log)
+        self.assertFalse(plan_log.job_uuid)
+
+    def test_retry_nested_plan(self):
+        """Line of a plan launched from another plan is retried at once"""
+        plan_log = self.PlanLog.create(
+            {
+                "server_id": self.server_test_1.id,
+                "plan_id": self.plan.id,
+                "parent_flight_plan_log_id": self.parent_plan_log.id,
+            }
+        )
+        execute = self._retry(plan_log, 30)
+        execute.assert_called_once_with(self.line, self.server_test_1, plan_log)
+        self.assertFalse(plan_log.job_uuid)
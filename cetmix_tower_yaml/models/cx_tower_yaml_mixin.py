@@ -6,8 +6,15 @@ import yaml
 from odoo import _, api, fields, models
 from odoo.exceptions import AccessError, ValidationError
 
+# Use libyaml bindings if available because they are much faster
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YamlDumper = getattr(yaml, "CDumper", yaml.Dumper)
 
-class CustomDumper(yaml.Dumper):
+# Keys that are not record fields
+YAML_SERVICE_KEYS = ["cetmix_tower_yaml_version", "cetmix_tower_model"]
+
+
+class CustomDumper(YamlDumper):
     """Custom dumper to ensures code
     is properly dumped in YAML
     """
@@ -17,6 +24,11 @@ class CustomDumper(yaml.Dumper):
             style = "|"
         return super().represent_scalar(tag, value, style)
 
+    def ignore_aliases(self, data):
+        # Memoized related records are shared between documents.
+        # Dump them in full instead of using anchors.
+        return True
+
 
 class CxTowerYamlMixin(models.AbstractModel):
     """Used to implement YAML rendering functions.
@@ -46,19 +58,18 @@ class CxTowerYamlMixin(models.AbstractModel):
 
         # This is used for the file name.
         # Eg cx.tower.command record will have 'command_' prefix.
-        for record in self:
-            # We are reading field list for each record
-            # because list of fields can differ from record to record
-            record.yaml_code = self._convert_dict_to_yaml(
-                record._prepare_record_for_yaml()
-            )
+        for record, record_values in zip(self, self._prepare_records_for_yaml()):
+            record.yaml_code = self._convert_dict_to_yaml(record_values)
 
     def _inverse_yaml_code(self):
         """Compose record based on provided YAML"""
         for record in self:
             if record.yaml_code:
-                record_yaml_dict = yaml.safe_load(record.yaml_code)
-                record_vals = record._post_process_yaml_dict_values(record_yaml_dict)
+                record_yaml_dict = record._load_yaml(record.yaml_code)
+                yaml_cache = record._prepare_yaml_reference_cache([record_yaml_dict])
+                record_vals = record._post_process_yaml_dict_values(
+                    record_yaml_dict, yaml_cache=yaml_cache
+                )
                 record.update(record_vals)
 
     @api.constrains("yaml_code")
@@ -94,7 +105,7 @@ class CxTowerYamlMixin(models.AbstractModel):
             "target": "new",
         }
 
-    def _convert_dict_to_yaml(self, values):
+    def _convert_dict_to_yaml(self, values, stream=None):
         """Converts Python dictionary to YAML string.
 
         This is a helper function that is designed to be used
@@ -103,8 +114,10 @@ class CxTowerYamlMixin(models.AbstractModel):
            Args:
                values (Dict): Dictionary containing data
                     to be converted to YAML format
+               stream (file, optional): text stream to write YAML to.
+                    YAML string is returned if not provided.
            Returns:
-               Text: YAML string
+               Text: YAML string or None if stream is provided
            Raises:
                ValidationError: If values is not a dictionary
                    or YAML conversion fails
@@ -114,6 +127,7 @@ class CxTowerYamlMixin(models.AbstractModel):
         try:
             yaml_code = yaml.dump(
                 values,
+                stream,
                 Dumper=CustomDumper,
                 default_flow_style=False,
                 sort_keys=False,
@@ -127,6 +141,35 @@ class CxTowerYamlMixin(models.AbstractModel):
                 )
             ) from e
 
+    @api.model
+    def _load_yaml(self, yaml_code):
+        """Parse YAML code
+
+        Args:
+            yaml_code (Text): YAML code
+
+        Returns:
+            Any: parsed data
+        """
+        return yaml.load(yaml_code, Loader=YamlLoader)
+
+    @api.model
+    def _load_yaml_documents(self, yaml_code):
+        """Parse all documents of a multi-document YAML code.
+        Empty documents are skipped.
+
+        Args:
+            yaml_code (Text): YAML code
+
+        Returns:
+            list: parsed documents
+        """
+        return [
+            document
+            for document in yaml.load_all(yaml_code, Loader=YamlLoader)
+            if document is not None
+        ]
+
     def _prepare_record_for_yaml(self):
         """Reads and processes current record before converting it to YAML
 
@@ -134,9 +177,166 @@ class CxTowerYamlMixin(models.AbstractModel):
             dict: values ready for YAML conversion
         """
         self.ensure_one()
-        yaml_keys = self._get_fields_for_yaml()
-        record_dict = self.read(fields=yaml_keys)[0]
-        return self._post_process_record_values(record_dict)
+        return self._prepare_records_for_yaml()[0]
+
+    def _prepare_records_for_yaml(self, yaml_cache=None):
+        """Reads and processes records before converting them to YAML.
+        Records with the same field list are read at once.
+        Related records are read in batch per field and processed
+        only once no matter how many times they are referenced.
+
+        Args:
+            yaml_cache (dict, optional): processed records shared
+                between calls. Check `_get_yaml_cache_key` for the key format.
+
+        Returns:
+            list of dict: values ready for YAML conversion in the record order
+        """
+        if yaml_cache is None:
+            yaml_cache = {}
+
+        # Field list can differ from record to record
+        records_by_fields = {}
+        for record in self:
+            if record._get_yaml_cache_key(record.id) in yaml_cache:
+                continue
+            yaml_keys = tuple(record._get_fields_for_yaml())
+            records_by_fields.setdefault(yaml_keys, self.browse())
+            records_by_fields[yaml_keys] |= record
+
+        for yaml_keys, records in records_by_fields.items():
+            records_values = records.read(fields=list(yaml_keys))
+            if self._context.get("explode_related_record"):
+                self._prefetch_related_records_for_yaml(records_values, yaml_cache)
+            for record_values in records_values:
+                record_key = self._get_yaml_cache_key(record_values["id"])
+                yaml_cache[record_key] = self._post_process_record_values(
+                    record_values, yaml_cache=yaml_cache
+                )
+
+        return [yaml_cache[self._get_yaml_cache_key(record.id)] for record in self]
+
+    def _prefetch_related_records_for_yaml(self, records_values, yaml_cache):
+        """Process records related to the records being exported.
+        Related records of each field are processed at once.
+
+        Args:
+            records_values (list of dict): values returned by 'read' method
+            yaml_cache (dict): processed records
+        """
+        for field_name in records_values and records_values[0] or []:
+            field_obj = self._fields.get(field_name)
+            if (
+                not field_obj
+                or field_obj.type not in ["one2many", "many2many", "many2one"]
+                or not field_obj.comodel_name
+            ):
+                continue
+            related_ids = []
+            for record_values in records_values:
+                value = record_values.get(field_name)
+                if not value:
+                    continue
+                if field_obj.type == "many2one":
+                    related_ids.append(value[0])
+                else:
+                    related_ids += value
+            if related_ids:
+                self.env[field_obj.comodel_name].browse(
+                    list(dict.fromkeys(related_ids))
+                ).with_context(no_yaml_service_fields=True)._prepare_records_for_yaml(
+                    yaml_cache
+                )
+
+    def _get_yaml_cache_key(self, record_id):
+        """Get key of the processed record in the YAML export cache.
+        Context keys that modify the record values are included.
+
+        Args:
+            record_id (int): record id
+
+        Returns:
+            tuple: cache key
+        """
+        return (
+            self._name,
+            record_id,
+            bool(self._context.get("no_yaml_service_fields")),
+            bool(self._context.get("explode_related_record")),
+            bool(self._context.get("remove_empty_values")),
+        )
+
+    def _export_yaml_to_stream(
+        self, stream, separator="\n", document_separator="---\n"
+    ):
+        """Write YAML code of the records to a text stream.
+        Each record is written as soon as it is converted.
+        Related records are processed once for all the records.
+
+        Args:
+            stream (file): text stream to write to
+            separator (Text, optional): text written before the first record
+            document_separator (Text, optional): text written before
+                each of the following records. Makes a multi-document YAML
+                that can be imported back.
+        """
+        yaml_cache = {}
+        for index, record_values in enumerate(
+            self._prepare_records_for_yaml(yaml_cache)
+        ):
+            stream.write(document_separator if index else separator)
+            self._convert_dict_to_yaml(record_values, stream=stream)
+
+    @api.model
+    def _get_yaml_changed_fields(self, values, current_values):
+        """Compare values generated from YAML with the current record values.
+
+        Args:
+            values (dict): Dictionary generated from YAML
+            current_values (dict): record values prepared for YAML
+                in the exploded mode. Check `_prepare_records_for_yaml`.
+
+        Returns:
+            list: YAML keys whose values differ from the current ones
+        """
+        supported_keys = self._get_fields_for_yaml()
+        return [
+            key
+            for key, value in values.items()
+            if key in supported_keys
+            and not self._yaml_values_equal(value, current_values.get(key))
+        ]
+
+    @api.model
+    def _yaml_values_equal(self, value, current_value):
+        """Check if value generated from YAML matches the current value.
+        Related record can be represented either with its reference
+        or a dictionary. Only keys present in YAML are compared.
+
+        Args:
+            value (Any): value generated from YAML
+            current_value (Any): current value prepared for YAML
+
+        Returns:
+            Bool: True if values are equal
+        """
+        # Empty values are represented differently, eg False, None or []
+        if not value and not current_value:
+            return True
+        if isinstance(value, str) and isinstance(current_value, dict):
+            return value == current_value.get("reference")
+        if isinstance(value, dict) and isinstance(current_value, dict):
+            return all(
+                self._yaml_values_equal(sub_value, current_value.get(key))
+                for key, sub_value in value.items()
+                if key not in YAML_SERVICE_KEYS
+            )
+        if isinstance(value, list) and isinstance(current_value, list):
+            return len(value) == len(current_value) and all(
+                self._yaml_values_equal(sub_value, current_sub_value)
+                for sub_value, current_sub_value in zip(value, current_value)
+            )
+        return value == current_value
 
     def _get_fields_for_yaml(self):
         """Get ist of field to be present in YAML
@@ -167,12 +367,14 @@ class CxTowerYamlMixin(models.AbstractModel):
             "cx.tower.os",
         ]
 
-    def _post_process_record_values(self, values):
+    def _post_process_record_values(self, values, yaml_cache=None):
         """Post process record values
             before converting them to YAML
 
         Args:
             values (dict): values returned by 'read' method
+            yaml_cache (dict, optional): processed related records
+                or references resolved in advance
 
         Context:
             explode_related_record: if set will return entire record dictionary
@@ -226,16 +428,103 @@ class CxTowerYamlMixin(models.AbstractModel):
                 else:
                     processed_value = self.with_context(
                         explode_related_record=explode_related_record
-                    )._process_relation_field_value(key, value, record_mode=True)
+                    )._process_relation_field_value(
+                        key, value, record_mode=True, yaml_cache=yaml_cache
+                    )
                     new_values.update({key: processed_value})
 
         return new_values
 
-    def _post_process_yaml_dict_values(self, values):
+    def _prepare_yaml_reference_cache(self, documents):
+        """Resolve references used in YAML documents of the current model.
+        Records of each model are searched using a single query.
+
+        Args:
+            documents (list of dict): documents generated from YAML
+
+        Returns:
+            dict: {(model_name, reference): record id or False}
+        """
+        references = {}
+        for document in documents:
+            if isinstance(document, dict):
+                reference = document.get("reference")
+                if isinstance(reference, str):
+                    references.setdefault(self._name, set()).add(reference)
+                self._collect_yaml_references(document, references)
+        return self._resolve_yaml_references(references)
+
+    @api.model
+    def _resolve_yaml_references(self, references):
+        """Resolve references using a single query per model
+
+        Args:
+            references (dict): {model_name: set of references}
+
+        Returns:
+            dict: {(model_name, reference): record id or False}
+        """
+        yaml_cache = {}
+        for model_name, model_references in references.items():
+            record_ids = self.env[model_name]._get_ids_by_references(model_references)
+            for reference in model_references:
+                yaml_cache[(model_name, reference)] = record_ids.get(reference, False)
+        return yaml_cache
+
+    def _collect_yaml_references(self, values, references):
+        """Collect references of the related records used in YAML values.
+        Nested related records are processed recursively.
+
+        Args:
+            values (dict): Dictionary generated from YAML
+            references (dict): {model_name: set of references} to update
+        """
+        supported_keys = self._get_fields_for_yaml()
+        for key, value in values.items():
+            if not value or key not in supported_keys:
+                continue
+            field_obj = self._fields.get(key)
+            if (
+                not field_obj
+                or field_obj.type not in ["one2many", "many2many", "many2one"]
+                or not field_obj.comodel_name
+            ):
+                continue
+            comodel = self.env[field_obj.comodel_name]
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, dict):
+                    reference = item.get("reference")
+                    if hasattr(comodel, "_collect_yaml_references"):
+                        comodel._collect_yaml_references(item, references)
+                else:
+                    reference = item
+                if reference and isinstance(reference, str):
+                    references.setdefault(comodel._name, set()).add(reference)
+
+    def _get_record_by_yaml_reference(self, model, reference, yaml_cache=None):
+        """Get record by reference.
+        References resolved in advance are used if available.
+
+        Args:
+            model (BaseModel): record model
+            reference (Char): record reference
+            yaml_cache (dict, optional): resolved references
+
+        Returns:
+            record: record or empty recordset
+        """
+        key = (model._name, reference)
+        if yaml_cache is not None and key in yaml_cache:
+            return model.browse(yaml_cache[key])
+        return model.get_by_reference(reference)
+
+    def _post_process_yaml_dict_values(self, values, yaml_cache=None):
         """Post process dictionary values generated from YAML code
 
         Args:
             values (dict): Dictionary generated from YAML
+            yaml_cache (dict, optional): references resolved in advance.
+                Check `_prepare_yaml_reference_cache` for the format.
 
         Returns:
             dict(): Post-processed values
@@ -288,12 +577,16 @@ class CxTowerYamlMixin(models.AbstractModel):
             if key.endswith("_id") or key.endswith("_ids"):
                 processed_value = self.with_context(
                     explode_related_record=True
-                )._process_relation_field_value(key, value, record_mode=False)
+                )._process_relation_field_value(
+                    key, value, record_mode=False, yaml_cache=yaml_cache
+                )
                 filtered_values.update({key: processed_value})
 
         return filtered_values
 
-    def _process_relation_field_value(self, field, value, record_mode=False):
+    def _process_relation_field_value(
+        self, field, value, record_mode=False, yaml_cache=None
+    ):
         """Post process One2many, Many2many or Many2one value
 
         Args:
@@ -301,6 +594,8 @@ class CxTowerYamlMixin(models.AbstractModel):
             value (Char): Value to process
             record_mode (Bool): If True process value as a record value
                                 else process value as a YAML value
+            yaml_cache (dict, optional): processed related records
+                or references resolved in advance
             Context:
                 explode_related_record: if set will return entire record dictionary
                     not just a reference
@@ -330,18 +625,32 @@ class CxTowerYamlMixin(models.AbstractModel):
         # Step 3: process value based on the field type
         if field_type == "many2one":
             return self._process_m2o_value(
-                comodel, value, explode_related_record, record_mode
+                comodel,
+                value,
+                explode_related_record,
+                record_mode,
+                yaml_cache=yaml_cache,
             )
         if field_type in ["one2many", "many2many"]:
             return self._process_x2m_values(
-                comodel, field_type, value, explode_related_record, record_mode
+                comodel,
+                field_type,
+                value,
+                explode_related_record,
+                record_mode,
+                yaml_cache=yaml_cache,
             )
 
         # Step 4: fall back if field type is not supported
         return False
 
     def _process_m2o_value(
-        self, comodel, value, explode_related_record, record_mode=False
+        self,
+        comodel,
+        value,
+        explode_related_record,
+        record_mode=False,
+        yaml_cache=None,
     ):
         """Post process many2one value
         Args:
@@ -351,6 +660,8 @@ class CxTowerYamlMixin(models.AbstractModel):
                 instead of a reference
             record_mode (Bool): If True process value as a record value
                                 else process value as a YAML value
+            yaml_cache (dict, optional): processed related records
+                or references resolved in advance
 
         Returns:
             dict() or Char: record dictionary if fetch_record else reference
@@ -367,7 +678,7 @@ class CxTowerYamlMixin(models.AbstractModel):
                 return (
                     record.with_context(
                         no_yaml_service_fields=True
-                    )._prepare_record_for_yaml()
+                    )._prepare_records_for_yaml(yaml_cache)[0]
                     if record
                     else False
                 )
@@ -387,7 +698,11 @@ class CxTowerYamlMixin(models.AbstractModel):
         elif isinstance(value, dict):
             reference = value.get("reference")
             record = self._update_or_create_related_record(
-                comodel, reference, value, create_immediately=True
+                comodel,
+                reference,
+                value,
+                create_immediately=True,
+                yaml_cache=yaml_cache,
             )
         else:
             return False
@@ -395,11 +710,17 @@ class CxTowerYamlMixin(models.AbstractModel):
         # Step 2: Final fallback: attempt to retrieve the record by reference if set,
         #  return its ID or False
         if not record and reference:
-            record = comodel.get_by_reference(reference)
+            record = self._get_record_by_yaml_reference(comodel, reference, yaml_cache)
         return record.id if record else False
 
     def _process_x2m_values(
-        self, comodel, field_type, values, explode_related_record, record_mode=False
+        self,
+        comodel,
+        field_type,
+        values,
+        explode_related_record,
+        record_mode=False,
+        yaml_cache=None,
     ):
         """Post process many2many value
         Args:
@@ -410,6 +731,8 @@ class CxTowerYamlMixin(models.AbstractModel):
                 instead of a reference
             record_mode (Bool): If True process value as a record value
                                 else process value as a YAML value
+            yaml_cache (dict, optional): processed related records
+                or references resolved in advance
 
         Returns:
             dict() or Char: record dictionary if fetch_record else reference
@@ -417,35 +740,28 @@ class CxTowerYamlMixin(models.AbstractModel):
 
         # -- (Record -> YAML)
         if record_mode:
-            record_list = []
-            for value in values:
-                # Retrieve the record based on the ID provided in the value
-                record = comodel.browse(value)
-
-                # If the context specifies to explode the related record,
-                # return its dictionary representation
-                if explode_related_record:
-                    record_list.append(
-                        record.with_context(
-                            no_yaml_service_fields=True
-                        )._prepare_record_for_yaml()
-                        if record
-                        else False
-                    )
+            # Retrieve the records based on the IDs provided in the value
+            records = comodel.browse(values)
 
-                # Otherwise, return just the reference
-                # (or False if record does not exist)
-                else:
-                    record_list.append(record.reference if record else False)
+            # If the context specifies to explode the related records,
+            # return their dictionary representation
+            if explode_related_record:
+                return records.with_context(
+                    no_yaml_service_fields=True
+                )._prepare_records_for_yaml(yaml_cache)
 
-            return record_list
+            # Otherwise, return just the references
+            return [record.reference for record in records]
 
         # -- (YAML -> Record)
         # Step 1: Process value in normal mode
         record_ids = []
+        # Many2many records to create at once: {reference or index: values}
+        values_to_create = {}
 
-        for value in values:
+        for index, value in enumerate(values):
             record = False
+            reference = False
             # If the value is a string, it is treated as a reference
             if isinstance(value, str):
                 reference = value
@@ -457,13 +773,19 @@ class CxTowerYamlMixin(models.AbstractModel):
                     comodel,
                     reference,
                     value,
-                    create_immediately=field_type == "many2many",
+                    yaml_cache=yaml_cache,
                 )
+                # Many2many records are created in batch once all values are parsed
+                if field_type == "many2many" and isinstance(record, tuple):
+                    values_to_create.setdefault(reference or index, record[2])
+                    continue
 
             # Step 2: Final fallback: attempt to retrieve the record by reference
             # Return record ID or False if reference is not defined
             if not record and reference:
-                record = comodel.get_by_reference(reference)
+                record = self._get_record_by_yaml_reference(
+                    comodel, reference, yaml_cache
+                )
 
             # Save record data
             if record:
@@ -471,10 +793,17 @@ class CxTowerYamlMixin(models.AbstractModel):
                     record if isinstance(record, tuple) else (4, record.id)
                 )
 
+        if values_to_create:
+            new_records = comodel.create(list(values_to_create.values()))
+            for key, record in zip(values_to_create, new_records):
+                if yaml_cache is not None and isinstance(key, str):
+                    yaml_cache[(comodel._name, key)] = record.id
+                record_ids.append((4, record.id))
+
         return record_ids
 
     def _update_or_create_related_record(
-        self, model, reference, values, create_immediately=False
+        self, model, reference, values, create_immediately=False, yaml_cache=None
     ):
         """Update related record with provided values or create a new one
 
@@ -484,6 +813,7 @@ class CxTowerYamlMixin(models.AbstractModel):
             reference (Char): Record reference
             create_immediately (Bool): If True create a new record immediately.
                 Used for Many2one fields.
+            yaml_cache (dict, optional): references resolved in advance
 
         Context:
             force_create_related_record (Bool): If True, create a new record
@@ -498,27 +828,47 @@ class CxTowerYamlMixin(models.AbstractModel):
             model._name in self._get_force_x2m_resolve_models()
             or not self._context.get("force_create_related_record")
         ):
-            record = model.get_by_reference(reference)
+            record = self._get_record_by_yaml_reference(model, reference, yaml_cache)
 
             # If the record exists, update it with the values from the dictionary
             if record:
-                record.write(record._post_process_yaml_dict_values(values))
+                record.write(
+                    record._post_process_yaml_dict_values(values, yaml_cache=yaml_cache)
+                )
 
             # If the record does not exist, create a new one
             else:
                 if create_immediately:
-                    record = model.create(model._post_process_yaml_dict_values(values))
+                    record = model.create(
+                        model._post_process_yaml_dict_values(
+                            values, yaml_cache=yaml_cache
+                        )
+                    )
+                    if yaml_cache is not None:
+                        yaml_cache[(model._name, reference)] = record.id
                 else:
                     # Use "Create" service command tuple
-                    record = (0, 0, model._post_process_yaml_dict_values(values))
+                    record = (
+                        0,
+                        0,
+                        model._post_process_yaml_dict_values(
+                            values, yaml_cache=yaml_cache
+                        ),
+                    )
 
         # If there's no reference but value is a dict, create a new record
         else:
             if create_immediately:
-                record = model.create(model._post_process_yaml_dict_values(values))
+                record = model.create(
+                    model._post_process_yaml_dict_values(values, yaml_cache=yaml_cache)
+                )
             else:
                 # Use "Create" service command tuple
-                record = (0, 0, model._post_process_yaml_dict_values(values))
+                record = (
+                    0,
+                    0,
+                    model._post_process_yaml_dict_values(values, yaml_cache=yaml_cache),
+                )
 
         # Return the record's ID if it exists, otherwise return False
         return record or False
@@ -1,3 +1,6 @@
+import io
+from unittest.mock import patch
+
 from odoo import _
 from odoo.exceptions import AccessError, ValidationError
 from odoo.tests import TransactionCase
@@ -31,6 +34,43 @@ class TestTowerYamlMixin(TransactionCase):
                 "Exception message doesn't match",
             )
 
+    def test_export_related_records_once(self):
+        """Test if related records referenced several times
+        are read and processed only once"""
+        command = self.env["cx.tower.command"].create(
+            {"name": "Much Command", "code": "echo such_code"}
+        )
+        plans = self.env["cx.tower.plan"].create(
+            [
+                {
+                    "name": f"Wow Plan {number}",
+                    "line_ids": [
+                        (0, 0, {"command_id": command.id, "sequence": sequence})
+                        for sequence in (1, 2)
+                    ],
+                }
+                for number in (1, 2)
+            ]
+        )
+        command_class = type(command)
+        with patch.object(
+            command_class,
+            "_post_process_record_values",
+            autospec=True,
+            side_effect=command_class._post_process_record_values,
+        ) as process_mock:
+            yaml_stream = io.StringIO()
+            plans.with_context(explode_related_record=True)._export_yaml_to_stream(
+                yaml_stream
+            )
+        self.assertEqual(process_mock.call_count, 1)
+
+        # Shared records are written in full without YAML aliases
+        yaml_code = yaml_stream.getvalue()
+        self.assertNotIn("&id", yaml_code)
+        self.assertEqual(yaml_code.count("cetmix_tower_model: plan\n"), 2)
+        self.assertEqual(yaml_code.count("echo such_code"), 4)
+
     def test_yaml_field_access(self):
         # Create Root user with no access to the 'yaml_code field
         user_root = self.Users.create(
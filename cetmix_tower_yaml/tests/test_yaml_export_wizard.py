@@ -57,6 +57,9 @@ class TestYamlExportWizard(TransactionCase):
             active_ids=[self.server_template_test_wizard.id],
         ).create({})
         self.test_wizard.onchange_explode_child_records()
+        self.exported_yaml_code = self.server_template_test_wizard.with_context(
+            explode_related_record=True, remove_empty_values=True
+        ).yaml_code
 
     def test_user_without_export_group_cannot_export(self):
         """Test if user without export group cannot export"""
@@ -98,7 +101,7 @@ class TestYamlExportWizard(TransactionCase):
         # Test wizard creation
         self.assertEqual(
             self.test_wizard.yaml_code,
-            f"{self.file_header}\n{self.server_template_test_wizard.yaml_code}",
+            f"{self.file_header}\n{self.exported_yaml_code}",
             "YAML code should be the same",
         )
 
@@ -134,7 +137,7 @@ class TestYamlExportWizard(TransactionCase):
         )
         self.assertEqual(
             yaml_file_content,
-            f"{self.file_header}\n{self.server_template_test_wizard.yaml_code}",
+            f"{self.file_header}\n{self.exported_yaml_code}",
             "YAML file content should be the same as the original YAML code",
         )
 
@@ -1,7 +1,8 @@
 import base64
+from unittest.mock import patch
 
 from odoo import _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 from odoo.tests import TransactionCase
 
 
@@ -361,3 +362,120 @@ class TestTowerYamlImportWizUpload(TransactionCase):
                 new_server_template.server_log_ids,
                 "New Server Log must be created instead of updating existing one",
             )
+
+    def test_action_import_yaml_multiple_documents(self):
+        """Test YAML import of several documents at once"""
+        yaml_code = """
+cetmix_tower_model: command
+reference: multi_doc_command
+name: Multi Doc Command
+code: echo wow
+---
+cetmix_tower_model: command
+reference: test_yaml_command
+name: Updated Yaml Command
+---
+cetmix_tower_model: plan
+reference: multi_doc_plan
+name: Multi Doc Plan
+tag_ids:
+- yaml_test
+line_ids:
+- sequence: 1
+  command_id: multi_doc_command
+- sequence: 2
+  command_id: test_yaml_command
+"""
+        self.import_wizard.write(
+            {"yaml_code": yaml_code, "update_existing_record": True}
+        )
+
+        # References are resolved in batch
+        command_class = type(self.Command)
+        tag_class = type(self.Tag)
+        with patch.object(
+            command_class, "_get_id_by_reference", autospec=True
+        ) as command_mock, patch.object(
+            tag_class, "_get_id_by_reference", autospec=True
+        ) as tag_mock:
+            action = self.import_wizard.action_import_yaml()
+        command_mock.assert_not_called()
+        tag_mock.assert_not_called()
+
+        # -- 1 --
+        # Records of the first document model are opened
+        self.assertEqual(action["res_model"], "cx.tower.command")
+        commands = self.Command.search(action["domain"])
+        new_command = self.Command.get_by_reference("multi_doc_command")
+        self.assertEqual(commands, new_command | self.command_yaml_test)
+
+        # -- 2 --
+        # Existing record is updated
+        self.assertEqual(self.command_yaml_test.name, "Updated Yaml Command")
+
+        # -- 3 --
+        # Records created from previous documents are referenced
+        plan = self.FlightPlan.get_by_reference("multi_doc_plan")
+        self.assertEqual(plan.tag_ids, self.tag_yaml_test)
+        self.assertEqual(
+            plan.line_ids.sorted("sequence").mapped("command_id"),
+            new_command | self.command_yaml_test,
+        )
+
+    def test_sync_yaml_changed_values_only(self):
+        """Test YAML sync applies only values that differ from the database"""
+        self.command_yaml_test.tag_ids = self.tag_yaml_test
+        yaml_code = """
+cetmix_tower_model: command
+reference: test_yaml_command
+name: Test Yaml Command
+code: echo synced
+tag_ids:
+- yaml_test
+---
+cetmix_tower_model: command
+reference: sync_command
+name: Sync Command
+---
+cetmix_tower_model: plan
+reference: test_yaml_flight_plan
+name: Test Yaml Flight Plan
+"""
+        self.import_wizard.write({"yaml_code": yaml_code})
+        self.import_wizard.action_prepare_sync()
+
+        # -- 1 --
+        # Changes are computed for each document
+        self.assertEqual(
+            self.import_wizard.line_ids.mapped("action"),
+            ["update", "create", "unchanged"],
+        )
+        self.assertEqual(self.import_wizard.line_ids[0].changed_fields, "code")
+
+        # -- 2 --
+        # Only changed values are written
+        plan_class = type(self.FlightPlan)
+        command_class = type(self.Command)
+        with patch.object(
+            plan_class, "write", autospec=True, side_effect=plan_class.write
+        ) as plan_write_mock, patch.object(
+            command_class, "write", autospec=True, side_effect=command_class.write
+        ) as command_write_mock:
+            self.import_wizard.action_apply_sync()
+        plan_write_mock.assert_not_called()
+        written_keys = set()
+        for call in command_write_mock.call_args_list:
+            written_keys |= set(call.args[1])
+        self.assertNotIn("name", written_keys)
+        self.assertNotIn("tag_ids", written_keys)
+        self.assertEqual(self.command_yaml_test.code, "echo synced")
+        self.assertTrue(self.Command.get_by_reference("sync_command"))
+
+        # -- 3 --
+        # Nothing to apply once the database is in sync
+        self.import_wizard.action_prepare_sync()
+        self.assertEqual(
+            set(self.import_wizard.line_ids.mapped("action")), {"unchanged"}
+        )
+        with self.assertRaises(UserError):
+            self.import_wizard.action_apply_sync()
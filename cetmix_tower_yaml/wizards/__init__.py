@@ -2,3 +2,4 @@ from . import cx_tower_yaml_export_wiz
 from . import cx_tower_yaml_export_wiz_download
 from . import cx_tower_yaml_import_wiz
 from . import cx_tower_yaml_import_wiz_upload
+from . import cx_tower_yaml_import_wiz_line
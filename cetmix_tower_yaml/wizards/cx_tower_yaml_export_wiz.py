@@ -1,4 +1,5 @@
 import base64
+import io
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
@@ -41,23 +42,18 @@ class CxTowerYamlExportWiz(models.TransientModel):
         records = self._get_model_record()
         explode_related_record = self.explode_child_records
         remove_empty_values = self.remove_empty_values
-        # Collact YAML code into a list
-        yaml_codes = (
-            [FILE_HEADER + self._text_to_yaml_comment(self.comment)]
-            if self.comment
-            else [FILE_HEADER]
-        )
-
-        # Concatenate all YAML codes from selected records
-        for record in records:
-            record_yaml_code = record.with_context(
-                explode_related_record=explode_related_record,
-                remove_empty_values=remove_empty_values,
-            ).yaml_code
-            if record_yaml_code:
-                yaml_codes.append(record_yaml_code)
 
-        self.yaml_code = "\n".join(yaml_codes) if yaml_codes else ""
+        # Write YAML code of all selected records into a single stream
+        yaml_stream = io.StringIO()
+        yaml_stream.write(FILE_HEADER)
+        if self.comment:
+            yaml_stream.write(self._text_to_yaml_comment(self.comment))
+        records.with_context(
+            explode_related_record=explode_related_record,
+            remove_empty_values=remove_empty_values,
+        )._export_yaml_to_stream(yaml_stream)
+
+        self.yaml_code = yaml_stream.getvalue()
 
     def action_generate_yaml_file(self):
         """Save YAML file"""
@@ -1,6 +1,9 @@
-import yaml
+from itertools import groupby
 
-from odoo import api, fields, models
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+from ..models.cx_tower_yaml_mixin import YAML_SERVICE_KEYS
 
 
 class CxTowerYamlImportWiz(models.TransientModel):
@@ -21,6 +24,12 @@ class CxTowerYamlImportWiz(models.TransientModel):
         help="If enabled, existing records will be updated with the new data."
         " Otherwise, new records will be created.",
     )
+    line_ids = fields.One2many(
+        comodel_name="cx.tower.yaml.import.wiz.line",
+        inverse_name="wizard_id",
+        readonly=True,
+        help="Changes that will be applied to the database",
+    )
 
     @api.depends("model_name")
     def _compute_model_description(self):
@@ -34,7 +43,20 @@ class CxTowerYamlImportWiz(models.TransientModel):
         self.ensure_one()
 
         # Parse YAML code
-        yaml_data = yaml.safe_load(self.yaml_code)
+        yaml_documents = self.env["cx.tower.yaml.mixin"]._load_yaml_documents(
+            self.yaml_code
+        )
+        if len(yaml_documents) > 1:
+            records = self._import_yaml_documents(yaml_documents)
+            return {
+                "name": _("Imported Records"),
+                "type": "ir.actions.act_window",
+                "res_model": records._name,
+                "domain": [("id", "in", records.ids)],
+                "view_mode": "tree,form",
+                "target": "current",
+            }
+        yaml_data = yaml_documents[0]
 
         # Update existing record
         if (
@@ -45,10 +67,13 @@ class CxTowerYamlImportWiz(models.TransientModel):
             record = self.env[self.model_name].browse(self.record_id)
             record.update({"yaml_code": self.yaml_code})
         else:
-            model = self.env[self.model_name]
-            record_values = model.with_context(
+            model = self.env[self.model_name].with_context(
                 force_create_related_record=True
-            )._post_process_yaml_dict_values(yaml_data)
+            )
+            yaml_cache = model._prepare_yaml_reference_cache([yaml_data])
+            record_values = model._post_process_yaml_dict_values(
+                yaml_data, yaml_cache=yaml_cache
+            )
             record = model.create(record_values)
 
         # Open created record
@@ -62,6 +87,222 @@ class CxTowerYamlImportWiz(models.TransientModel):
             "target": "current",
         }
 
+    def action_prepare_sync(self):
+        """Compare YAML data with the database and show the changes
+        that will be applied"""
+
+        self.ensure_one()
+        yaml_documents = self.env["cx.tower.yaml.mixin"]._load_yaml_documents(
+            self.yaml_code
+        )
+        self.line_ids.unlink()
+        self.write(
+            {
+                "line_ids": [
+                    (0, 0, line_values)
+                    for line_values in self._prepare_sync_lines(yaml_documents)
+                ]
+            }
+        )
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def action_apply_sync(self):
+        """Apply changes shown by the comparison.
+        Only the values that differ from the database are written."""
+
+        self.ensure_one()
+        yaml_documents = self.env["cx.tower.yaml.mixin"]._load_yaml_documents(
+            self.yaml_code
+        )
+        documents_to_import = []
+        for line in self.line_ids.sorted("document_index"):
+            if line.action == "unchanged":
+                continue
+            yaml_data = yaml_documents[line.document_index]
+            if line.action == "update":
+                changed_fields = line.changed_fields.split(", ")
+                yaml_data = {
+                    key: value
+                    for key, value in yaml_data.items()
+                    if key in changed_fields
+                    or key in YAML_SERVICE_KEYS
+                    or key == "reference"
+                }
+            documents_to_import.append(yaml_data)
+        if not documents_to_import:
+            raise UserError(_("All records are up to date. Nothing to apply."))
+
+        records = self._import_yaml_documents(
+            documents_to_import, update_existing_record=True
+        )
+        return {
+            "name": _("Updated Records"),
+            "type": "ir.actions.act_window",
+            "res_model": records._name,
+            "domain": [("id", "in", records.ids)],
+            "view_mode": "tree,form",
+            "target": "current",
+        }
+
+    def _prepare_sync_lines(self, yaml_documents):
+        """Compare YAML documents with the existing records.
+        Records are matched by reference.
+        Existing records of each model are exported at once.
+
+        Args:
+            yaml_documents (list of dict): parsed YAML documents
+
+        Returns:
+            list of dict: values of the `cx.tower.yaml.import.wiz.line` records
+        """
+        mixin = self.env["cx.tower.yaml.mixin"]
+        documents_by_model, yaml_cache = self._group_yaml_documents(yaml_documents)
+
+        lines = []
+        export_cache = {}
+        document_index = 0
+        for model_name, documents in documents_by_model:
+            model = self.env[model_name]
+            records = [
+                mixin._get_record_by_yaml_reference(
+                    model, yaml_data["reference"], yaml_cache
+                )
+                if isinstance(yaml_data.get("reference"), str)
+                else model
+                for yaml_data in documents
+            ]
+            existing_records = model.browse([record.id for record in records if record])
+            current_values = dict(
+                zip(
+                    existing_records.ids,
+                    existing_records.with_context(
+                        explode_related_record=True, no_yaml_service_fields=True
+                    )._prepare_records_for_yaml(export_cache),
+                )
+            )
+            for yaml_data, record in zip(documents, records):
+                if record:
+                    changed_fields = record._get_yaml_changed_fields(
+                        yaml_data, current_values[record.id]
+                    )
+                    action = "update" if changed_fields else "unchanged"
+                else:
+                    changed_fields = []
+                    action = "create"
+                lines.append(
+                    {
+                        "document_index": document_index,
+                        "model_name": model_name,
+                        "name": yaml_data.get("name") or record.display_name,
+                        "reference": yaml_data.get("reference"),
+                        "action": action,
+                        "changed_fields": ", ".join(changed_fields),
+                    }
+                )
+                document_index += 1
+        return lines
+
+    def _group_yaml_documents(self, yaml_documents):
+        """Group consecutive YAML documents by model
+        and resolve references used in all of them.
+
+        Args:
+            yaml_documents (list of dict): parsed YAML documents
+
+        Returns:
+            tuple: (list of (model_name, list of documents),
+                resolved references. Check `_resolve_yaml_references`.)
+        """
+        upload_wizard = self.env["cx.tower.yaml.import.wiz.upload"]
+
+        # Collect references of all documents
+        references = {}
+        documents_by_model = []
+        for model_name, documents in groupby(
+            yaml_documents, key=upload_wizard._validate_yaml_document
+        ):
+            documents = list(documents)
+            documents_by_model.append((model_name, documents))
+            model = self.env[model_name]
+            for yaml_data in documents:
+                reference = yaml_data.get("reference")
+                if isinstance(reference, str):
+                    references.setdefault(model_name, set()).add(reference)
+                model._collect_yaml_references(yaml_data, references)
+        yaml_cache = self.env["cx.tower.yaml.mixin"]._resolve_yaml_references(
+            references
+        )
+        return documents_by_model, yaml_cache
+
+    def _import_yaml_documents(self, yaml_documents, update_existing_record=None):
+        """Create or update records from several YAML documents.
+        References used in all documents are resolved in advance
+        with a single query per model.
+        Consecutive documents of the same model are created at once.
+
+        Args:
+            yaml_documents (list of dict): parsed YAML documents
+            update_existing_record (Bool, optional): update records
+                that exist in the database. Wizard setting is used if not set.
+
+        Returns:
+            Recordset: records of the model of the first document
+        """
+        mixin = self.env["cx.tower.yaml.mixin"]
+        if update_existing_record is None:
+            update_existing_record = self.update_existing_record
+        documents_by_model, yaml_cache = self._group_yaml_documents(yaml_documents)
+
+        records_by_model = {}
+        for model_name, documents in documents_by_model:
+            model = self.env[model_name]
+            records = model.browse()
+            vals_list = []
+            for yaml_data in documents:
+                record = (
+                    mixin._get_record_by_yaml_reference(
+                        model, yaml_data["reference"], yaml_cache
+                    )
+                    if update_existing_record
+                    and isinstance(yaml_data.get("reference"), str)
+                    else model
+                )
+                if record:
+                    record.write(
+                        record._post_process_yaml_dict_values(
+                            yaml_data, yaml_cache=yaml_cache
+                        )
+                    )
+                    records |= record
+                else:
+                    vals_list.append(
+                        model.with_context(
+                            force_create_related_record=True
+                        )._post_process_yaml_dict_values(
+                            yaml_data, yaml_cache=yaml_cache
+                        )
+                    )
+            if vals_list:
+                new_records = model.create(vals_list)
+                records |= new_records
+                for record in new_records:
+                    yaml_cache[(model_name, record.reference)] = record.id
+
+            # Records created using 'Create' commands are not in the cache.
+            # Search for the references that were not resolved once again.
+            for key in [key for key, record_id in yaml_cache.items() if not record_id]:
+                del yaml_cache[key]
+            records_by_model.setdefault(model_name, model.browse())
+            records_by_model[model_name] |= records
+
+        return records_by_model[documents_by_model[0][0]]
+
     def action_open_existing_record(self):
         """Open existing record"""
 
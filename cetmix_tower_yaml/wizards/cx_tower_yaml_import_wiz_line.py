@@ -0,0 +1,34 @@
+from odoo import fields, models
+
+
+class CxTowerYamlImportWizLine(models.TransientModel):
+    """
+    Change that will be applied to the database when syncing YAML data.
+    """
+
+    _name = "cx.tower.yaml.import.wiz.line"
+    _description = "Cetmix Tower YAML Import Wizard Line"
+    _order = "document_index"
+
+    wizard_id = fields.Many2one(
+        comodel_name="cx.tower.yaml.import.wiz",
+        required=True,
+        ondelete="cascade",
+    )
+    document_index = fields.Integer(
+        readonly=True, help="Position of the document in the YAML code"
+    )
+    model_name = fields.Char(readonly=True)
+    name = fields.Char(readonly=True)
+    reference = fields.Char(readonly=True)
+    action = fields.Selection(
+        selection=[
+            ("create", "Create"),
+            ("update", "Update"),
+            ("unchanged", "Unchanged"),
+        ],
+        readonly=True,
+    )
+    changed_fields = fields.Char(
+        readonly=True, help="Fields that differ from the existing record"
+    )
@@ -72,12 +72,45 @@ class CxTowerYamlImportWizUpload(models.TransientModel):
                 _("File contains non-unicode characters or is empty")
             ) from e
 
-        # Parse YAML file
+        # Parse YAML file. It may contain several documents.
         try:
-            yaml_data = yaml.safe_load(decoded_file)
+            yaml_documents = self.env["cx.tower.yaml.mixin"]._load_yaml_documents(
+                decoded_file
+            )
         except yaml.YAMLError as e:
             raise ValidationError(_("Invalid YAML file")) from e
 
+        if not yaml_documents:
+            raise ValidationError(_("Yaml file doesn't contain valid data"))
+        model_names = [
+            self._validate_yaml_document(yaml_data) for yaml_data in yaml_documents
+        ]
+        model_name = model_names[0]
+
+        # Get record id from YAML. Only a single record can be updated.
+        record_reference = (
+            yaml_documents[0].get("reference") if len(yaml_documents) == 1 else False
+        )
+        if record_reference:
+            record = self.env[model_name].get_by_reference(record_reference)
+            record_id = record and record.id or False
+        else:
+            record_id = False
+
+        return decoded_file, model_name, record_id
+
+    def _validate_yaml_document(self, yaml_data):
+        """Validate a single YAML document
+
+        Args:
+            yaml_data (Any): parsed YAML document
+
+        Raises:
+            ValidationError: if document cannot be imported
+
+        Returns:
+            Char: name of the Odoo model the document belongs to
+        """
         if not yaml_data or not isinstance(yaml_data, dict):
             raise ValidationError(_("Yaml file doesn't contain valid data"))
 
@@ -113,13 +146,4 @@ class CxTowerYamlImportWizUpload(models.TransientModel):
                     " You may need to update the Cetmix Tower Yaml module."
                 )
             )
-
-        # Get record id from YAML
-        record_reference = yaml_data.get("reference")
-        if record_reference:
-            record = model.get_by_reference(record_reference)
-            record_id = record and record.id or False
-        else:
-            record_id = False
-
-        return decoded_file, model_name, record_id
+        return model_name